@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The live sentiment stream (stock/live.py) needs this entry point, e.g.
+``uvicorn StockAnalyzer.asgi:application``. Viewers of a symbol share one
+poll task per server process, so fewer processes mean fewer polls. Under
+WSGI the stream is buffered until it ends.
 """
 
 import os
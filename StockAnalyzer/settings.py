@@ -132,3 +132,110 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 TAILWIND_APP_NAME = 'theme'
+
+# Build the shared sentiment analyzers when the app is loaded instead of on the
+# first request (see stock/registry.py)
+STOCK_WARM_UP_ON_START = False
+
+# Sentiment score cache (see stock/score_cache.py): number of scores kept in
+# memory per process, and whether scores are also stored in the database
+SCORE_CACHE_SIZE = 10000
+SCORE_CACHE_PERSISTENT = True
+
+# Stock quote cache (see stock/quote_cache.py): seconds a quote is fresh, and
+# extra seconds an expired quote is still served while it is refreshed
+QUOTE_CACHE_TTL = 60
+QUOTE_CACHE_STALE_TTL = 300
+
+# Seconds before stored price history is topped up from Yahoo Finance again
+# (see stock/price_store.py)
+PRICE_HISTORY_REFRESH = 60
+
+# Sentiment pages use posts stored by the ingest_reddit command instead of a
+# live Reddit search when its last run is at most this many seconds old
+INGESTION_MAX_AGE = 900
+
+# Largest watchlist accepted by the batch quotes endpoint
+QUOTES_MAX_SYMBOLS = 100
+
+# Comparison endpoint (see stock/compare.py): most symbols per request, and posts
+# fetched per combined Reddit search
+COMPARE_MAX_SYMBOLS = 100
+COMPARE_POSTS_PER_QUERY = 500
+
+# Ticker mentions (see stock/mentions.py): with REDDIT_REQUIRE_MENTION, posts Reddit's
+# fuzzy search returns for a symbol are only analysed when they mention it. Tickers that
+# are common words only count as $cashtags; MENTION_BLOCKLIST replaces the default list.
+REDDIT_REQUIRE_MENTION = True
+
+# Upstream retries (see stock/retry.py): total seconds one fetch may spend
+# including backoff, and the circuit breaker that fails fast after repeated 429s
+STOCK_FETCH_DEADLINE = 10
+RATE_LIMIT_BREAKER_THRESHOLD = 5
+RATE_LIMIT_BREAKER_RESET = 60
+
+# Sentiment pages fetch Reddit posts and the stock price concurrently (see
+# stock/fanout.py): pool size and per-source timeouts in seconds
+STOCK_FETCH_WORKERS = 8
+STOCK_SOURCE_TIMEOUTS = {
+    'reddit': 15,
+    'price': 5,
+    'default': 10,
+}
+# Pool threads each source may hold; a timed-out call keeps its thread until it
+# returns, and a source whose slots are all taken fails at once. Keep the sum over
+# the sources at most STOCK_FETCH_WORKERS so that no task ever waits for a thread.
+STOCK_SOURCE_SLOTS = {
+    'reddit': 4,
+    'price': 4,
+    'default': 2,
+}
+
+# Async Reddit client (see stock/reddit_sentiment_async.py): requests allowed per
+# minute by Reddit's OAuth rate limit, and the size of its HTTP connection pool
+REDDIT_REQUESTS_PER_MINUTE = 100
+REDDIT_MAX_CONNECTIONS = 10
+
+# Worker processes scoring large batches of posts (see stock/scoring_pool.py),
+# 0 scores in the calling process. Batches smaller than SCORING_POOL_MIN_BATCH
+# are always scored in the calling process.
+SCORING_POOL_WORKERS = 0
+SCORING_POOL_CHUNK_SIZE = 500
+SCORING_POOL_MIN_BATCH = 200
+
+# Artifacts written by the train_sentiment_model command (see stock/ml/model_store.py)
+# and the model family served: 'forest' (TF-IDF and random forest) or 'linear'
+# (hashing vectorizer and logistic regression, smaller and faster per prediction)
+SENTIMENT_MODEL_DIR = BASE_DIR / 'ml_models'
+SENTIMENT_MODEL_BACKEND = 'forest'
+
+# Seconds between checks for a newer model version, which running workers then
+# swap in without a restart (see update_sentiment_model)
+SENTIMENT_MODEL_RELOAD_INTERVAL = 30
+
+# Cached sentiment results (see stock/result_cache.py). Keys include the last
+# ingestion run, so ingest_reddit invalidates them on any backend; FileBasedCache
+# shares the cached results between worker processes as well.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stock-results',
+    }
+}
+
+# Seconds a cached result stays valid per time filter; longer windows change more slowly
+RESULT_CACHE_TTLS = {
+    'day': 60,
+    'week': 300,
+    'month': 1800,
+    'year': 3600,
+}
+
+# REST API (see stock/api.py): stored posts are served in cursor-paginated pages of this size
+API_POSTS_PAGE_SIZE = 25
+
+# Live updates (see stock/live.py): seconds between polls of a watched symbol,
+# updates buffered per client, and seconds of silence before a keepalive comment
+LIVE_POLL_INTERVAL = 10
+LIVE_QUEUE_SIZE = 100
+LIVE_KEEPALIVE = 15
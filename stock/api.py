@@ -0,0 +1,231 @@
+"""
+REST API over the stored sentiment data and the quote cache.
+
+Stock endpoints only read what ingest_reddit stored, and answer conditional
+requests: their ETag and Last-Modified derive from the stock's last ingestion
+run and the current hour, as their time windows slide with the clock. A client
+revalidating an unchanged resource gets a 304 without any query beyond the
+ingestion state. Conditional requests are evaluated inside api_view, so a 304
+still goes through authentication, permissions and throttling.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import condition
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from stock.ingestion import SCORER_RESULT_KEYS, TIME_FILTER_WINDOWS, covers_window, stored_analysis
+from stock.models import IngestionState, RedditPost
+from stock.rollups import daily_frame, daily_trend
+from stock.serializers import PostSerializer, QuoteSerializer, SentimentSummarySerializer, TrendPointSerializer
+from stock.stock_data import FetchStockData
+from user.models import Stock
+
+
+# Days in the moving average of the trend endpoint
+TREND_WINDOW = 7
+
+
+class PostCursorPagination(CursorPagination):
+    # Newest first; the id breaks ties so the cursor position is unique
+    ordering = ('-created_utc', '-id')
+
+    def get_page_size(self, request):
+        return getattr(settings, 'API_POSTS_PAGE_SIZE', 25)
+
+
+def _scorer(request):
+    scorer = request.GET.get('scorer', 'textblob')
+    return scorer if scorer in SCORER_RESULT_KEYS else 'textblob'
+
+
+def _time_filter(request):
+    time_filter = request.GET.get('time_filter', 'week')
+    return time_filter if time_filter in ["week", "month", "year"] else "week"
+
+
+def _ingestion_state(request, symbol):
+    """
+    (last_run, covered_from) of a symbol's ingestion, (None, None) before its first run.
+    Read once per request, as every validator derives from it.
+    """
+    if not hasattr(request, '_ingestion_state'):
+        state = (IngestionState.objects.filter(stock__symbol=symbol.upper())
+                 .values_list('last_run', 'covered_from').first())
+        request._ingestion_state = state or (None, None)
+    return request._ingestion_state
+
+
+def _last_ingestion(request, symbol):
+    """
+    Last-Modified of a symbol's endpoints: its last ingestion run, or the start of
+    the current hour if that is later, as posts leave the time windows as time passes
+    """
+    last_run, _ = _ingestion_state(request, symbol)
+    if last_run is None:
+        return None
+    return max(last_run, timezone.now().replace(minute=0, second=0, microsecond=0))
+
+
+def _ingestion_etag(request, symbol):
+    """
+    ETag of a symbol's endpoints: the representation only changes with an ingestion run,
+    the hour or the query parameters
+    """
+    last_modified = _last_ingestion(request, symbol)
+    if last_modified is None:
+        return None
+    key = f'{request.path}|{symbol.upper()}|{last_modified.isoformat()}|{sorted(request.GET.lists())}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _summary_ready(request, symbol):
+    # Without a recent run covering the window the summary is a 404, which gets no validators
+    last_run, covered_from = _ingestion_state(request, symbol)
+    return covers_window(last_run, covered_from, _time_filter(request))
+
+
+def _summary_last_modified(request, symbol):
+    return _last_ingestion(request, symbol) if _summary_ready(request, symbol) else None
+
+
+def _summary_etag(request, symbol):
+    return _ingestion_etag(request, symbol) if _summary_ready(request, symbol) else None
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+@condition(etag_func=_summary_etag, last_modified_func=_summary_last_modified)
+def sentiment_summary(request, symbol):
+    """
+    Sentiment summary of a stock from its stored posts.
+    :param request:
+    :param symbol:
+    :return:
+    """
+    scorer, time_filter = _scorer(request), _time_filter(request)
+    result = stored_analysis(symbol, time_filter, scorer=scorer)
+    if result is None:
+        return Response({'error': f'No recent stored posts for {symbol.upper()}'}, status=404)
+
+    data = result['data']
+    key = SCORER_RESULT_KEYS[scorer]
+    serializer = SentimentSummarySerializer({
+        **data,
+        'symbol': symbol.upper(),
+        'scorer': scorer,
+        'top_posts': [{'title': post['title'], 'sentiment': post[key], 'url': post['url']}
+                      for post in data['top_posts']],
+    })
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+@condition(etag_func=_ingestion_etag, last_modified_func=_last_ingestion)
+def stock_posts(request, symbol):
+    """
+    Stored posts of a stock, newest first, in cursor-paginated pages.
+    :param request:
+    :param symbol:
+    :return:
+    """
+    stock = get_object_or_404(Stock, symbol=symbol.upper())
+    posts = RedditPost.objects.filter(stock=stock).select_related('scores')
+
+    time_filter = request.GET.get('time_filter')
+    if time_filter in TIME_FILTER_WINDOWS:
+        posts = posts.filter(created_utc__gte=timezone.now() - TIME_FILTER_WINDOWS[time_filter])
+
+    paginator = PostCursorPagination()
+    page = paginator.paginate_queryset(posts, request)
+    return paginator.get_paginated_response(PostSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+@condition(etag_func=_ingestion_etag, last_modified_func=_last_ingestion)
+def sentiment_trend(request, symbol):
+    """
+    Daily mean, standard deviation and moving average of a scorer's scores from the
+    rollups, with the trend the moving average shows.
+    :param request:
+    :param symbol:
+    :return:
+    """
+    stock = get_object_or_404(Stock, symbol=symbol.upper())
+    time_filter = _time_filter(request)
+    since = (timezone.now() - TIME_FILTER_WINDOWS[time_filter]).date()
+
+    # The days before the window feed the first moving averages
+    frame = daily_frame(stock, _scorer(request), since=since - timedelta(days=TREND_WINDOW - 1))
+    # Quiet days would leave most windows without an average, so any day with posts counts
+    trend = daily_trend(frame, window_size=TREND_WINDOW, min_periods=1)
+    frame = frame[frame.index >= pd.Timestamp(since)]
+    mean = frame['total'] / frame['count']
+    std = np.sqrt((frame['total_sq'] / frame['count'] - mean ** 2).clip(lower=0))
+    moving_avg = trend['moving_avg'].reindex(frame.index)
+    points = [
+        {'day': day.date(), 'count': int(count), 'mean': float(m), 'std': float(s),
+         'moving_average': None if np.isnan(avg) else float(avg)}
+        for day, count, m, s, avg in zip(frame.index, frame['count'], mean, std, moving_avg)
+    ]
+    current = trend['current_sentiment']
+    return Response({
+        'symbol': stock.symbol,
+        'trend': trend['trend'],
+        'current_sentiment': None if np.isnan(current) else float(current),
+        'results': TrendPointSerializer(points, many=True).data,
+    })
+
+
+def _quote_symbols(request):
+    return list(dict.fromkeys(
+        symbol.strip().upper() for symbol in request.GET.get('symbols', '').split(',') if symbol.strip()
+    ))
+
+
+def _quotes_last_modified(request):
+    """
+    When the newest requested quote was fetched, None unless every quote is fresh in
+    the cache, as the view would otherwise download new ones
+    """
+    fetcher = FetchStockData()
+    symbols = _quote_symbols(request)
+    cached = [fetcher.cached_quote(symbol) for symbol in symbols]
+    if not symbols or None in cached:
+        return None
+    age = min(entry[1] for entry in cached)
+    return datetime.fromtimestamp(time.time() - age, tz=dt_timezone.utc)
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+@condition(last_modified_func=_quotes_last_modified)
+def quotes(request):
+    """
+    Quotes for a comma separated list of symbols.
+    :param request:
+    :return:
+    """
+    symbols = _quote_symbols(request)
+    max_symbols = getattr(settings, 'QUOTES_MAX_SYMBOLS', 100)
+
+    if not symbols:
+        return Response({'error': 'No symbols provided'}, status=400)
+    if len(symbols) > max_symbols:
+        return Response({'error': f'At most {max_symbols} symbols can be requested'}, status=400)
+
+    results = FetchStockData().get_stock_data_many(symbols)
+    return Response({symbol: QuoteSerializer(result).data for symbol, result in results.items()})
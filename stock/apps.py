@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class StockConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stock'
+
+    def ready(self):
+        # Importing the signals module connects its receivers
+        from stock import registry, signals
+
+        if registry.warm_up_enabled():
+            registry.warm_up()
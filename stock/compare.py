@@ -0,0 +1,95 @@
+"""
+Sentiment of many symbols from one shared Reddit fetch.
+
+Instead of one search per symbol, the symbols are joined into OR queries as
+long as Reddit accepts, each fetched post is scored once, and every post is
+attributed to all the symbols it mentions (see stock/mentions.py). A
+100-symbol screener therefore costs a handful of searches, not 100.
+"""
+
+from django.conf import settings
+
+from stock.mentions import DEFAULT_BLOCKLIST, MentionExtractor
+from stock.reddit_sentiment import SentimentAggregate, chunks
+from stock.posts import PostRecord
+
+# Reddit rejects longer search queries
+MAX_QUERY_LENGTH = 512
+
+
+def search_queries(symbols, max_length=MAX_QUERY_LENGTH):
+    """
+    OR queries covering every symbol, each at most max_length characters long
+    :param symbols: List of symbols
+    :param max_length: Longest query accepted
+    :return: List of queries
+    """
+    queries, current = [], ''
+    for symbol in symbols:
+        candidate = f'{current} OR {symbol}' if current else symbol
+        if current and len(candidate) > max_length:
+            queries.append(current)
+            candidate = symbol
+        current = candidate
+    if current:
+        queries.append(current)
+    return queries
+
+
+def _fetch_posts(reddit, queries, limit, time_filter):
+    """
+    Posts returned by any of the queries, each once.
+    An error ends its query, the posts fetched before it stay valid.
+    :return: Iterator of PostRecord
+    """
+    seen = set()
+    for query in queries:
+        try:
+            for post in reddit.search_query(query, limit=limit, time_filter=time_filter):
+                if post.permalink not in seen:
+                    seen.add(post.permalink)
+                    yield PostRecord.from_submission(post)
+        except Exception as e:
+            print(f"Error fetching Reddit posts for {query}: {e}")
+
+
+def compare_symbols(reddit, symbols, time_filter='week', limit=500, chunk_size=100):
+    """
+    Sentiment of every symbol from posts fetched and scored once
+    :param reddit: RedditSentiment
+    :param symbols: List of upper-case symbols
+    :param time_filter: Time period to filter posts
+    :param limit: Number of posts fetched per query
+    :param chunk_size: Number of posts scored at once
+    :return: Result dictionary with a RedditSentiment.analyze_sentiment result per symbol
+    """
+    # Built for the requested symbols only, the shared extractor would also match every other Stock
+    matcher = MentionExtractor(symbols, blocklist=getattr(settings, 'MENTION_BLOCKLIST', DEFAULT_BLOCKLIST))
+    aggregates = {symbol: SentimentAggregate() for symbol in symbols}
+    fetched = 0
+
+    for chunk in chunks(_fetch_posts(reddit, search_queries(symbols), limit, time_filter), chunk_size):
+        mentions = [matcher.extract(record.full_text) for record in chunk]
+        # Posts mentioning none of the symbols are not worth scoring
+        matched = [(record, found) for record, found in zip(chunk, mentions) if found]
+        fetched += len(chunk)
+        if not matched:
+            continue
+        try:
+            scores = reddit.get_sentiment_batch([record.full_text for record, _ in matched])
+        except Exception as e:
+            print(f"Error scoring Reddit posts: {e}")
+            break
+        for (record, found), score in zip(matched, scores):
+            for symbol in found:
+                aggregates[symbol].add([record], [score])
+
+    return {
+        'success': True,
+        'data': {
+            'time_filter': time_filter,
+            'posts_fetched': fetched,
+            'symbols': {symbol: aggregate.result(symbol, time_filter) for symbol, aggregate in aggregates.items()},
+        },
+        'error': None
+    }
@@ -0,0 +1,78 @@
+"""
+Runs independent upstream lookups of a page concurrently on the shared thread pool.
+"""
+
+import time
+from concurrent.futures import TimeoutError
+
+from django.conf import settings
+from django.db import connections
+
+from stock import registry
+
+
+class SourceTimeout(Exception):
+    """
+    Raised in place of a result when a source did not answer within its timeout
+    """
+
+
+class SourceBusy(Exception):
+    """
+    Raised in place of a result when every slot of a source is held by calls still running
+    """
+
+
+def _run_in_slot(fn, slots):
+    """
+    Wrap fn so its source slot is released and the database connections opened
+    by the pool thread are closed once it finishes, even after its caller gave up
+    """
+    def task():
+        try:
+            return fn()
+        finally:
+            slots.release()
+            connections.close_all()
+    return task
+
+
+def fan_out(tasks, timeouts=None):
+    """
+    Run every task at the same time and wait for each one up to its timeout.
+    Timeouts are measured from the moment the tasks were submitted, so the whole
+    call never takes longer than the largest timeout.
+    A task that times out keeps its pool thread until it returns, so every source
+    may only hold a few threads (see registry.get_source_slots). When all of them
+    are taken by stuck calls, the source fails at once instead of queueing the
+    pool behind them and making every other source time out too.
+    :param tasks: Dictionary mapping source name to a callable without arguments
+    :param timeouts: Dictionary mapping source name to seconds, defaults to STOCK_SOURCE_TIMEOUTS
+    :return: Dictionary mapping source name to (result, error), one of which is None
+    """
+    if timeouts is None:
+        timeouts = getattr(settings, 'STOCK_SOURCE_TIMEOUTS', {})
+    default_timeout = timeouts.get('default', 10)
+
+    executor = registry.get_executor()
+    started = time.monotonic()
+    results = {}
+    futures = {}
+    for name, fn in tasks.items():
+        slots = registry.get_source_slots(name)
+        if slots.acquire(blocking=False):
+            futures[name] = executor.submit(_run_in_slot(fn, slots))
+        else:
+            results[name] = (None, SourceBusy(f"{name} has too many calls in progress"))
+
+    for name, future in futures.items():
+        remaining = timeouts.get(name, default_timeout) - (time.monotonic() - started)
+        try:
+            results[name] = (future.result(timeout=max(0, remaining)), None)
+        except TimeoutError:
+            # The task keeps running, and holding its slot, until it returns; its result is dropped
+            results[name] = (None, SourceTimeout(f"{name} did not answer in time"))
+        except Exception as e:
+            print(f"Error fetching {name}: {e}")
+            results[name] = (None, e)
+    return {name: results[name] for name in tasks}
@@ -0,0 +1,304 @@
+"""
+Incremental ingestion of Reddit posts for watched stocks, and the precomputed
+aggregates the sentiment views read instead of searching Reddit live.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from stock import registry
+from stock.models import IngestionState, PostScore, RedditPost
+from stock.rollups import refresh_rollups
+from user.models import Stock
+
+TIME_FILTER_WINDOWS = {
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+    'month': timedelta(days=31),
+    'year': timedelta(days=366),
+}
+
+# Key of the score in top posts, matching what the live analysis returns
+SCORER_RESULT_KEYS = {
+    'textblob': 'sentiment',
+    'vader': 'vader_sentiment',
+    'ml': 'ml_sentiment',
+}
+
+
+def watched_stocks(symbols=None):
+    """
+    Stocks to ingest, the ones with the most fans first
+    :param symbols: Optional list of symbols to restrict ingestion to
+    :return: QuerySet of Stock
+    """
+    stocks = Stock.objects.annotate(fan_count=Count('fans'))
+    if symbols:
+        stocks = stocks.filter(symbol__in=[symbol.upper() for symbol in symbols])
+    return stocks.order_by('-fan_count', 'symbol')
+
+
+def _search_time_filter(since, now):
+    """
+    Smallest Reddit time filter reaching back to since
+    :param since: Oldest moment that has to be searched
+    :param now: Current time
+    :return: Reddit time filter
+    """
+    for time_filter, window in TIME_FILTER_WINDOWS.items():
+        if now - window <= since:
+            return time_filter
+    return 'all'
+
+
+def _ingestion_window(stock, backfill, now):
+    """
+    Ingestion state of a stock and the moment its next run searches back to
+    :return: (IngestionState, since)
+    """
+    state, _ = IngestionState.objects.get_or_create(stock=stock)
+    return state, state.high_water_mark or now - TIME_FILTER_WINDOWS[backfill]
+
+
+def _post_record(post):
+    """
+    Post dictionary keyed like RedditPost fields for a submission
+    :param post: PRAW or Async PRAW submission
+    :return: Dictionary
+    """
+    return {
+        'reddit_id': post.id,
+        'subreddit': post.subreddit.display_name,
+        'title': post.title,
+        'selftext': post.selftext,
+        'permalink': post.permalink,
+        'score': post.score,
+        'created_utc': datetime.fromtimestamp(post.created_utc, tz=dt_timezone.utc),
+    }
+
+
+def ingest_stock(stock, limit=100, backfill='month'):
+    """
+    Fetch the posts about a stock that are newer than its high-water mark,
+    score them and store them.
+    :param stock: Stock to ingest
+    :param limit: Maximum number of posts fetched in one run
+    :param backfill: Reddit time filter searched on the first run
+    :return: Number of new posts stored
+    """
+    now = timezone.now()
+    state, since = _ingestion_window(stock, backfill, now)
+
+    reddit = registry.get_reddit_sentiment()
+    records = []
+    reached_mark = False
+    # Newest first, so the run can stop as soon as it reaches posts it has already seen
+    for post in reddit.search(stock.symbol, limit=limit, time_filter=_search_time_filter(since, now), sort='new'):
+        record = _post_record(post)
+        if record['created_utc'] <= since:
+            reached_mark = True
+            break
+        records.append(record)
+
+    return _store_run(stock, state, records, reached_mark, limit, since, now)
+
+
+async def _fetch_new_records(reddit, stock, limit, since, now):
+    """
+    Async counterpart of the search loop of ingest_stock
+    :return: (records, reached_mark)
+    """
+    records = []
+    async for post in reddit.search(stock.symbol, limit=limit, time_filter=_search_time_filter(since, now), sort='new'):
+        record = _post_record(post)
+        if record['created_utc'] <= since:
+            return records, True
+        records.append(record)
+    return records, False
+
+
+def ingest_stocks_concurrently(stocks, limit=100, backfill='month'):
+    """
+    Ingest several stocks, searching Reddit for all of them at the same time in
+    one event loop. Scoring and storing then run one stock after the other.
+    :param stocks: Iterable of Stock
+    :param limit: Maximum number of posts fetched per stock
+    :param backfill: Reddit time filter searched on the first run of a stock
+    :return: Dictionary mapping symbol to the number of new posts, or the exception that stopped it
+    """
+    now = timezone.now()
+    windows = [(stock, *_ingestion_window(stock, backfill, now)) for stock in stocks]
+
+    async def fetch_all():
+        reddit = registry.get_async_reddit_sentiment()
+        try:
+            return await asyncio.gather(*(
+                _fetch_new_records(reddit, stock, limit, since, now) for stock, _, since in windows
+            ), return_exceptions=True)
+        finally:
+            await reddit.close()
+
+    results = {}
+    for (stock, state, since), fetched in zip(windows, asyncio.run(fetch_all())):
+        if isinstance(fetched, Exception):
+            results[stock.symbol] = fetched
+            continue
+        records, reached_mark = fetched
+        try:
+            results[stock.symbol] = _store_run(stock, state, records, reached_mark, limit, since, now)
+        except Exception as e:
+            results[stock.symbol] = e
+    return results
+
+
+def _store_run(stock, state, records, reached_mark, limit, since, now):
+    """
+    Score and store the posts of one ingestion run that mention the stock, and move
+    its high-water mark past every post fetched
+    :return: Number of new posts stored
+    """
+    mentions = registry.get_reddit_sentiment().mention_filter(stock.symbol)
+    stored = [record for record in records if mentions(f"{record['title']} {record['selftext']}")]
+    upsert_posts(stock, stored, _score(stored))
+    refresh_rollups(stock, {record['created_utc'].date() for record in stored})
+
+    if records:
+        state.high_water_mark = max(record['created_utc'] for record in records)
+    if not reached_mark and len(records) >= limit:
+        # The limit was hit before reaching the last run, so older posts may be missing
+        state.covered_from = min(record['created_utc'] for record in records)
+    elif state.covered_from is None:
+        state.covered_from = since
+    state.last_run = now
+    state.save()
+    return len(stored)
+
+
+def _score(records):
+    """
+    TextBlob, VADER and ML sentiment scores of post records
+    :param records: List of post dictionaries
+    :return: List of dictionaries with 'textblob', 'vader' and 'ml' scores aligned with records
+    """
+    if not records:
+        return []
+
+    reddit = registry.get_reddit_sentiment()
+    ml_analyzer = registry.get_ml_analyzer()
+
+    preprocessed = ml_analyzer.preprocess_batch(pd.Series([record['selftext'] for record in records]))
+    vader_scores = ml_analyzer.vader_compound_batch(preprocessed)
+    ml_scores = ml_analyzer.analyze_sentiment_batch(preprocessed)
+    textblob_scores = reddit.get_sentiment_batch([f"{record['title']} {record['selftext']}" for record in records])
+    return [
+        {
+            'textblob': textblob_score,
+            'vader': float(vader_score),
+            'ml': float(ml_score),
+        }
+        for textblob_score, vader_score, ml_score in zip(textblob_scores, vader_scores, ml_scores)
+    ]
+
+
+def upsert_posts(stock, records, scores):
+    """
+    Insert or update posts and their scores with two bulk upserts
+    :param stock: Stock the posts were found for
+    :param records: List of post dictionaries keyed like RedditPost fields
+    :param scores: List of score dictionaries aligned with records
+    :return: None
+    """
+    if not records:
+        return
+
+    with transaction.atomic():
+        RedditPost.objects.bulk_create(
+            [RedditPost(stock=stock, **record) for record in records],
+            batch_size=500, update_conflicts=True, unique_fields=['reddit_id', 'stock'],
+            update_fields=['subreddit', 'title', 'selftext', 'permalink', 'score'],
+        )
+        # SQLite does not return primary keys of updated rows, so look them up
+        ids = dict(RedditPost.objects.filter(
+            stock=stock, reddit_id__in=[record['reddit_id'] for record in records]
+        ).values_list('reddit_id', 'id'))
+        PostScore.objects.bulk_create(
+            [PostScore(post_id=ids[record['reddit_id']], **score) for record, score in zip(records, scores)],
+            batch_size=500, update_conflicts=True, unique_fields=['post'],
+            update_fields=['textblob', 'vader', 'ml', 'scored_at'],
+        )
+
+
+def covers_window(last_run, covered_from, time_filter, now=None):
+    """
+    Whether the stored posts of a stock can answer for a time window: ingestion ran
+    within INGESTION_MAX_AGE and the stored posts reach back to the window start
+    :param last_run: IngestionState.last_run
+    :param covered_from: IngestionState.covered_from
+    :param time_filter: week, month or year
+    :param now: Current time, defaults to now
+    :return: bool
+    """
+    now = now or timezone.now()
+    max_age = timedelta(seconds=getattr(settings, 'INGESTION_MAX_AGE', 900))
+    return (last_run is not None and covered_from is not None and now - last_run <= max_age
+            and covered_from <= now - TIME_FILTER_WINDOWS[time_filter])
+
+
+def stored_analysis(symbol, time_filter, scorer='textblob'):
+    """
+    Sentiment analysis of a symbol computed from stored posts.
+    Only used when ingestion ran recently and the stored posts cover the whole window.
+    :param symbol: Stock symbol
+    :param time_filter: week, month or year
+    :param scorer: 'textblob', 'vader' or 'ml'
+    :return: Result dictionary like RedditSentiment.analyze_sentiment returns, or None
+    """
+    field = f'scores__{scorer}'
+    key = SCORER_RESULT_KEYS[scorer]
+    now = timezone.now()
+    window_start = now - TIME_FILTER_WINDOWS[time_filter]
+
+    state = IngestionState.objects.filter(stock__symbol=symbol.upper()).first()
+    if state is None or not covers_window(state.last_run, state.covered_from, time_filter, now):
+        return None
+
+    posts = RedditPost.objects.filter(
+        stock=state.stock, created_utc__gte=window_start, **{f'{field}__isnull': False}
+    )
+    summary = posts.aggregate(
+        average=Avg(field),
+        count=Count('id'),
+        positive=Count('id', filter=Q(**{f'{field}__gt': 0})),
+        negative=Count('id', filter=Q(**{f'{field}__lt': 0})),
+    )
+    if summary['count'] == 0:
+        return None
+
+    distribution = {
+        'positive': summary['positive'],
+        'negative': summary['negative'],
+        'neutral': summary['count'] - summary['positive'] - summary['negative'],
+    }
+    top_posts = [
+        {'title': title, key: score, 'url': f'https://www.reddit.com{permalink}'}
+        for title, score, permalink in posts.order_by(f'-{field}').values_list('title', field, 'permalink')[:5]
+    ]
+
+    return {
+        'success': True,
+        'data': {
+            'average_sentiment': float(summary['average']),
+            'sentiment_distribution': {k: v for k, v in distribution.items() if v},
+            'posts_count': summary['count'],
+            'top_posts': top_posts,
+            'time_filter': time_filter,
+        },
+        'error': None
+    }
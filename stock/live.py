@@ -0,0 +1,196 @@
+"""
+Live sentiment updates per symbol, pushed to clients as Server-Sent Events.
+
+Every symbol someone is watching has one channel with one poll task. The task
+reads the posts ingest_reddit stored and scored since its last poll, the
+rolling average of the last day, and the price through the quote cache, and
+publishes what changed to the queue of every subscriber. N viewers of a
+symbol therefore cost one poll, not N.
+
+Channels live in the event loop of the process, so the stream needs an ASGI
+server (see StockAnalyzer/asgi.py); under WSGI Django buffers the whole
+stream before sending it.
+"""
+
+import asyncio
+import json
+import weakref
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+
+from stock.models import RedditPost
+from stock.stock_data import FetchStockData
+
+# Window of the rolling averages
+ROLLING_WINDOW = timedelta(days=1)
+
+
+def format_event(event, data):
+    """
+    Server-Sent Event with a JSON payload
+    :param event: Event name
+    :param data: JSON serializable payload
+    :return: Text of the event
+    """
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def _poll_symbol(symbol, after_id):
+    """
+    Posts and rolling average of a symbol since a post id, run in a thread by poll_symbol
+    :return: (list of (event, data), id of the newest post)
+    """
+    posts = RedditPost.objects.filter(stock__symbol=symbol)
+    if after_id is None:
+        # The first poll only finds where the stream starts
+        after_id = posts.aggregate(last=Max('id'))['last'] or 0
+        new_posts = []
+    else:
+        new_posts = [
+            {'id': post_id, 'title': title, 'url': f'https://www.reddit.com{permalink}', 'created_utc': created,
+             'textblob': textblob, 'ml': ml}
+            for post_id, title, permalink, created, textblob, ml in
+            posts.filter(id__gt=after_id, scores__isnull=False).order_by('id')
+            .values_list('id', 'title', 'permalink', 'created_utc', 'scores__textblob', 'scores__ml')
+        ]
+
+    events = []
+    if new_posts:
+        events.append(('posts', new_posts))
+        after_id = new_posts[-1]['id']
+    events.append(('average', {
+        'window': 'day',
+        **posts.filter(created_utc__gte=timezone.now() - ROLLING_WINDOW).aggregate(
+            posts_count=Count('id'), textblob=Avg('scores__textblob'), ml=Avg('scores__ml')),
+    }))
+    return events, after_id
+
+
+async def poll_symbol(symbol, cursor):
+    """
+    Updates of a symbol since the previous poll
+    :param symbol: Upper-case stock symbol
+    :param cursor: Value returned by the previous poll, None on the first one
+    :return: (list of (event, data), cursor of the next poll)
+    """
+    events, cursor = await sync_to_async(_poll_symbol)(symbol, cursor)
+    # The quote is refreshed through the single-flight quote cache, at most once per
+    # poll however many clients watch. Its retries can block for seconds, so it runs
+    # in its own thread rather than the one thread-sensitive code shares.
+    quote = await sync_to_async(FetchStockData().get_stock_data, thread_sensitive=False)(symbol)
+    if quote and quote.get('success'):
+        events.append(('price', quote['data']))
+    return events, cursor
+
+
+class _Channel:
+    """
+    Subscribers of one symbol and the task polling for them
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        # Last average and price, sent to subscribers as soon as they join
+        self.latest = {}
+        self.task = None
+
+
+class LiveHub:
+    """
+    In-process publish/subscribe of symbol updates with one poll task per watched symbol.
+    Channels are kept per event loop, as their tasks and queues belong to it.
+    """
+
+    def __init__(self, poll=poll_symbol, interval=10, queue_size=100):
+        """
+        :param poll: Coroutine function returning (events, cursor), see poll_symbol
+        :param interval: Seconds between polls of a symbol
+        :param queue_size: Events buffered per subscriber, the oldest are dropped first
+        """
+        self.poll = poll
+        self.interval = interval
+        self.queue_size = queue_size
+        self._channels = weakref.WeakKeyDictionary()
+
+    def channels(self):
+        """
+        Channels of the running event loop
+        :return: Dictionary mapping symbol to its channel
+        """
+        return self._channels.setdefault(asyncio.get_running_loop(), {})
+
+    def subscribe(self, symbol):
+        """
+        Start receiving the updates of a symbol, starting its poll task for the first subscriber
+        :param symbol: Upper-case stock symbol
+        :return: asyncio.Queue of (event, data)
+        """
+        channel = self.channels().setdefault(symbol, _Channel())
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        for event, data in channel.latest.items():
+            queue.put_nowait((event, data))
+        channel.subscribers.add(queue)
+        if channel.task is None:
+            channel.task = asyncio.create_task(self._run(symbol, channel))
+        return queue
+
+    def unsubscribe(self, symbol, queue):
+        """
+        Stop receiving updates, stopping the poll task after the last subscriber
+        :param symbol: Upper-case stock symbol
+        :param queue: Queue returned by subscribe
+        :return: None
+        """
+        channels = self.channels()
+        channel = channels.get(symbol)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers:
+            channel.task.cancel()
+            del channels[symbol]
+
+    def _publish(self, channel, event, data):
+        if event != 'posts':
+            channel.latest[event] = data
+        for queue in channel.subscribers:
+            if queue.full():
+                # A slow client loses its oldest update rather than holding up the others
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+    async def _run(self, symbol, channel):
+        cursor = None
+        while True:
+            try:
+                events, cursor = await self.poll(symbol, cursor)
+            except Exception as e:
+                print(f"Error polling live updates for {symbol}: {e}")
+            else:
+                for event, data in events:
+                    # Unchanged averages and prices are not sent again
+                    if event == 'posts' or channel.latest.get(event) != data:
+                        self._publish(channel, event, data)
+            await asyncio.sleep(self.interval)
+
+    async def stream(self, symbol, keepalive=15):
+        """
+        Server-Sent Events of a symbol until the client disconnects
+        :param symbol: Upper-case stock symbol
+        :param keepalive: Seconds of silence after which a comment keeps proxies from closing the stream
+        :return: Async iterator of event texts
+        """
+        queue = self.subscribe(symbol)
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_event(event, data)
+        finally:
+            self.unsubscribe(symbol, queue)
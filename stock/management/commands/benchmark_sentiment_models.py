@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.ml.backends import BACKENDS
+from stock.ml.benchmark import benchmark
+from stock.ml.training import training_data
+
+
+def _format(value, pattern):
+    return '-' if value is None else pattern.format(value)
+
+
+class Command(BaseCommand):
+    help = 'Compare accuracy, prediction latency and memory of the sentiment model backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='*', choices=sorted(BACKENDS), help='Backends to compare')
+        parser.add_argument('--weak-labels', action='store_true',
+                            help='Also use unlabelled posts, labelled from their VADER score')
+        parser.add_argument('--test-size', type=float, default=0.2, help='Fraction of the posts held out')
+        parser.add_argument('--repeat', type=int, default=200, help='Single predictions timed per backend')
+        parser.add_argument('--no-memory', action='store_true', help='Skip measuring memory in a child process')
+
+    def handle(self, *args, **options):
+        texts, labels, _ = training_data(weak_labels=options['weak_labels'])
+        if len(set(labels)) < 2:
+            raise CommandError("Not enough labelled posts to train a model")
+
+        results = benchmark(texts, labels, backends=options['backends'], test_size=options['test_size'],
+                            repeat=options['repeat'], measure_memory=not options['no_memory'])
+
+        self.stdout.write(f"{len(texts)} posts")
+        self.stdout.write(f"{'backend':<8} {'accuracy':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'file MB':>8}")
+        for row in results:
+            self.stdout.write(
+                f"{row['backend']:<8} {_format(row['accuracy'], '{:.3f}'):>8} {row['p50_ms']:>8.2f} "
+                f"{row['p99_ms']:>8.2f} {_format(row['rss_mb'], '{:.1f}'):>8} {row['artifact_mb']:>8.2f}"
+            )
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stock.ingestion import ingest_stock, ingest_stocks_concurrently, watched_stocks
+from stock.ml.online import update_model
+from stock.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Ingest and score new Reddit posts for watched stocks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='*', help='Only ingest these symbols')
+        parser.add_argument('--limit', type=int, default=100, help='Maximum posts fetched per symbol and run')
+        parser.add_argument('--backfill', default='month', choices=['day', 'week', 'month', 'year'],
+                            help='How far back the first run of a symbol searches')
+        parser.add_argument('--max-symbols', type=int, help='Only ingest the N most watched symbols')
+        parser.add_argument('--interval', type=int, default=300, help='Seconds between polling rounds')
+        parser.add_argument('--concurrent', action='store_true',
+                            help='Search Reddit for all symbols at the same time with the async client')
+        parser.add_argument('--update-model', action='store_true',
+                            help='After every round, update the linear sentiment model with the new posts, '
+                                 'labelled from their VADER score')
+        parser.add_argument('--once', action='store_true', help='Run a single round and exit')
+        parser.add_argument('--rebuild-rollups', action='store_true',
+                            help='Recompute all daily sentiment rollups from stored posts and exit')
+
+    def handle(self, *args, **options):
+        if options['rebuild_rollups']:
+            for stock in watched_stocks(options['symbols']):
+                self.stdout.write(f"{stock.symbol}: {refresh_rollups(stock)} rollup rows")
+            return
+
+        while True:
+            stocks = watched_stocks(options['symbols'])
+            if options['max_symbols']:
+                stocks = stocks[:options['max_symbols']]
+
+            if options['concurrent']:
+                results = ingest_stocks_concurrently(stocks, limit=options['limit'], backfill=options['backfill'])
+            else:
+                results = {}
+                for stock in stocks:
+                    try:
+                        results[stock.symbol] = ingest_stock(stock, limit=options['limit'],
+                                                             backfill=options['backfill'])
+                    except Exception as e:
+                        results[stock.symbol] = e
+
+            for symbol, result in results.items():
+                if isinstance(result, Exception):
+                    self.stderr.write(f"{symbol}: ingestion failed: {result}")
+                else:
+                    self.stdout.write(f"{symbol}: {result} new posts")
+
+            if options['update_model']:
+                try:
+                    _, learned = update_model(settings.SENTIMENT_MODEL_DIR, weak_labels=True)
+                    self.stdout.write(f"Sentiment model learned from {learned} new posts")
+                except Exception as e:
+                    self.stderr.write(f"Sentiment model update failed: {e}")
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.ml.backends import BACKENDS
+from stock.ml.model_store import save_model
+from stock.ml.training import train_model, training_data
+
+
+class Command(BaseCommand):
+    help = 'Train the sentiment model on labelled Reddit posts and save it as a new version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weak-labels', action='store_true',
+                            help='Also train on unlabelled posts, labelled from their VADER score')
+        parser.add_argument('--min-samples', type=int, default=50, help='Fewest posts a model is trained on')
+        parser.add_argument('--test-size', type=float, default=0.2,
+                            help='Fraction of the posts held out to measure accuracy')
+        parser.add_argument('--backend', choices=sorted(BACKENDS),
+                            help='Model family to train, defaults to SENTIMENT_MODEL_BACKEND')
+        parser.add_argument('--output-dir', help='Directory of the model artifacts, defaults to SENTIMENT_MODEL_DIR')
+
+    def handle(self, *args, **options):
+        texts, labels, last_post_id = training_data(weak_labels=options['weak_labels'])
+        if len(texts) < options['min_samples']:
+            raise CommandError(f"Only {len(texts)} labelled posts, at least {options['min_samples']} are needed")
+        if len(set(labels)) < 2:
+            raise CommandError("Every labelled post has the same label")
+
+        backend = options['backend'] or getattr(settings, 'SENTIMENT_MODEL_BACKEND', 'forest')
+        model = train_model(texts, labels, test_size=options['test_size'], backend=backend)
+        # Online updates continue from the posts after this one
+        model.metadata['last_post_id'] = last_post_id
+        path = save_model(model, options['output_dir'] or settings.SENTIMENT_MODEL_DIR)
+
+        accuracy = model.metadata['accuracy']
+        self.stdout.write(f"Trained {backend} model {model.version} on {model.metadata['samples']} posts"
+                          + (f", held-out accuracy {accuracy:.3f}" if accuracy is not None else ""))
+        self.stdout.write(f"Saved {path}")
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stock.ml.online import update_model
+
+
+class Command(BaseCommand):
+    help = 'Update the linear sentiment model with the posts stored since its last update'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weak-labels', action='store_true',
+                            help='Also learn from unlabelled posts, labelled from their VADER score')
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts per partial_fit call')
+        parser.add_argument('--keep', type=int, default=5, help='Number of model checkpoints kept')
+        parser.add_argument('--output-dir', help='Directory of the model artifacts, defaults to SENTIMENT_MODEL_DIR')
+
+    def handle(self, *args, **options):
+        backend = getattr(settings, 'SENTIMENT_MODEL_BACKEND', 'forest')
+        if backend != 'linear':
+            self.stdout.write(f"Note: SENTIMENT_MODEL_BACKEND is '{backend}', the analyzer serves the linear "
+                              f"model only once it is set to 'linear'")
+        model, learned = update_model(
+            options['output_dir'] or settings.SENTIMENT_MODEL_DIR, weak_labels=options['weak_labels'],
+            batch_size=options['batch_size'], keep=options['keep'],
+        )
+        if model is None:
+            self.stdout.write("No new posts, the model is unchanged")
+        else:
+            self.stdout.write(f"Learned from {learned} new posts, saved model {model.version}")
@@ -0,0 +1,156 @@
+"""
+Ticker mentions in post texts, found with an Aho-Corasick automaton.
+
+The automaton holds every tracked symbol and finds all of them in one pass over
+a text, however many symbols there are. A match counts as a mention when it is
+a whole word and either a $cashtag, in any case, or a bare upper-case ticker.
+Tickers that are also common words (A, IT, ON, ...) only count as cashtags.
+"""
+
+import threading
+
+# Tickers that are common words or Reddit slang, only matched as $cashtags
+DEFAULT_BLOCKLIST = frozenset({
+    'A', 'AI', 'ALL', 'AM', 'AN', 'ANY', 'ARE', 'AT', 'ATH', 'BE', 'BIG', 'BY', 'CAN', 'CEO', 'DD',
+    'EOD', 'EPS', 'EV', 'FOR', 'GO', 'HAS', 'I', 'IPO', 'IT', 'LOVE', 'MAN', 'NEW', 'NOW', 'ON',
+    'ONE', 'OPEN', 'OR', 'OUT', 'PLAY', 'REAL', 'RUN', 'SEE', 'SO', 'TV', 'UK', 'US', 'USA', 'YOLO',
+})
+
+# Upper-cases ASCII letters only: str.upper() can change the length of a text
+# (German sharp s becomes SS), which would shift every index after it
+_ASCII_UPPER = str.maketrans('abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def _in_word(text, index):
+    """
+    Whether the character at index belongs to a word. A dot between word
+    characters does, so B is not found inside BRK.B, nor BRK inside BRK.B
+    """
+    char = text[index]
+    if _is_word_char(char):
+        return True
+    return (char == '.' and 0 < index < len(text) - 1
+            and _is_word_char(text[index - 1]) and _is_word_char(text[index + 1]))
+
+
+class MentionExtractor:
+    """
+    Aho-Corasick automaton over upper-case symbols.
+    Symbols can be added at any time: they are inserted into the trie in place,
+    and the next extraction recomputes the failure links and swaps in the new
+    automaton, while extractions already running finish on the previous one.
+    """
+
+    def __init__(self, symbols=(), blocklist=DEFAULT_BLOCKLIST):
+        """
+        :param symbols: Iterable of symbols
+        :param blocklist: Symbols matched only as cashtags
+        """
+        self.blocklist = frozenset(symbol.upper() for symbol in blocklist)
+        # Trie of every symbol added: transitions of each node and the symbol ending there
+        self._trie = [{}]
+        self._symbol = [None]
+        # (transitions, failure links, outputs) used by extract, never modified once built
+        self._automaton = ([{}], [0], [()])
+        self._dirty = False
+        self._lock = threading.Lock()
+        for symbol in symbols:
+            self.add(symbol)
+
+    def __contains__(self, symbol):
+        node = 0
+        for char in symbol.strip().upper():
+            node = self._trie[node].get(char)
+            if node is None:
+                return False
+        return self._symbol[node] is not None
+
+    def add(self, symbol):
+        """
+        Add a symbol to the automaton
+        :param symbol: Stock symbol
+        :return: None
+        """
+        symbol = symbol.strip().upper()
+        if not symbol:
+            return
+        with self._lock:
+            node = 0
+            for char in symbol:
+                child = self._trie[node].get(char)
+                if child is None:
+                    child = len(self._trie)
+                    self._trie.append({})
+                    self._symbol.append(None)
+                    self._trie[node][char] = child
+                node = child
+            if self._symbol[node] is None:
+                self._symbol[node] = symbol
+                self._dirty = True
+
+    def _build(self):
+        """
+        Compute the failure links and outputs of the trie breadth first
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            goto = [dict(transitions) for transitions in self._trie]
+            fail = [0] * len(goto)
+            # Symbols ending at a node, directly or through its failure links
+            outputs = [()] * len(goto)
+            queue = list(goto[0].values())
+            for node in queue:
+                outputs[node] = (self._symbol[node],) if self._symbol[node] else ()
+            for node in queue:
+                for char, child in goto[node].items():
+                    state = fail[node]
+                    while state and char not in goto[state]:
+                        state = fail[state]
+                    fail[child] = goto[state].get(char, 0)
+                    own = (self._symbol[child],) if self._symbol[child] else ()
+                    outputs[child] = own + outputs[fail[child]]
+                    queue.append(child)
+            self._automaton = (goto, fail, outputs)
+            self._dirty = False
+
+    def extract(self, text):
+        """
+        Symbols mentioned in a text
+        :param text: Text of a post
+        :return: Set of upper-case symbols
+        """
+        if not text:
+            return set()
+        if self._dirty:
+            self._build()
+        goto, fail, outputs = self._automaton
+
+        # Longest whole-word match starting at each position
+        longest = {}
+        upper = text.translate(_ASCII_UPPER)
+        node = 0
+        for end, char in enumerate(upper, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not outputs[node] or (end < len(text) and _in_word(text, end)):
+                continue
+            for symbol in outputs[node]:
+                start = end - len(symbol)
+                if start and _in_word(text, start - 1):
+                    continue
+                if len(symbol) > len(longest.get(start, '')):
+                    longest[start] = symbol
+
+        mentions = set()
+        for start, symbol in longest.items():
+            if start and text[start - 1] == '$':
+                mentions.add(symbol)
+            elif symbol not in self.blocklist and text[start:start + len(symbol)] == symbol:
+                mentions.add(symbol)
+        return mentions
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0002_price_store'),
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('covered_from', models.DateTimeField(blank=True, null=True)),
+                ('last_run', models.DateTimeField(blank=True, null=True)),
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ingestion_state', to='user.stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RedditPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reddit_id', models.CharField(max_length=16, unique=True)),
+                ('subreddit', models.CharField(max_length=64)),
+                ('title', models.TextField()),
+                ('selftext', models.TextField(blank=True)),
+                ('permalink', models.CharField(max_length=512)),
+                ('score', models.IntegerField(default=0)),
+                ('created_utc', models.DateTimeField()),
+                ('sentiment', models.FloatField()),
+                ('ml_sentiment', models.FloatField()),
+                ('ingested_at', models.DateTimeField(auto_now_add=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reddit_posts', to='user.stock')),
+            ],
+        ),
+    ]
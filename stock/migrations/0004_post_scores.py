@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_scores(apps, schema_editor):
+    RedditPost = apps.get_model('stock', 'RedditPost')
+    PostScore = apps.get_model('stock', 'PostScore')
+    PostScore.objects.bulk_create([
+        PostScore(post_id=post_id, textblob=sentiment, ml=ml_sentiment)
+        for post_id, sentiment, ml_sentiment in RedditPost.objects.values_list('id', 'sentiment', 'ml_sentiment')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0003_reddit_ingestion'),
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='scores', serialize=False, to='stock.redditpost')),
+                ('textblob', models.FloatField()),
+                ('vader', models.FloatField(blank=True, null=True)),
+                ('ml', models.FloatField()),
+                ('scored_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(copy_scores, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='redditpost',
+            name='ml_sentiment',
+        ),
+        migrations.RemoveField(
+            model_name='redditpost',
+            name='sentiment',
+        ),
+        migrations.AddIndex(
+            model_name='redditpost',
+            index=models.Index(fields=['stock', 'created_utc'], name='redditpost_stock_created'),
+        ),
+    ]
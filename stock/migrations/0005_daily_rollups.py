@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0004_post_scores'),
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySentimentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('subreddit', models.CharField(max_length=64)),
+                ('scorer', models.CharField(max_length=16)),
+                ('count', models.IntegerField()),
+                ('total', models.FloatField()),
+                ('total_sq', models.FloatField()),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sentiment_rollups', to='user.stock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stock', 'scorer', 'day', 'subreddit'), name='unique_daily_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0005_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='redditpost',
+            name='label',
+            field=models.SmallIntegerField(blank=True, choices=[(-1, 'Negative'), (0, 'Neutral'), (1, 'Positive')], null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0006_redditpost_label'),
+        ('user', '0002_create_missing_profiles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='redditpost',
+            name='reddit_id',
+            field=models.CharField(max_length=16),
+        ),
+        migrations.AddConstraint(
+            model_name='redditpost',
+            constraint=models.UniqueConstraint(fields=('reddit_id', 'stock'), name='unique_reddit_post_stock'),
+        ),
+    ]
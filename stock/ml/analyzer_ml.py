@@ -1,29 +1,28 @@
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestClassifier
 from nltk.sentiment import SentimentIntensityAnalyzer
-from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
-import re
 import nltk
 
+from stock import registry, text_normalization
+from stock.rollups import daily_trend
+from stock.scoring_pool import score_with_pool
+
 #TODO: Make the model more accurate
 #TODO: Add more information to be displayed
 class MlSentimentAnalyzer:
+    SCORER_NAME = 'vader'
+    SCORER_VERSION = '1'
+
     def __init__(self):
         """
         self.sia - an instance of SentimentIntensityAnalyzer for sentiment analysis
-        self.vectorizer - an instance of TfidfVectorizer for text vectorization
-        self.classifier - an instance of RandomForestClassifier for classification
         self.stop_words - a set of English stop words for text preprocessing
         self.quality_threshold - a threshold for quality classification
         :return: None
         """
         self.sia = SentimentIntensityAnalyzer()
-        self.vectorizer = TfidfVectorizer(max_features=1000)
-        self.classifier = RandomForestClassifier(n_estimators=100)
-        self.stop_words = set(stopwords.words('english'))
+        self.stop_words = frozenset(stopwords.words('english'))
         self.quality_threshold = 0.5
 
 
@@ -33,13 +32,30 @@ class MlSentimentAnalyzer:
         :param text: Text to be preprocessed
         :return: List of tokens
         """
-        if not isinstance(text, str):
-            return ""
-        text = text.lower()
-        text = re.sub(r'[^a-zA-Z\s]', '', text)
-        tokens = word_tokenize(text)
-        tokens = [word for word in tokens if word not in self.stop_words]
-        return ' '.join(tokens)
+        return text_normalization.preprocess(text, self.stop_words)
+
+    def preprocess_batch(self, texts):
+        """
+        Preprocess every text at once
+        :param texts: Series of texts
+        :return: Series of preprocessed texts aligned with texts
+        """
+        return text_normalization.preprocess_batch(texts, self.stop_words)
+
+    def vader_compound_batch(self, texts):
+        """
+        VADER compound score for every text, scoring each unique text only once
+        :param texts: Series of texts
+        :return: Array of compound scores aligned with texts
+        """
+        codes, uniques = pd.factorize(texts, sort=False, use_na_sentinel=False)
+        unique_scores = np.array(registry.get_score_cache().get_or_compute_many(
+            self.SCORER_NAME, self.SCORER_VERSION, list(uniques),
+            lambda missing: score_with_pool(
+                registry.get_scoring_pool(), 'compound_many', missing,
+                lambda texts: [self.sia.polarity_scores(text)['compound'] for text in texts])
+        ), dtype=float)
+        return unique_scores[codes]
 
     def calculate_quality(self, post):
         """
@@ -47,16 +63,21 @@ class MlSentimentAnalyzer:
         :param post:
         :return:
         """
-        qs = 0
-
-        if len(post['text']) > 100:
-            qs += 0.25
+        return self.calculate_quality_batch(pd.DataFrame([post]))[0]
 
-        if post['score'] > 10:
-            qs += 0.25
+    def calculate_quality_batch(self, posts_df):
+        """
+        Calculate quality of every post at once
+        :param posts_df: DataFrame with 'text' and 'score' columns
+        :return: Array of quality scores aligned with posts_df
+        """
+        if len(posts_df) == 0:
+            return np.array([], dtype=float)
 
-        sentiment_scores = self.sia.polarity_scores(post['text'])
-        qs += abs(sentiment_scores['compound']) * 0.5
+        texts = posts_df['text']
+        qs = np.where(texts.str.len().to_numpy() > 100, 0.25, 0.0)
+        qs = qs + np.where(posts_df['score'].to_numpy() > 10, 0.25, 0.0)
+        qs = qs + np.abs(self.vader_compound_batch(texts)) * 0.5
         return qs
 
     def filter_posts(self, posts_df):
@@ -65,7 +86,7 @@ class MlSentimentAnalyzer:
         :param posts_df: List of posts
         :return: Filtered list of posts
         """
-        posts_df['quality_score'] = posts_df.apply(self.calculate_quality, axis=1)
+        posts_df['quality_score'] = self.calculate_quality_batch(posts_df)
         return posts_df[posts_df['quality_score'] > self.quality_threshold]
 
     def analyze_sentiment(self, text):
@@ -74,15 +95,30 @@ class MlSentimentAnalyzer:
         :param text: Text to be analyzed
         :return: Sentiment score
         """
-        vader_sentiment = self.sia.polarity_scores(text)
+        return float(self.analyze_sentiment_batch([text])[0])
+
+    def analyze_sentiment_batch(self, texts):
+        """
+        Analyze sentiment of many texts at once, with the trained model
+        (see the train_sentiment_model command) or VADER and heuristics until there is one
+        :param texts: Iterable of preprocessed texts to be analyzed
+        :return: Array of sentiment scores aligned with texts
+        """
+        texts = pd.Series(texts, dtype=object)
+        if len(texts) == 0:
+            return np.array([], dtype=float)
+
+        model = registry.get_model_store().current()
+        if model is not None:
+            return model.score_batch(texts.fillna(''))
 
-        text_length = min(1000, len(text))
-        word_count = len(text.split())
-        has_question = 1 if '?' in text else 0
-        has_exclamation = 1 if '!' in text else 0
+        compound = self.vader_compound_batch(texts)
+        text_length = np.minimum(1000, texts.str.len().to_numpy())
+        has_question = texts.str.contains('?', regex=False).to_numpy(dtype=int)
+        has_exclamation = texts.str.contains('!', regex=False).to_numpy(dtype=int)
 
         sentiment_score = (
-                vader_sentiment['compound'] * 0.7 +
+                compound * 0.7 +
                 (text_length / 1000) * 0.1 +
                 (has_question * -0.1) +
                 (has_exclamation * 0.1)
@@ -92,7 +128,7 @@ class MlSentimentAnalyzer:
     def analyze_trend(self, posts_df, window_size=7):
         """
         Analyze trend of the posts
-        :param posts_df: List of posts
+        :param posts_df: List of posts, it is not modified
         :param window_size: Size of the window for trend analysis
         :return: Trend score
         """
@@ -105,23 +141,20 @@ class MlSentimentAnalyzer:
                 'current_sentiment': 0
             }
 
-        posts_df['date'] = pd.to_datetime(posts_df['created_utc'])
-        posts_df.set_index('date', inplace=True)
+        sentiment = posts_df['sentiment'].to_numpy(dtype=float)
+        days = pd.DatetimeIndex(pd.to_datetime(posts_df['created_utc'])).floor('D')
+        daily = pd.DataFrame({
+            'count': ~np.isnan(sentiment),
+            'total': np.nan_to_num(sentiment),
+        }, index=days).groupby(level=0).sum()
 
-        daily_sentiment = posts_df['sentiment'].resample('D').mean()
+        return self.analyze_trend_daily(daily, window_size=window_size)
 
-        moving_avg = daily_sentiment.rolling(window=window_size).mean()
-
-        trend = 'Neutral'
-        if len(moving_avg) > 0:
-            if moving_avg.iloc[-1] > 0.2:
-                trend = 'Bullish'
-            elif moving_avg.iloc[-1] < -0.2:
-                trend = 'Bearish'
-
-        return {
-            'trend': trend,
-            'daily_sentiment': daily_sentiment,
-            'moving_avg': moving_avg,
-            'current_sentiment': moving_avg.iloc[-1] if len(moving_avg) > 0 else 0
-        }
\ No newline at end of file
+    def analyze_trend_daily(self, daily, window_size=7):
+        """
+        Analyze trend from daily totals such as the stored sentiment rollups
+        :param daily: DataFrame indexed by day with 'count' and 'total' columns
+        :param window_size: Size of the window for trend analysis
+        :return: Trend score, see stock.rollups.daily_trend
+        """
+        return daily_trend(daily, window_size=window_size)
@@ -0,0 +1,116 @@
+"""
+Model families the sentiment model can be trained as, selected by SENTIMENT_MODEL_BACKEND.
+
+This module does not touch the database, so it can be imported in worker
+processes that never set Django up.
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from stock.ml.model_store import SentimentModel
+
+# Every label a model can predict. partial_fit has to know them up front, and
+# online updates can only continue a model that was fitted knowing all of them.
+CLASSES = np.array([-1, 0, 1])
+# Passes over the training data of models fitted with partial_fit
+EPOCHS = 10
+
+
+def build_forest_model(version):
+    """
+    Unfitted TF-IDF and random forest model
+    :param version: Version of the model
+    :return: SentimentModel
+    """
+    return SentimentModel(
+        vectorizer=TfidfVectorizer(max_features=1000),
+        classifier=RandomForestClassifier(n_estimators=100, random_state=0),
+        version=version,
+        backend='forest',
+    )
+
+
+def build_linear_model(version):
+    """
+    Unfitted hashing vectorizer and logistic regression model.
+    The hashing vectorizer has no vocabulary, so the fitted model is only its coefficients.
+    :param version: Version of the model
+    :return: SentimentModel
+    """
+    return SentimentModel(
+        vectorizer=HashingVectorizer(n_features=2 ** 18, alternate_sign=False),
+        classifier=SGDClassifier(loss='log_loss', alpha=1e-5, random_state=0),
+        version=version,
+        backend='linear',
+    )
+
+
+def new_version():
+    """
+    Version of a new artifact, later versions sort after earlier ones
+    :return: str
+    """
+    return datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')
+
+
+BACKENDS = {
+    'forest': build_forest_model,
+    'linear': build_linear_model,
+}
+
+
+def split(texts, labels, test_size):
+    """
+    Training and held-out parts of the data
+    :return: (train_texts, test_texts, train_labels, test_labels)
+    """
+    if not test_size:
+        return texts, [], labels, []
+    return train_test_split(texts, labels, test_size=test_size, random_state=0)
+
+
+def fit_model(backend, train_texts, train_labels):
+    """
+    Fit a new model of a backend
+    :param backend: Key of BACKENDS
+    :param train_texts: List of preprocessed texts
+    :param train_labels: Array of labels aligned with train_texts
+    :return: Fitted SentimentModel
+    """
+    model = BACKENDS[backend](new_version())
+    parallel = 'n_jobs' in model.classifier.get_params()
+    if parallel:
+        # Training may use every core, predicting must not: the saved model is
+        # loaded by each web worker, which would all spawn a job per core
+        model.classifier.set_params(n_jobs=-1)
+    features = model.vectorizer.fit_transform(train_texts)
+    if hasattr(model.classifier, 'partial_fit'):
+        # Fitted the way stock.ml.online continues it, with every label even if the data lacks some
+        train_labels = np.asarray(train_labels)
+        rng = np.random.default_rng(0)
+        for _ in range(EPOCHS):
+            order = rng.permutation(len(train_labels))
+            model.classifier.partial_fit(features[order], train_labels[order], classes=CLASSES)
+    else:
+        model.classifier.fit(features, train_labels)
+    if parallel:
+        model.classifier.set_params(n_jobs=None)
+    model.metadata = {'trained_at': datetime.now(timezone.utc).isoformat(), 'samples': len(train_texts)}
+    return model
+
+
+def accuracy(model, test_texts, test_labels):
+    """
+    Share of held-out texts the model labels correctly
+    :return: Accuracy, or None without held-out texts
+    """
+    if not len(test_texts):
+        return None
+    return float(accuracy_score(test_labels, model.classifier.predict(model.vectorizer.transform(test_texts))))
@@ -0,0 +1,105 @@
+"""
+Comparison of the sentiment model backends: held-out accuracy, latency of a
+single prediction as a request makes it, and resident memory of a loaded model.
+"""
+
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from stock.ml.backends import BACKENDS, accuracy, fit_model, split
+from stock.ml.model_store import load_model, save_model
+
+
+def rss_bytes():
+    """
+    Resident set size of the current process
+    :return: Bytes
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Peak instead of current size where /proc is missing; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _measure_load(path, results):
+    """
+    Load a model in a fresh process and report how much it grew, run in a child process
+    """
+    before = rss_bytes()
+    model = load_model(path)
+    model.score_batch(['warm up'])
+    results.put(rss_bytes() - before)
+
+
+def loaded_rss(path):
+    """
+    Memory a web worker spends on a model artifact
+    :param path: Path of the artifact
+    :return: Bytes
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure_load, args=(str(path), results))
+    process.start()
+    size = results.get(timeout=120)
+    process.join()
+    return size
+
+
+def latency_percentiles(model, texts, repeat=200):
+    """
+    Latency of scoring one text at a time
+    :param model: SentimentModel
+    :param texts: Texts to score, cycled through
+    :param repeat: Number of predictions timed
+    :return: (p50, p99) in milliseconds
+    """
+    timings = []
+    for i in range(repeat):
+        text = texts[i % len(texts)]
+        started = time.perf_counter()
+        model.score_batch([text])
+        timings.append((time.perf_counter() - started) * 1000)
+    return tuple(float(p) for p in np.percentile(timings, [50, 99]))
+
+
+def benchmark(texts, labels, backends=None, test_size=0.2, repeat=200, measure_memory=True):
+    """
+    Train every backend on the same split and measure it
+    :param texts: List of preprocessed texts
+    :param labels: Array of labels aligned with texts
+    :param backends: Backend names, defaults to all of them
+    :param test_size: Fraction of the data held out
+    :param repeat: Number of single predictions timed per backend
+    :param measure_memory: Load every model in a child process to measure its memory
+    :return: List of dictionaries with backend, accuracy, p50_ms, p99_ms, rss_mb and artifact_mb
+    """
+    train_texts, test_texts, train_labels, test_labels = split(texts, labels, test_size)
+    sample = list(test_texts) or list(train_texts)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in backends or sorted(BACKENDS):
+            model = fit_model(backend, train_texts, train_labels)
+            path = save_model(model, directory)
+            p50, p99 = latency_percentiles(load_model(path), sample, repeat=repeat)
+            results.append({
+                'backend': backend,
+                'accuracy': accuracy(model, test_texts, test_labels),
+                'p50_ms': p50,
+                'p99_ms': p99,
+                'rss_mb': loaded_rss(path) / 2 ** 20 if measure_memory else None,
+                'artifact_mb': path.stat().st_size / 2 ** 20,
+            })
+    return results
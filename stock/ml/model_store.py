@@ -0,0 +1,177 @@
+"""
+Versioned artifacts of the trained sentiment model.
+
+Every training run writes sentiment-<backend>-<version>.joblib and then points
+the LATEST-<backend> file at it. Artifacts are stored uncompressed and loaded with mmap_mode='r', so
+the numpy arrays of a model (IDF weights, class lists, linear coefficients) stay
+in the page cache shared by all worker processes. scikit-learn copies the node
+arrays of decision trees when unpickling them, so a forest is not shared.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+ARTIFACT_PATTERN = 'sentiment-{backend}-{version}.joblib'
+LATEST_PATTERN = 'LATEST-{backend}'
+
+
+class SentimentModel:
+    """
+    Fitted vectorizer and classifier predicting -1, 0 or 1 from a preprocessed text
+    """
+
+    def __init__(self, vectorizer, classifier, version, backend='forest', metadata=None):
+        """
+        :param vectorizer: Fitted text vectorizer
+        :param classifier: Fitted classifier with predict_proba
+        :param version: Version of the artifact
+        :param backend: Name of the model family, see stock.ml.training.BACKENDS
+        :param metadata: Dictionary describing the training run
+        """
+        self.vectorizer = vectorizer
+        self.classifier = classifier
+        self.version = version
+        self.backend = backend
+        self.metadata = metadata or {}
+
+    def predict_proba(self, texts):
+        """
+        Class probabilities of preprocessed texts
+        :param texts: Iterable of preprocessed texts
+        :return: Array of shape (len(texts), number of classes)
+        """
+        return self.classifier.predict_proba(self.vectorizer.transform(list(texts)))
+
+    def score_batch(self, texts):
+        """
+        Expected label of every text, from -1 (negative) to 1 (positive)
+        :param texts: Iterable of preprocessed texts
+        :return: Array of scores aligned with texts
+        """
+        texts = list(texts)
+        if not texts:
+            return np.array([], dtype=float)
+        return self.predict_proba(texts) @ self.classifier.classes_.astype(float)
+
+
+def save_model(model, directory):
+    """
+    Write a model as a new version and make it the latest one
+    :param model: SentimentModel
+    :param directory: Directory of the artifacts
+    :return: Path of the artifact
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / ARTIFACT_PATTERN.format(backend=model.backend, version=model.version)
+
+    # Written under a temporary name first, so readers never see half a file
+    tmp_path = path.with_suffix('.tmp')
+    joblib.dump({
+        'vectorizer': model.vectorizer,
+        'classifier': model.classifier,
+        'version': model.version,
+        'backend': model.backend,
+        'metadata': model.metadata,
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+    latest = directory / LATEST_PATTERN.format(backend=model.backend)
+    tmp_latest = latest.with_suffix('.tmp')
+    tmp_latest.write_text(path.name)
+    os.replace(tmp_latest, latest)
+    return path
+
+
+def load_model(path, mmap_mode='r'):
+    """
+    Load a model artifact
+    :param path: Path of the artifact
+    :param mmap_mode: joblib memory-map mode, None to read everything into memory
+    :return: SentimentModel
+    """
+    data = joblib.load(path, mmap_mode=mmap_mode)
+    return SentimentModel(data['vectorizer'], data['classifier'], data['version'],
+                          backend=data['backend'], metadata=data['metadata'])
+
+
+def latest_path(directory, backend='forest'):
+    """
+    Path of the latest artifact of a backend in a directory
+    :param directory: Directory of the artifacts
+    :param backend: Name of the model family
+    :return: Path, or None when no model was trained
+    """
+    try:
+        name = (Path(directory) / LATEST_PATTERN.format(backend=backend)).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return Path(directory) / name
+
+
+def prune_artifacts(directory, backend, keep):
+    """
+    Delete all but the newest artifacts of a backend, never the latest one
+    :param directory: Directory of the artifacts
+    :param backend: Name of the model family
+    :param keep: Number of artifacts kept
+    :return: List of deleted paths
+    """
+    latest = latest_path(directory, backend)
+    artifacts = sorted(Path(directory).glob(ARTIFACT_PATTERN.format(backend=backend, version='*')), reverse=True)
+    deleted = [path for path in artifacts[keep:] if path != latest]
+    for path in deleted:
+        path.unlink()
+    return deleted
+
+
+class ModelStore:
+    """
+    Keeps the latest model of a backend loaded.
+    The LATEST pointer is checked again every reload_interval seconds, and a new
+    version is loaded and swapped in while requests keep using the previous one.
+    """
+
+    def __init__(self, directory, backend='forest', reload_interval=30):
+        """
+        :param directory: Directory of the artifacts
+        :param backend: Name of the model family served
+        :param reload_interval: Seconds between checks for a newer version
+        """
+        self.directory = directory
+        self.backend = backend
+        self.reload_interval = reload_interval
+        self._model = None
+        self._path = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _fresh(self, now):
+        return self._checked_at is not None and now - self._checked_at < self.reload_interval
+
+    def current(self):
+        """
+        Latest trained model
+        :return: SentimentModel, or None when no model was trained yet
+        """
+        now = time.monotonic()
+        if self._fresh(now):
+            return self._model
+
+        with self._lock:
+            if not self._fresh(now):
+                self._checked_at = now
+                path = latest_path(self.directory, self.backend)
+                if path is not None and path != self._path:
+                    try:
+                        # Assigned in one step, so readers see either model, never a mix
+                        self._model = load_model(path)
+                        self._path = path
+                    except Exception as e:
+                        print(f"Error loading sentiment model {path}: {e}")
+        return self._model
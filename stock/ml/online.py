@@ -0,0 +1,58 @@
+"""
+Online updates of the linear sentiment model from newly stored posts.
+
+The hashing vectorizer has no vocabulary to refit, so new words are picked up
+by continuing partial_fit on posts stored since the last update. The cost of
+an update is proportional to the new posts, not to the whole corpus.
+"""
+
+import numpy as np
+from django.utils import timezone
+
+from stock.ml.backends import CLASSES, build_linear_model, new_version
+from stock.ml.model_store import latest_path, load_model, prune_artifacts, save_model
+from stock.ml.training import training_batches
+
+
+def update_model(directory, weak_labels=False, batch_size=500, keep=5):
+    """
+    Continue training the latest linear model on the posts stored after it
+    and save the result as a new checkpoint, also when the posts only moved the cursor
+    :param directory: Directory of the artifacts
+    :param weak_labels: Label posts nobody labelled from their stored VADER score
+    :param batch_size: Number of posts per partial_fit call
+    :param keep: Number of checkpoints kept
+    :return: (SentimentModel, number of posts learned from); the model is None when nothing was learned
+    """
+    path = latest_path(directory, 'linear')
+    # Loaded into memory, the coefficients are updated in place
+    model = load_model(path, mmap_mode=None) if path is not None else None
+    if model is not None and not np.array_equal(getattr(model.classifier, 'classes_', CLASSES), CLASSES):
+        # Fitted before models knew every label: partial_fit cannot continue it, so learn every post again
+        print(f"Model {model.version} lacks some labels, training a new one")
+        model = None
+    if model is None:
+        model = build_linear_model(new_version())
+    start_id = last_post_id = model.metadata.get('last_post_id', 0)
+
+    learned = 0
+    for texts, labels, last_post_id in training_batches(weak_labels, after_id=last_post_id, batch_size=batch_size):
+        if texts:
+            model.classifier.partial_fit(model.vectorizer.transform(texts), labels, classes=CLASSES)
+            learned += len(texts)
+
+    # Posts without a usable text or label still move the cursor, so they are not read again;
+    # a model that never learned anything has nothing worth saving
+    if not learned and (last_post_id == start_id or not hasattr(model.classifier, 'classes_')):
+        return None, 0
+
+    model.version = new_version()
+    model.metadata = {
+        **model.metadata,
+        'updated_at': timezone.now().isoformat(),
+        'samples': model.metadata.get('samples', 0) + learned,
+        'last_post_id': last_post_id,
+    }
+    save_model(model, directory)
+    prune_artifacts(directory, 'linear', keep)
+    return (model if learned else None), learned
@@ -0,0 +1,103 @@
+"""
+Training of the sentiment model on stored Reddit posts.
+"""
+
+import numpy as np
+from django.db.models import Min, Q
+
+from stock import registry
+from stock.ml.backends import accuracy, fit_model, split
+from stock.models import RedditPost
+
+# VADER's own thresholds between negative, neutral and positive
+WEAK_LABEL_THRESHOLD = 0.05
+
+
+def weak_label(compound):
+    """
+    Label from a VADER compound score
+    :param compound: VADER compound score
+    :return: -1, 0 or 1
+    """
+    if compound >= WEAK_LABEL_THRESHOLD:
+        return 1
+    if compound <= -WEAK_LABEL_THRESHOLD:
+        return -1
+    return 0
+
+
+def _labelled_posts(weak_labels):
+    """
+    Stored posts that can be trained on, one copy of each Reddit post
+    :param weak_labels: Include posts nobody labelled that have a VADER score
+    :return: QuerySet of RedditPost
+    """
+    labelled = Q(label__isnull=False)
+    if weak_labels:
+        labelled |= Q(scores__vader__isnull=False)
+    posts = RedditPost.objects.exclude(selftext='').filter(labelled)
+    # A post found for several stocks is stored once per stock, but trained on once,
+    # so its copies cannot end up on both sides of a train/test split
+    first_copies = posts.values('reddit_id').annotate(first_id=Min('id')).values('first_id')
+    return posts.filter(id__in=first_copies)
+
+
+def _texts_and_labels(rows):
+    """
+    Preprocessed texts and labels of (id, selftext, label, vader) rows, skipping empty texts
+    :return: (list of texts, array of labels)
+    """
+    texts, labels = [], []
+    preprocessed = registry.get_ml_analyzer().preprocess_batch([selftext for _, selftext, _, _ in rows])
+    for text, (_, _, label, vader) in zip(preprocessed, rows):
+        if not text:
+            continue
+        texts.append(text)
+        labels.append(label if label is not None else weak_label(vader))
+    return texts, np.array(labels, dtype=int)
+
+
+def training_data(weak_labels=False):
+    """
+    Preprocessed texts and labels of the stored posts.
+    The model is applied to the preprocessed selftext, so that is what it is trained on.
+    :param weak_labels: Label posts nobody labelled from their stored VADER score
+    :return: (list of texts, array of labels, id of the newest post used or 0)
+    """
+    rows = list(_labelled_posts(weak_labels).values_list('id', 'selftext', 'label', 'scores__vader'))
+    texts, labels = _texts_and_labels(rows)
+    return texts, labels, max((row[0] for row in rows), default=0)
+
+
+def training_batches(weak_labels=False, after_id=0, batch_size=500):
+    """
+    Posts stored after a given one, in id order and in batches of bounded size
+    :param weak_labels: Label posts nobody labelled from their stored VADER score
+    :param after_id: Only posts with a larger id are returned
+    :param batch_size: Number of posts read per query
+    :return: Iterator of (list of texts, array of labels, id of the last post of the batch)
+    """
+    posts = _labelled_posts(weak_labels).order_by('id')
+    while True:
+        rows = list(posts.filter(id__gt=after_id)
+                    .values_list('id', 'selftext', 'label', 'scores__vader')[:batch_size])
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        texts, labels = _texts_and_labels(rows)
+        yield texts, labels, after_id
+
+
+def train_model(texts, labels, test_size=0.2, backend='forest'):
+    """
+    Fit a model and measure it on a held-out part of the data
+    :param texts: List of preprocessed texts
+    :param labels: Array of labels aligned with texts
+    :param test_size: Fraction of the data held out, 0 to train on everything
+    :param backend: Key of BACKENDS
+    :return: Fitted SentimentModel
+    """
+    train_texts, test_texts, train_labels, test_labels = split(texts, labels, test_size)
+    model = fit_model(backend, train_texts, train_labels)
+    model.metadata['accuracy'] = accuracy(model, test_texts, test_labels)
+    return model
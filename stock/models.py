@@ -1,3 +1,151 @@
 from django.db import models
 
-# Create your models here.
+
+class CachedScore(models.Model):
+    """
+    Persistent tier of the sentiment score cache (see stock/score_cache.py)
+    """
+    scorer = models.CharField(max_length=32)
+    version = models.CharField(max_length=32)
+    text_hash = models.CharField(max_length=64)
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scorer', 'version', 'text_hash'], name='unique_cached_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.scorer}/{self.version}:{self.text_hash[:12]}"
+
+
+class PriceBar(models.Model):
+    """
+    One OHLCV bar of a symbol at a given interval (see stock/price_store.py)
+    """
+    symbol = models.CharField(max_length=10)
+    interval = models.CharField(max_length=5)
+    timestamp = models.DateTimeField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'interval', 'timestamp'], name='unique_price_bar'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} {self.interval} {self.timestamp:%Y-%m-%d %H:%M}"
+
+
+class PriceHistory(models.Model):
+    """
+    What part of a symbol's history is stored for an interval
+    """
+    symbol = models.CharField(max_length=10)
+    interval = models.CharField(max_length=5)
+    # Start of the stored range, None when the full history is stored
+    covered_from = models.DateTimeField(null=True, blank=True)
+    last_timestamp = models.DateTimeField()
+    timezone = models.CharField(max_length=64, default='UTC')
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'interval'], name='unique_price_history'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} {self.interval} history"
+
+
+class RedditPost(models.Model):
+    """
+    Reddit post ingested for a stock by the ingest_reddit command
+    """
+    reddit_id = models.CharField(max_length=16)
+    stock = models.ForeignKey('user.Stock', on_delete=models.CASCADE, related_name='reddit_posts')
+    subreddit = models.CharField(max_length=64)
+    title = models.TextField()
+    selftext = models.TextField(blank=True)
+    permalink = models.CharField(max_length=512)
+    score = models.IntegerField(default=0)
+    created_utc = models.DateTimeField()
+    ingested_at = models.DateTimeField(auto_now_add=True)
+    # Sentiment assigned by hand, the training data of the ML model
+    label = models.SmallIntegerField(null=True, blank=True, choices=[
+        (-1, 'Negative'),
+        (0, 'Neutral'),
+        (1, 'Positive'),
+    ])
+
+    class Meta:
+        # A thread found by the searches of several symbols is stored once for each of them
+        constraints = [
+            models.UniqueConstraint(fields=['reddit_id', 'stock'], name='unique_reddit_post_stock'),
+        ]
+        indexes = [
+            models.Index(fields=['stock', 'created_utc'], name='redditpost_stock_created'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def url(self):
+        return f'https://www.reddit.com{self.permalink}'
+
+
+class PostScore(models.Model):
+    """
+    Sentiment scores of a stored Reddit post
+    """
+    post = models.OneToOneField(RedditPost, on_delete=models.CASCADE, primary_key=True, related_name='scores')
+    textblob = models.FloatField()
+    # Posts scored before raw VADER scores were stored have none
+    vader = models.FloatField(null=True, blank=True)
+    ml = models.FloatField()
+    scored_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Scores of {self.post_id}"
+
+
+class IngestionState(models.Model):
+    """
+    Progress of Reddit ingestion for a stock
+    """
+    stock = models.OneToOneField('user.Stock', on_delete=models.CASCADE, related_name='ingestion_state')
+    # Newest post seen so far, the next run stops once it reaches it
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    # Stored posts are complete from this moment onwards
+    covered_from = models.DateTimeField(null=True, blank=True)
+    last_run = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Ingestion of {self.stock}"
+
+
+class DailySentimentRollup(models.Model):
+    """
+    Daily totals of one scorer's scores for a stock and subreddit (see stock/rollups.py)
+    """
+    stock = models.ForeignKey('user.Stock', on_delete=models.CASCADE, related_name='sentiment_rollups')
+    day = models.DateField()
+    subreddit = models.CharField(max_length=64)
+    scorer = models.CharField(max_length=16)
+    count = models.IntegerField()
+    total = models.FloatField()
+    total_sq = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'scorer', 'day', 'subreddit'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock} {self.scorer} {self.day} r/{self.subreddit}"
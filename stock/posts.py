@@ -0,0 +1,118 @@
+"""
+Compact representations of fetched Reddit posts.
+
+PostRecord keeps the few fields of a submission the analysis needs. PostBatch
+stores scored posts column by column, so thousands of posts cost a handful of
+arrays instead of one dictionary each, and dates and URLs are only formatted
+when a DataFrame is built.
+"""
+
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+REDDIT_URL = 'https://www.reddit.com'
+
+
+class PostRecord:
+    """
+    Fields of a submission used by the sentiment analysis
+    """
+
+    __slots__ = ('title', 'text', 'created_utc', 'permalink', 'subreddit')
+
+    def __init__(self, title, text, created_utc, permalink, subreddit):
+        self.title = title
+        self.text = text
+        self.created_utc = created_utc
+        self.permalink = permalink
+        self.subreddit = subreddit
+
+    @classmethod
+    def from_submission(cls, post):
+        """
+        :param post: PRAW or Async PRAW submission
+        :return: PostRecord
+        """
+        # Posts come from a few subreddits, so their names are shared
+        return cls(post.title, post.selftext, float(post.created_utc), post.permalink,
+                   sys.intern(post.subreddit.display_name))
+
+    @property
+    def full_text(self):
+        return f"{self.title} {self.text}"
+
+    @property
+    def url(self):
+        return f'{REDDIT_URL}{self.permalink}'
+
+    @property
+    def created_at(self):
+        return datetime.fromtimestamp(self.created_utc)
+
+    def __repr__(self):
+        return f"PostRecord({self.title!r}, {self.subreddit!r}, {self.created_utc})"
+
+
+class PostBatch:
+    """
+    Column store of scored posts
+    """
+
+    def __init__(self, records=(), scores=()):
+        """
+        :param records: List of PostRecord
+        :param scores: Sentiment scores aligned with records
+        """
+        self.titles = [record.title for record in records]
+        self.texts = [record.text for record in records]
+        self.permalinks = [record.permalink for record in records]
+        self.subreddits = [record.subreddit for record in records]
+        self.created_utc = np.fromiter((record.created_utc for record in records), dtype=np.float64,
+                                       count=len(self.titles))
+        self.scores = np.asarray(scores, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.titles)
+
+    @classmethod
+    def concat(cls, batches):
+        """
+        One batch holding the posts of several batches, in order
+        :param batches: List of PostBatch
+        :return: PostBatch
+        """
+        batch = cls()
+        for other in batches:
+            batch.titles.extend(other.titles)
+            batch.texts.extend(other.texts)
+            batch.permalinks.extend(other.permalinks)
+            batch.subreddits.extend(other.subreddits)
+        batch.created_utc = np.concatenate([batch.created_utc] + [other.created_utc for other in batches])
+        batch.scores = np.concatenate([batch.scores] + [other.scores for other in batches])
+        return batch
+
+    def to_frame(self):
+        """
+        DataFrame with the columns get_reddit_posts has always returned
+        :return: DataFrame, empty without columns when the batch is empty
+        """
+        if not len(self):
+            return pd.DataFrame()
+
+        # Naive local times, like datetime.fromtimestamp gives
+        created = (pd.to_datetime(self.created_utc, unit='s', utc=True)
+                   .tz_convert(timezone.get_default_timezone()).tz_localize(None))
+        permalinks = pd.Series(self.permalinks, dtype=object)
+        return pd.DataFrame({
+            'title': self.titles,
+            'text': self.texts,
+            'created_utc': created,
+            'sentiment': self.scores,
+            'created_at': created.strftime('%Y-%m-%d %H:%M:%S'),
+            'url': REDDIT_URL + permalinks,
+            'subreddit': self.subreddits,
+        }, copy=False)
@@ -0,0 +1,159 @@
+"""
+Local store of OHLCV bars, topped up incrementally from Yahoo Finance.
+
+Bars live in the PriceBar table, one logical partition per (symbol, interval).
+PriceHistory records which range of a partition is stored, so a repeated
+request only downloads the bars newer than the last stored one.
+"""
+
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from stock.models import PriceBar, PriceHistory
+
+PERIOD_LENGTHS = {
+    # 1d and 5d count trading days, so they reach back over weekends and holidays
+    '1d': timedelta(days=5),
+    '5d': timedelta(days=9),
+    '1mo': timedelta(days=31),
+    '3mo': timedelta(days=92),
+    '6mo': timedelta(days=183),
+    '1y': timedelta(days=366),
+    '2y': timedelta(days=731),
+    '5y': timedelta(days=1827),
+    '10y': timedelta(days=3653),
+}
+
+TRADING_DAY_PERIODS = {'1d': 1, '5d': 5}
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def period_start(period, now=None):
+    """
+    First moment covered by a yfinance period
+    :param period: Period such as 1mo, 1y, ytd or max
+    :param now: Current time, defaults to timezone.now()
+    :return: Aware datetime, or None for the full history
+    """
+    now = now or timezone.now()
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return datetime(now.year, 1, 1, tzinfo=dt_timezone.utc)
+    if period not in PERIOD_LENGTHS:
+        raise ValueError(f"Unsupported period: {period}")
+    return now - PERIOD_LENGTHS[period]
+
+
+class PriceStore:
+    """
+    Serves historical bars from the database and downloads only what is missing
+    """
+
+    def __init__(self, refresh_interval=60):
+        """
+        :param refresh_interval: Seconds before a stored partition is topped up again
+        """
+        self.refresh_interval = refresh_interval
+
+    def get_history(self, symbol, period, interval, download):
+        """
+        Bars of symbol at interval covering period
+        :param symbol: Stock symbol
+        :param period: yfinance period
+        :param interval: yfinance interval
+        :param download: Callable taking yfinance history() keyword arguments and returning a DataFrame
+        :return: DataFrame of Open, High, Low, Close, Volume indexed by exchange-local timestamps
+        """
+        symbol = symbol.upper()
+        now = timezone.now()
+        start = period_start(period, now)
+        state = PriceHistory.objects.filter(symbol=symbol, interval=interval).first()
+
+        covered = state is not None and (
+            state.covered_from is None or (start is not None and state.covered_from <= start)
+        )
+
+        if not covered:
+            frame = download(period=period, interval=interval)
+            saved = self._save(symbol, interval, frame, now, state, covered_from=start)
+            if saved is None:
+                return pd.DataFrame(columns=COLUMNS)
+            state = saved
+        elif (now - state.updated_at).total_seconds() >= self.refresh_interval:
+            # The last stored bar may still have been forming, so it is fetched again
+            frame = download(start=state.last_timestamp, interval=interval)
+            state = self._save(symbol, interval, frame, now, state, covered_from=state.covered_from)
+
+        frame = self._load(symbol, interval, start, state.timezone)
+        if period in TRADING_DAY_PERIODS and not frame.empty:
+            days = frame.index.normalize()
+            first_day = days.unique()[-TRADING_DAY_PERIODS[period]:][0]
+            frame = frame[days >= first_day]
+        return frame
+
+    def _save(self, symbol, interval, frame, now, state, covered_from):
+        """
+        Upsert downloaded bars and update the partition's coverage
+        :return: Updated PriceHistory, or None when there is nothing stored to cover
+        """
+        bars = []
+        tz_name = state.timezone if state is not None else 'UTC'
+        if frame is not None and not frame.empty:
+            frame = frame[COLUMNS].dropna(subset=['Close'])
+            index = pd.DatetimeIndex(frame.index)
+            if index.tz is None:
+                index = index.tz_localize('UTC')
+            else:
+                tz_name = str(index.tz)
+                index = index.tz_convert('UTC')
+
+            for timestamp, row in zip(index, frame.itertuples(index=False)):
+                bars.append(PriceBar(
+                    symbol=symbol, interval=interval, timestamp=timestamp.to_pydatetime(),
+                    open=row.Open, high=row.High, low=row.Low, close=row.Close,
+                    volume=int(row.Volume) if pd.notna(row.Volume) else 0,
+                ))
+
+        last_timestamp = max([bar.timestamp for bar in bars], default=None)
+        if state is not None and state.last_timestamp is not None:
+            last_timestamp = max(filter(None, [last_timestamp, state.last_timestamp]))
+        if last_timestamp is None:
+            # An empty download, or one whose every close is NaN, leaves no coverage to record
+            return None
+
+        with transaction.atomic():
+            if bars:
+                PriceBar.objects.bulk_create(
+                    bars, batch_size=500, update_conflicts=True,
+                    unique_fields=['symbol', 'interval', 'timestamp'],
+                    update_fields=['open', 'high', 'low', 'close', 'volume'],
+                )
+            if state is None:
+                state = PriceHistory(symbol=symbol, interval=interval)
+            state.covered_from = covered_from
+            state.last_timestamp = last_timestamp
+            state.timezone = tz_name
+            state.updated_at = now
+            state.save()
+        return state
+
+    def _load(self, symbol, interval, start, tz_name):
+        """
+        Read stored bars from start onwards
+        :return: DataFrame indexed by exchange-local timestamps
+        """
+        bars = PriceBar.objects.filter(symbol=symbol, interval=interval)
+        if start is not None:
+            bars = bars.filter(timestamp__gte=start)
+        rows = bars.order_by('timestamp').values_list('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+        frame = pd.DataFrame.from_records(list(rows), columns=['Timestamp'] + COLUMNS)
+        index = pd.DatetimeIndex(pd.to_datetime(frame.pop('Timestamp'), utc=True)).tz_convert(tz_name)
+        frame.index = index
+        return frame
@@ -0,0 +1,127 @@
+"""
+In-process quote cache with a TTL, single-flight loading and stale-while-revalidate.
+"""
+
+import threading
+import time
+
+
+class _Flight:
+    """
+    One upstream load that concurrent callers for the same symbol wait on
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    """
+    Cache of FetchStockData results keyed by symbol.
+
+    - Entries younger than ttl are served as they are.
+    - Entries younger than ttl + stale_ttl are served right away while a
+      background thread refreshes them.
+    - Concurrent misses for one symbol share a single upstream call.
+    """
+
+    def __init__(self, ttl=60, stale_ttl=300, should_cache=None):
+        """
+        :param ttl: Seconds a quote is considered fresh
+        :param stale_ttl: Extra seconds an expired quote may still be served while it is refreshed
+        :param should_cache: Callable deciding whether a loaded value is stored, defaults to successful results
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.should_cache = should_cache or (lambda value: bool(value and value.get('success')))
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol, loader):
+        """
+        Return the quote for symbol, loading it with loader when needed
+        :param symbol: Stock symbol
+        :param loader: Callable returning a fresh quote
+        :return: Quote
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                value, fetched_at = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    if symbol not in self._inflight:
+                        flight = self._inflight[symbol] = _Flight()
+                        threading.Thread(
+                            target=self._load, args=(symbol, loader, flight), daemon=True
+                        ).start()
+                    return value
+
+            flight = self._inflight.get(symbol)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[symbol] = _Flight()
+
+        if leader:
+            self._load(symbol, loader, flight)
+        else:
+            flight.event.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, symbol, loader, flight):
+        """
+        Run loader for a flight, store the result and wake up the waiting callers
+        """
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if flight.error is None and self.should_cache(flight.value):
+                    self._entries[symbol] = (flight.value, time.monotonic())
+                self._inflight.pop(symbol, None)
+            flight.event.set()
+
+    def set(self, symbol, value):
+        """
+        Store a quote fetched elsewhere
+        :param symbol: Stock symbol
+        :param value: Quote
+        :return: None
+        """
+        with self._lock:
+            self._entries[symbol] = (value, time.monotonic())
+
+    def peek(self, symbol):
+        """
+        Return the cached quote without loading it
+        :param symbol: Stock symbol
+        :return: Tuple of (quote, age in seconds) or None if not cached or too old
+        """
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is None:
+            return None
+        value, fetched_at = entry
+        age = time.monotonic() - fetched_at
+        if age >= self.ttl + self.stale_ttl:
+            return None
+        return value, age
+
+    def clear(self):
+        """
+        Drop every cached quote
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
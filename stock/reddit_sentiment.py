@@ -2,30 +2,136 @@
 File for Reddit sentiment analysis
 """
 
+import heapq
 import os
-import re
-from datetime import datetime
+import threading
+from collections import Counter
+from itertools import islice
 
 import pandas as pd
 import praw
+from django.conf import settings
 from dotenv import load_dotenv
 from textblob import TextBlob
-import re
+
+from stock import registry, text_normalization
+from stock.mentions import MentionExtractor
+from stock.posts import PostBatch, PostRecord
+from stock.scoring_pool import score_with_pool
 
 load_dotenv()
 
+def chunks(iterable, size):
+    """
+    Split an iterable into lists of at most size items without reading it all
+    :param iterable: Any iterable
+    :param size: Chunk size
+    :return: Iterator of lists
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def sentiment_category(score):
+    """
+    :param score: Sentiment score
+    :return: 'positive', 'negative' or 'neutral'
+    """
+    return "positive" if score > 0 else ("negative" if score < 0 else "neutral")
+
+
+class SentimentAggregate:
+    """
+    Running summary of scored posts: count, sum, category counts and the top posts.
+    Memory does not grow with the number of posts added.
+    """
+
+    def __init__(self, top_n=5):
+        self.top_n = top_n
+        self.count = 0
+        self.total = 0.0
+        self.distribution = Counter()
+        # Min-heap of (score, -position, title, url), the smallest of the top posts first
+        self._top = []
+
+    def add(self, records, scores):
+        """
+        Add a chunk of records and their scores
+        :param records: List of PostRecord
+        :param scores: List of sentiment scores aligned with records
+        :return: None
+        """
+        for record, score in zip(records, scores):
+            # Earlier posts win ties, like DataFrame.nlargest
+            item = (score, -self.count, record.title, record.url)
+            if len(self._top) < self.top_n:
+                heapq.heappush(self._top, item)
+            elif item > self._top[0]:
+                heapq.heapreplace(self._top, item)
+            self.count += 1
+            self.total += score
+            self.distribution[sentiment_category(score)] += 1
+
+    def result(self, stock_symbol, time_filter):
+        """
+        Result dictionary like RedditSentiment.analyze_sentiment returns
+        :param stock_symbol: Stock symbol the posts were fetched for
+        :param time_filter: Time filter the posts were fetched with
+        :return: Result dictionary
+        """
+        if self.count == 0:
+            return {
+                'success': False,
+                'data': None,
+                'error': f"No Reddit posts found for {stock_symbol}"
+            }
+
+        return {
+            'success': True,
+            'data': {
+                'average_sentiment': self.total / self.count,
+                'sentiment_distribution': dict(self.distribution.most_common()),
+                'posts_count': self.count,
+                'top_posts': [
+                    {'title': title, 'sentiment': score, 'url': url}
+                    for score, _, title, url in sorted(self._top, reverse=True)
+                ],
+                'time_filter': time_filter,
+            },
+            'error': None
+        }
+
 
 class RedditSentiment:
     """
-    Class to handle Reddit sentiment analysis
+    Class to handle Reddit sentiment analysis.
+    One instance is shared by every request thread (see stock.registry), so the
+    PRAW client, which is not thread-safe, is built lazily once per thread.
     """
 
+    SCORER_NAME = 'textblob'
+    SCORER_VERSION = '1'
+    SUBREDDITS = 'stocks+investing+wallstreetbets'
+
     def __init__(self):
-        self.reddit = praw.Reddit(
-            client_id=os.getenv('REDDIT_CLIENT_ID'),
-            client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
-            user_agent=os.getenv('REDDIT_USER_AGENT'),
-        )
+        self._local = threading.local()
+
+    @property
+    def reddit(self):
+        """
+        PRAW client for the current thread
+        :return: praw.Reddit
+        """
+        client = getattr(self._local, 'reddit', None)
+        if client is None:
+            client = praw.Reddit(
+                client_id=os.getenv('REDDIT_CLIENT_ID'),
+                client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
+                user_agent=os.getenv('REDDIT_USER_AGENT'),
+            )
+            self._local.reddit = client
+        return client
 
     def clean_text(self, text):
         """
@@ -33,19 +139,7 @@ class RedditSentiment:
         :param text: Text to be cleaned
         :return: Cleaned text
         """
-        if not isinstance(text, str):
-            return ""
-
-        # Removing links
-        text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-        # Removing mentions and hashtags (whole words)
-        text = re.sub(r'@\w+|#\w+', '', text)
-        # Removing special characters
-        text = re.sub(r'[^A-Za-z0-9\s]', '', text)
-        # Removing extra spaces
-        text = re.sub(r'\s+', ' ', text)
-
-        return text.strip()
+        return text_normalization.clean_text(text)
 
     def get_sentiment(self, text):
         """
@@ -58,44 +152,140 @@ class RedditSentiment:
         if not clean_text:
             return 0
 
-        analysis = TextBlob(clean_text)
-        return analysis.sentiment.polarity
+        return registry.get_score_cache().get_or_compute(
+            self.SCORER_NAME, self.SCORER_VERSION, clean_text,
+            lambda t: TextBlob(t).sentiment.polarity
+        )
+
+    def get_sentiment_batch(self, texts):
+        """
+        Sentiment polarity of many texts with one cache lookup
+        :param texts: List of texts
+        :return: List of scores aligned with texts
+        """
+        cleaned = text_normalization.clean_text_batch(texts).tolist()
+        to_score = [text for text in cleaned if text]
+        scores = iter(registry.get_score_cache().get_or_compute_many(
+            self.SCORER_NAME, self.SCORER_VERSION, to_score,
+            lambda batch: score_with_pool(
+                registry.get_scoring_pool(), 'polarity_many', batch,
+                lambda texts: [TextBlob(t).sentiment.polarity for t in texts])
+        ) if to_score else [])
+        return [next(scores) if text else 0 for text in cleaned]
+
+    def search(self, stock_symbol, limit=100, time_filter="week", sort="relevance"):
+        """
+        Search the stock subreddits for posts about a stock symbol
+        :param stock_symbol: Stock symbol to search for
+        :param limit: Number of posts to fetch
+        :param time_filter: Time period to filter posts (day, week, month, year, all)
+        :param sort: Order of the results (relevance, new, ...)
+        :return: Iterator of PRAW submissions
+        """
+        return self.search_query(f'{stock_symbol} stock', limit=limit, time_filter=time_filter, sort=sort)
+
+    def search_query(self, query, limit=100, time_filter="week", sort="relevance"):
+        """
+        Search the stock subreddits with a raw Reddit search query
+        :param query: Reddit search query
+        :param limit: Number of posts to fetch
+        :param time_filter: Time period to filter posts (day, week, month, year, all)
+        :param sort: Order of the results (relevance, new, ...)
+        :return: Iterator of PRAW submissions
+        """
+        return self.reddit.subreddit(self.SUBREDDITS).search(
+            query, limit=limit, time_filter=time_filter, sort=sort)
+
+    def mention_extractor(self, stock_symbol):
+        """
+        Extractor recognising a symbol: the shared one when the symbol is a tracked
+        Stock, otherwise one built for this symbol alone
+        :param stock_symbol: Stock symbol
+        :return: MentionExtractor
+        """
+        extractor = registry.get_mention_extractor()
+        if stock_symbol in extractor:
+            return extractor
+        return MentionExtractor([stock_symbol], blocklist=extractor.blocklist)
+
+    def mention_filter(self, stock_symbol, require_mention=None):
+        """
+        Test of whether a post is about a symbol, dropping the posts Reddit's fuzzy
+        search returned that do not mention it
+        :param stock_symbol: Stock symbol searched for
+        :param require_mention: Whether to test at all, defaults to the REDDIT_REQUIRE_MENTION setting
+        :return: Callable taking the full text of a post and returning a bool
+        """
+        if require_mention is None:
+            require_mention = getattr(settings, 'REDDIT_REQUIRE_MENTION', True)
+        if not require_mention:
+            return lambda text: True
+        extractor = self.mention_extractor(stock_symbol)
+        symbol = stock_symbol.strip().upper()
+        return lambda text: symbol in extractor.extract(text)
+
+    def iter_reddit_posts(self, stock_symbol, limit=100, time_filter="week", sort="relevance", require_mention=None):
+        """
+        Yield posts about a stock symbol as the search pages arrive.
+        An error ends the iteration, the posts yielded before it stay valid.
+        :param stock_symbol: Stock symbol to search for
+        :param limit: Number of posts to fetch
+        :param time_filter: Time period to filter posts (day, week, month, year, all)
+        :param sort: Order of the results (relevance, new, ...)
+        :param require_mention: Skip posts Reddit's fuzzy search returned that do not
+            mention the symbol, defaults to the REDDIT_REQUIRE_MENTION setting
+        :return: Iterator of PostRecord
+        """
+        mentions = self.mention_filter(stock_symbol, require_mention)
+        try:
+            for post in self.search(stock_symbol, limit=limit, time_filter=time_filter, sort=sort):
+                record = PostRecord.from_submission(post)
+                if mentions(record.full_text):
+                    yield record
+        except Exception as e:
+            print(f"Error fetching Reddit posts: {e}")
 
-    def get_reddit_posts(self, stock_symbol,limit = 100, time_filter="week"):
+    def get_reddit_posts(self, stock_symbol,limit = 100, time_filter="week", chunk_size=100):
         """
         Fetch Reddit posts for a given stock symbol
         :param stock_symbol: Stock symbol to search for
         :param limit: Number of posts to fetch
         :param time_filter: Time period to filter posts (week, month, year)
+        :param chunk_size: Number of posts scored at once
         :return: DataFrame with Reddit posts and their sentiment scores
         """
-        posts = []
+        batches = []
 
-        try:
-            # Fetching posts from multiple subreddits
-            for post in self.reddit.subreddit(
-                            'stocks+investing+wallstreetbets').search(
-                            f'{stock_symbol} stock', limit=limit, time_filter=time_filter):
-
-                full_text = f"{post.title} {post.selftext}"
-                sentiment_score = self.get_sentiment(full_text)
-
-                # Only consider posts with a sentiment score
-                posts.append({
-                    'title': post.title,
-                    'text': post.selftext,
-                    'created_utc': datetime.fromtimestamp(post.created_utc),
-                    'sentiment': sentiment_score,
-                    'created_at': datetime.fromtimestamp(post.created_utc).strftime('%Y-%m-%d %H:%M:%S'),
-                    'url': f'https://www.reddit.com{post.permalink}',
-                    'subreddit': post.subreddit.display_name,
-                })
+        # Fetching posts from multiple subreddits
+        for chunk in chunks(self.iter_reddit_posts(stock_symbol, limit=limit, time_filter=time_filter), chunk_size):
+            try:
+                scores = self.get_sentiment_batch([record.full_text for record in chunk])
+            except Exception as e:
+                print(f"Error scoring Reddit posts: {e}")
+                break
+            batches.append(PostBatch(chunk, scores))
 
-        except Exception as e:
-            print(f"Error fetching Reddit posts: {e}")
-            return pd.DataFrame()
+        return PostBatch.concat(batches).to_frame()
 
-        return pd.DataFrame(posts)
+    def analyze_sentiment_stream(self, stock_symbol, time_filter="week", limit=1000, chunk_size=100):
+        """
+        Analyze sentiment of many Reddit posts in fixed-size chunks, so memory stays
+        flat however many posts the search returns
+        :param stock_symbol: Stock symbol to search for
+        :param time_filter: Time period to filter posts
+        :param limit: Number of posts to fetch
+        :param chunk_size: Number of posts scored at once
+        :return: Result dictionary like analyze_sentiment returns
+        """
+        aggregate = SentimentAggregate()
+        for chunk in chunks(self.iter_reddit_posts(stock_symbol, limit=limit, time_filter=time_filter), chunk_size):
+            try:
+                scores = self.get_sentiment_batch([record.full_text for record in chunk])
+            except Exception as e:
+                print(f"Error scoring Reddit posts: {e}")
+                break
+            aggregate.add(chunk, scores)
+        return aggregate.result(stock_symbol, time_filter)
 
     def analyze_sentiment(self, stock_symbol, time_filter="week"):
         """
@@ -105,7 +295,16 @@ class RedditSentiment:
         :return:
         """
         posts_df = self.get_reddit_posts(stock_symbol, time_filter=time_filter)
+        return self.summarize(posts_df, stock_symbol, time_filter)
 
+    def summarize(self, posts_df, stock_symbol, time_filter):
+        """
+        Sentiment summary of fetched posts
+        :param posts_df: DataFrame returned by get_reddit_posts
+        :param stock_symbol: Stock symbol the posts were fetched for
+        :param time_filter: Time filter the posts were fetched with
+        :return: Result dictionary
+        """
         if len(posts_df) == 0:
             return {
                 'success': False,
@@ -115,9 +314,7 @@ class RedditSentiment:
 
         avg_sentiment = posts_df['sentiment'].mean()
 
-        posts_df["sentiment_category"] = posts_df["sentiment"].apply(
-            lambda x: "positive" if x > 0 else ("negative" if x < 0 else "neutral")
-        )
+        posts_df["sentiment_category"] = posts_df["sentiment"].apply(sentiment_category)
 
         sentiment_count = posts_df["sentiment_category"].value_counts().to_dict()
 
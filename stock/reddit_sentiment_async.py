@@ -0,0 +1,223 @@
+"""
+Async Reddit sentiment analysis on Async PRAW.
+
+Searches for several symbols, or for one symbol in each subreddit, run
+concurrently in one event loop over a single pooled HTTP session, paced by a
+token bucket that follows the rate-limit headers Reddit sends back.
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from itertools import zip_longest
+
+import aiohttp
+import asyncpraw
+import pandas as pd
+
+from stock.posts import PostBatch, PostRecord
+from stock.reddit_sentiment import RedditSentiment
+
+# Reddit listings return at most this many posts per request
+PAGE_SIZE = 100
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket shared by every coroutine that calls Reddit.
+
+    Tokens refill at rate per second up to capacity. Reddit reports how many
+    requests are left in its window, and the bucket never holds more than that.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: Tokens added per second
+        :param capacity: Largest number of requests made in a burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """
+        Wait until a request may be made and take its token
+        :return: None
+        """
+        # Coroutines of one loop only switch at await, so no lock is needed
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def update_from_limits(self, limits):
+        """
+        Lower the available tokens to what Reddit says is left
+        :param limits: Dictionary with 'remaining' as returned by reddit.auth.limits
+        :return: None
+        """
+        remaining = limits.get('remaining')
+        if remaining is not None:
+            self._refill()
+            self._tokens = min(self._tokens, float(remaining))
+
+
+class AsyncRedditSentiment(RedditSentiment):
+    """
+    Async variant of RedditSentiment.
+    One instance is shared by the process (see stock.registry). Async PRAW clients
+    are bound to the event loop they were created in, so one client and HTTP
+    session is kept per running loop and reused by every search in it.
+    """
+
+    def __init__(self, requests_per_minute=100, max_connections=10):
+        """
+        :param requests_per_minute: Reddit requests allowed per minute
+        :param max_connections: Size of the HTTP connection pool
+        """
+        super().__init__()
+        self.max_connections = max_connections
+        self.bucket = AsyncTokenBucket(rate=requests_per_minute / 60, capacity=max_connections)
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def reddit(self):
+        """
+        Async PRAW client of the running event loop
+        :return: asyncpraw.Reddit
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+            client = asyncpraw.Reddit(
+                client_id=os.getenv('REDDIT_CLIENT_ID'),
+                client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
+                user_agent=os.getenv('REDDIT_USER_AGENT'),
+                requestor_kwargs={'session': session},
+            )
+            self._clients[loop] = client
+        return client
+
+    async def close(self):
+        """
+        Close the client and HTTP session of the running event loop
+        :return: None
+        """
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    async def search(self, stock_symbol, limit=100, time_filter="week", sort="relevance", subreddits=None):
+        """
+        Search subreddits for posts about a stock symbol
+        :param stock_symbol: Stock symbol to search for
+        :param limit: Number of posts to fetch
+        :param time_filter: Time period to filter posts (day, week, month, year, all)
+        :param sort: Order of the results (relevance, new, ...)
+        :param subreddits: Subreddits joined with '+', defaults to SUBREDDITS
+        :return: Async iterator of Async PRAW submissions
+        """
+        reddit = self.reddit
+        subreddit = await reddit.subreddit(subreddits or self.SUBREDDITS)
+        listing = subreddit.search(f'{stock_symbol} stock', limit=limit, time_filter=time_filter, sort=sort)
+
+        fetched = 0
+        while True:
+            # Every PAGE_SIZE posts the listing makes another request
+            if fetched % PAGE_SIZE == 0:
+                await self.bucket.acquire()
+            try:
+                post = await listing.__anext__()
+            except StopAsyncIteration:
+                break
+            if fetched % PAGE_SIZE == 0:
+                self.bucket.update_from_limits(reddit.auth.limits)
+            fetched += 1
+            yield post
+
+    async def search_each_subreddit(self, stock_symbol, limit=100, time_filter="week", sort="relevance"):
+        """
+        Search every subreddit separately at the same time and merge the results.
+        Newest-first searches are merged by date, others are interleaved.
+        :return: List of at most limit Async PRAW submissions
+        """
+        async def collect(subreddit):
+            return [post async for post in self.search(
+                stock_symbol, limit=limit, time_filter=time_filter, sort=sort, subreddits=subreddit)]
+
+        listings = await asyncio.gather(*(collect(name) for name in self.SUBREDDITS.split('+')))
+
+        if sort == 'new':
+            ordered = sorted((post for posts in listings for post in posts),
+                             key=lambda post: post.created_utc, reverse=True)
+        else:
+            ordered = [post for rank in zip_longest(*listings) for post in rank if post is not None]
+
+        merged, seen = [], set()
+        for post in ordered:
+            # A crosspost can be found in more than one subreddit
+            if post.id not in seen:
+                seen.add(post.id)
+                merged.append(post)
+        return merged[:limit]
+
+    async def get_reddit_posts(self, stock_symbol, limit=100, time_filter="week", per_subreddit=False):
+        """
+        Fetch Reddit posts for a given stock symbol
+        :param stock_symbol: Stock symbol to search for
+        :param limit: Number of posts to fetch
+        :param time_filter: Time period to filter posts (week, month, year)
+        :param per_subreddit: Search each subreddit concurrently instead of all of them at once
+        :return: DataFrame with Reddit posts and their sentiment scores
+        """
+        try:
+            if per_subreddit:
+                posts = await self.search_each_subreddit(stock_symbol, limit=limit, time_filter=time_filter)
+            else:
+                posts = [post async for post in self.search(stock_symbol, limit=limit, time_filter=time_filter)]
+            # Building the shared extractor reads the Stock table, which needs a thread
+            mentions = await asyncio.to_thread(self.mention_filter, stock_symbol)
+            records = [record for record in map(PostRecord.from_submission, posts) if mentions(record.full_text)]
+            # Scoring is CPU-bound, so it runs off the event loop
+            scores = await asyncio.to_thread(self.get_sentiment_batch, [record.full_text for record in records])
+        except Exception as e:
+            print(f"Error fetching Reddit posts: {e}")
+            return pd.DataFrame()
+
+        return PostBatch(records, scores).to_frame()
+
+    async def analyze_sentiment(self, stock_symbol, time_filter="week", per_subreddit=False):
+        """
+        Analyze sentiment of Reddit posts for a given stock symbol
+        :param stock_symbol: Stock symbol
+        :param time_filter: Time period to filter posts
+        :param per_subreddit: Search each subreddit concurrently
+        :return: Result dictionary like RedditSentiment.analyze_sentiment returns
+        """
+        posts_df = await self.get_reddit_posts(stock_symbol, time_filter=time_filter, per_subreddit=per_subreddit)
+        return self.summarize(posts_df, stock_symbol, time_filter)
+
+    async def analyze_many(self, stock_symbols, time_filter="week", per_subreddit=False):
+        """
+        Analyze several symbols concurrently
+        :param stock_symbols: List of stock symbols
+        :param time_filter: Time period to filter posts
+        :param per_subreddit: Search each subreddit concurrently as well
+        :return: Dictionary mapping symbol to its result dictionary
+        """
+        results = await asyncio.gather(*(
+            self.analyze_sentiment(symbol, time_filter=time_filter, per_subreddit=per_subreddit)
+            for symbol in stock_symbols
+        ))
+        return dict(zip(stock_symbols, results))
+
@@ -0,0 +1,234 @@
+"""
+Process-wide registry of shared analysis services.
+
+Building a RedditSentiment or an MlSentimentAnalyzer is expensive (VADER lexicon,
+stopword corpus, sklearn estimators), so every worker process builds them once and
+reuses them across requests and threads.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_instances = {}
+
+
+def _get_or_create(name, factory):
+    """
+    Return the shared instance registered under name, building it on first use
+    :param name: Registry key
+    :param factory: Callable building the instance
+    :return: Shared instance
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        # Another thread may have built it while we were waiting for the lock
+        instance = _instances.get(name)
+        if instance is None:
+            instance = factory()
+            _instances[name] = instance
+    return instance
+
+
+def peek(name):
+    """
+    Return the shared instance registered under name without building it
+    :param name: Registry key
+    :return: Shared instance, or None if nothing built it yet
+    """
+    return _instances.get(name)
+
+
+def get_reddit_sentiment():
+    """
+    Shared RedditSentiment instance
+    :return: RedditSentiment
+    """
+    from stock.reddit_sentiment import RedditSentiment
+    return _get_or_create('reddit_sentiment', RedditSentiment)
+
+
+def get_async_reddit_sentiment():
+    """
+    Shared AsyncRedditSentiment instance
+    :return: AsyncRedditSentiment
+    """
+    from stock.reddit_sentiment_async import AsyncRedditSentiment
+    return _get_or_create('async_reddit_sentiment', lambda: AsyncRedditSentiment(
+        requests_per_minute=getattr(settings, 'REDDIT_REQUESTS_PER_MINUTE', 100),
+        max_connections=getattr(settings, 'REDDIT_MAX_CONNECTIONS', 10),
+    ))
+
+
+def get_ml_analyzer():
+    """
+    Shared MlSentimentAnalyzer instance
+    :return: MlSentimentAnalyzer
+    """
+    from stock.ml.analyzer_ml import MlSentimentAnalyzer
+    return _get_or_create('ml_analyzer', MlSentimentAnalyzer)
+
+
+def get_model_store():
+    """
+    Shared store of the trained sentiment model
+    :return: ModelStore
+    """
+    from stock.ml.model_store import ModelStore
+    return _get_or_create('model_store', lambda: ModelStore(
+        getattr(settings, 'SENTIMENT_MODEL_DIR', settings.BASE_DIR / 'ml_models'),
+        backend=getattr(settings, 'SENTIMENT_MODEL_BACKEND', 'forest'),
+        reload_interval=getattr(settings, 'SENTIMENT_MODEL_RELOAD_INTERVAL', 30),
+    ))
+
+
+def get_mention_extractor():
+    """
+    Shared ticker mention extractor over every Stock symbol, kept up to date by stock.signals
+    :return: MentionExtractor
+    """
+    from stock.mentions import DEFAULT_BLOCKLIST, MentionExtractor
+    from user.models import Stock
+    return _get_or_create('mention_extractor', lambda: MentionExtractor(
+        Stock.objects.values_list('symbol', flat=True).iterator(),
+        blocklist=getattr(settings, 'MENTION_BLOCKLIST', DEFAULT_BLOCKLIST),
+    ))
+
+
+def get_live_hub():
+    """
+    Shared publish/subscribe hub of live symbol updates
+    :return: LiveHub
+    """
+    from stock.live import LiveHub
+    return _get_or_create('live_hub', lambda: LiveHub(
+        interval=getattr(settings, 'LIVE_POLL_INTERVAL', 10),
+        queue_size=getattr(settings, 'LIVE_QUEUE_SIZE', 100),
+    ))
+
+
+def get_score_cache():
+    """
+    Shared sentiment score cache
+    :return: ScoreCache
+    """
+    from stock.score_cache import ScoreCache
+    return _get_or_create('score_cache', lambda: ScoreCache(
+        max_size=getattr(settings, 'SCORE_CACHE_SIZE', 10000),
+        persistent=getattr(settings, 'SCORE_CACHE_PERSISTENT', False),
+    ))
+
+
+def get_quote_cache():
+    """
+    Shared stock quote cache
+    :return: QuoteCache
+    """
+    from stock.quote_cache import QuoteCache
+    return _get_or_create('quote_cache', lambda: QuoteCache(
+        ttl=getattr(settings, 'QUOTE_CACHE_TTL', 60),
+        stale_ttl=getattr(settings, 'QUOTE_CACHE_STALE_TTL', 300),
+    ))
+
+
+def get_price_store():
+    """
+    Shared local OHLCV store
+    :return: PriceStore
+    """
+    from stock.price_store import PriceStore
+    return _get_or_create('price_store', lambda: PriceStore(
+        refresh_interval=getattr(settings, 'PRICE_HISTORY_REFRESH', 60),
+    ))
+
+
+def get_circuit_breaker(upstream):
+    """
+    Shared circuit breaker for an upstream service
+    :param upstream: Name of the upstream service
+    :return: CircuitBreaker
+    """
+    from stock.retry import CircuitBreaker
+    return _get_or_create(f'circuit_breaker:{upstream}', lambda: CircuitBreaker(
+        failure_threshold=getattr(settings, 'RATE_LIMIT_BREAKER_THRESHOLD', 5),
+        reset_timeout=getattr(settings, 'RATE_LIMIT_BREAKER_RESET', 60),
+    ))
+
+
+def get_executor():
+    """
+    Shared thread pool used to run upstream lookups concurrently
+    :return: ThreadPoolExecutor
+    """
+    return _get_or_create('executor', lambda: ThreadPoolExecutor(
+        max_workers=getattr(settings, 'STOCK_FETCH_WORKERS', 8),
+        thread_name_prefix='stock-fetch',
+    ))
+
+
+def get_source_slots(name):
+    """
+    Semaphore bounding the pool threads one fan_out source may hold at once
+    :param name: Source name, sources missing from STOCK_SOURCE_SLOTS get the 'default' number of slots
+    :return: threading.BoundedSemaphore
+    """
+    slots = getattr(settings, 'STOCK_SOURCE_SLOTS', {})
+    return _get_or_create(f'source_slots:{name}', lambda: threading.BoundedSemaphore(
+        slots.get(name, slots.get('default', 2))
+    ))
+
+
+def get_scoring_pool():
+    """
+    Shared scoring process pool, None unless SCORING_POOL_WORKERS is set
+    :return: ScoringPool or None
+    """
+    workers = getattr(settings, 'SCORING_POOL_WORKERS', 0)
+    if not workers:
+        return None
+    from stock.scoring_pool import ScoringPool
+    return _get_or_create('scoring_pool', lambda: ScoringPool(
+        workers=workers,
+        chunk_size=getattr(settings, 'SCORING_POOL_CHUNK_SIZE', 500),
+        min_batch=getattr(settings, 'SCORING_POOL_MIN_BATCH', 200),
+    ))
+
+
+def warm_up():
+    """
+    Build every shared service up front so the first request is not the cold one.
+    Failures are reported, not raised, so a missing corpus does not stop the worker.
+    :return: Dictionary mapping service name to True if it was built
+    """
+    status = {}
+    for name, getter in (('reddit_sentiment', get_reddit_sentiment),
+                         ('ml_analyzer', get_ml_analyzer)):
+        try:
+            getter()
+            status[name] = True
+        except Exception as e:
+            print(f"Error warming up {name}: {e}")
+            status[name] = False
+    return status
+
+
+def warm_up_enabled():
+    """
+    Whether services should be built when the app is loaded
+    :return: bool
+    """
+    return getattr(settings, 'STOCK_WARM_UP_ON_START', False)
+
+
+def reset():
+    """
+    Drop every shared instance, mostly useful in tests
+    :return: None
+    """
+    with _lock:
+        _instances.clear()
@@ -0,0 +1,101 @@
+"""
+Cache of sentiment analysis results shared by the sentiment pages.
+
+Results are cached, not rendered pages, because a page also holds the CSRF
+token and the signed-in user's navigation. Keys combine the normalised symbol,
+the time filter, the scorer and its version, and the symbol's last ingestion
+run. Every ingest_reddit run therefore moves a symbol to new keys in all
+processes, whatever the cache backend, and the orphaned results expire with
+their TTL.
+"""
+
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+from stock.models import IngestionState
+
+KEY_PREFIX = 'stock:result'
+# Symbols outside this pattern are not cached, so user input never ends up in a cache key
+SYMBOL_PATTERN = re.compile(r'[A-Z0-9.^=-]{1,16}')
+
+DEFAULT_TTLS = {
+    'day': 60,
+    'week': 300,
+    'month': 1800,
+    'year': 3600,
+}
+
+
+def _cache():
+    return caches[getattr(settings, 'RESULT_CACHE_ALIAS', 'default')]
+
+
+def normalize_symbol(symbol):
+    """
+    :param symbol: Symbol as typed by the user
+    :return: Upper-cased symbol, or None if it cannot be cached
+    """
+    symbol = (symbol or '').strip().upper()
+    return symbol if SYMBOL_PATTERN.fullmatch(symbol) else None
+
+
+def ttl(time_filter):
+    """
+    Seconds a result of a time filter stays cached; longer windows change more slowly
+    :param time_filter: day, week, month or year
+    :return: Seconds
+    """
+    ttls = getattr(settings, 'RESULT_CACHE_TTLS', DEFAULT_TTLS)
+    return ttls.get(time_filter, ttls.get('week', DEFAULT_TTLS['week']))
+
+
+def _generation(symbol):
+    """
+    Last ingestion run of a symbol, read from the database so that a run of
+    ingest_reddit in another process changes the keys of every web worker
+    """
+    last_run = (IngestionState.objects.filter(stock__symbol=symbol)
+                .values_list('last_run', flat=True).first())
+    return last_run.timestamp() if last_run is not None else 0
+
+
+def result_key(symbol, time_filter, scorer, version):
+    """
+    Cache key of an analysis result, read once per request so the lookup and the
+    store of a miss use the same ingestion generation
+    :param symbol: Stock symbol
+    :param time_filter: Time filter of the analysis
+    :param scorer: Scorer name
+    :param version: Scorer or model version
+    :return: Cache key, or None if the symbol cannot be cached
+    """
+    symbol = normalize_symbol(symbol)
+    if symbol is None:
+        return None
+    return f'{KEY_PREFIX}:{scorer}:{version}:{symbol}:{time_filter}:{_generation(symbol)}'
+
+
+def get_result(key):
+    """
+    Cached analysis result
+    :param key: Key returned by result_key
+    :return: Result dictionary, or None on a miss
+    """
+    if key is None:
+        return None
+    return _cache().get(key)
+
+
+def set_result(key, time_filter, result):
+    """
+    Cache a successful analysis result; failures are retried on the next request
+    :param key: Key returned by result_key
+    :param time_filter: Time filter of the analysis
+    :param result: Result dictionary
+    :return: None
+    """
+    if key is None or not result.get('success'):
+        return
+    _cache().set(key, result, timeout=ttl(time_filter))
@@ -0,0 +1,242 @@
+"""
+Retry policy with exponential backoff, jitter, a deadline budget and a circuit breaker
+shared by the upstream data fetchers.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+from requests.exceptions import HTTPError
+
+
+def is_rate_limit(error):
+    """
+    Whether an exception is an HTTP 429 response
+    :param error: Exception raised by an upstream call
+    :return: bool
+    """
+    response = getattr(error, 'response', None)
+    return isinstance(error, HTTPError) and response is not None and response.status_code == 429
+
+
+class RetryError(Exception):
+    """
+    Raised when every attempt failed or the deadline did not allow another one
+    """
+
+    def __init__(self, last_error, attempts):
+        super().__init__(f"Gave up after {attempts} attempt(s): {last_error}")
+        self.last_error = last_error
+        self.attempts = attempts
+
+    @property
+    def rate_limited(self):
+        return is_rate_limit(self.last_error)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling upstream while the circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated rate-limit responses.
+
+    After failure_threshold consecutive 429s the circuit opens and every call is
+    rejected for reset_timeout seconds. Then a single trial call is let through:
+    success closes the circuit, another 429 opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        """
+        :param failure_threshold: Consecutive rate-limit responses that open the circuit
+        :param reset_timeout: Seconds the circuit stays open before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self):
+        """
+        Whether an upstream call may be made now
+        :return: bool
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_rate_limit(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def record_other_failure(self):
+        """
+        A failure that is not a rate limit ends a trial call without reopening the
+        circuit, and ends the run of consecutive rate limits
+        """
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+
+
+class RetryPolicy:
+    """
+    Runs a callable until it succeeds, a non-retryable error is raised, attempts
+    run out, or the next backoff would not fit in the deadline.
+    """
+
+    def __init__(self, max_tries=5, base_delay=1.0, max_delay=30.0, jitter=0.5, deadline=10.0,
+                 retry_on=(HTTPError,), breaker=None):
+        """
+        :param max_tries: Maximum number of attempts
+        :param base_delay: Delay before the first retry in seconds, doubled on every retry
+        :param max_delay: Upper bound of a single delay before jitter
+        :param jitter: Random extra delay as a fraction of the delay
+        :param deadline: Total seconds the call may take including delays; attempts
+            are only bounded by it when they are given its remaining time
+        :param retry_on: Exception types that are retried
+        :param breaker: Optional CircuitBreaker shared with other callers of the same upstream
+        """
+        self.max_tries = max_tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.breaker = breaker
+
+    def backoff(self, retry):
+        """
+        Delay before the given retry (1 for the first retry)
+        :param retry: Retry number
+        :return: Delay in seconds
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return delay + random.uniform(0, delay * self.jitter)
+
+    def _before_attempt(self, attempt, started, last_error):
+        """
+        Check that another attempt may start
+        :return: Seconds left of the deadline for the attempt
+        :raises RetryError: When there are no attempts or no time left
+        :raises CircuitOpenError: While the circuit breaker is open
+        """
+        if self.max_tries < 1:
+            raise RetryError(ValueError("max_tries must be at least 1"), 0)
+        remaining = self.deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            raise RetryError(last_error or TimeoutError("Deadline exceeded"), attempt)
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("Too many rate-limited requests, not calling upstream")
+        return remaining
+
+    def _after_failure(self, error, attempt, started):
+        """
+        Record a failed attempt and return the delay before the next one
+        :raises RetryError: When no further attempt fits
+        """
+        rate_limited = is_rate_limit(error)
+        if self.breaker is not None:
+            if rate_limited:
+                self.breaker.record_rate_limit()
+            else:
+                self.breaker.record_other_failure()
+
+        reason = "rate limit" if rate_limited else error
+        print(f"Attempt: {attempt + 1} of {self.max_tries} failed due to {reason}.")
+
+        if attempt == self.max_tries - 1:
+            raise RetryError(error, attempt + 1) from error
+
+        delay = self.backoff(attempt + 1)
+        # The next attempt needs time of its own after the delay
+        if time.monotonic() - started + delay >= self.deadline:
+            raise RetryError(error, attempt + 1) from error
+        return delay
+
+    def _after_other_error(self):
+        if self.breaker is not None:
+            self.breaker.record_other_failure()
+
+    def _after_success(self):
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def call(self, fn, pass_timeout=False):
+        """
+        Call fn with retries, blocking the current thread between attempts
+        :param fn: Callable without arguments, or with a timeout keyword when pass_timeout is set
+        :param pass_timeout: Call fn(timeout=seconds left of the deadline), so a hanging
+            attempt cannot outlast the deadline
+        :return: Whatever fn returns
+        """
+        started = time.monotonic()
+        attempt = 0
+        error = None
+        while True:
+            remaining = self._before_attempt(attempt, started, error)
+            try:
+                result = fn(timeout=remaining) if pass_timeout else fn()
+            except self.retry_on as e:
+                error = e
+                time.sleep(self._after_failure(e, attempt, started))
+                attempt += 1
+                continue
+            except Exception:
+                self._after_other_error()
+                raise
+            self._after_success()
+            return result
+
+    async def acall(self, fn):
+        """
+        Await fn with retries, yielding to the event loop between attempts.
+        Each attempt is cancelled once the deadline has passed.
+        :param fn: Coroutine function without arguments
+        :return: Whatever fn returns
+        """
+        started = time.monotonic()
+        attempt = 0
+        error = None
+        while True:
+            remaining = self._before_attempt(attempt, started, error)
+            try:
+                result = await asyncio.wait_for(fn(), timeout=remaining)
+            except asyncio.TimeoutError as e:
+                self._after_other_error()
+                raise RetryError(error or TimeoutError("Deadline exceeded"), attempt + 1) from e
+            except self.retry_on as e:
+                error = e
+                await asyncio.sleep(self._after_failure(e, attempt, started))
+                attempt += 1
+                continue
+            except Exception:
+                self._after_other_error()
+                raise
+            self._after_success()
+            return result
@@ -0,0 +1,112 @@
+"""
+Materialized daily sentiment rollups per (stock, day, subreddit, scorer).
+
+Each row keeps the count, sum and sum of squares of the scores, which is enough
+for daily means, variances and moving averages over any window without reading
+individual posts.
+"""
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from stock.models import DailySentimentRollup, RedditPost
+
+SCORERS = ('textblob', 'vader', 'ml')
+
+
+def refresh_rollups(stock, days=None):
+    """
+    Recompute the rollups of a stock for the given days from its stored posts.
+    Recomputing whole days keeps the rollups correct when posts are re-ingested.
+    :param stock: Stock whose rollups are refreshed
+    :param days: Iterable of dates, defaults to every day with stored posts
+    :return: Number of rollup rows written
+    """
+    posts = RedditPost.objects.filter(stock=stock)
+    if days is not None:
+        days = set(days)
+        if not days:
+            return 0
+        posts = posts.filter(created_utc__date__in=days)
+
+    rows = []
+    for scorer in SCORERS:
+        score = F(f'scores__{scorer}')
+        groups = (
+            posts.filter(**{f'scores__{scorer}__isnull': False})
+            .annotate(day=TruncDate('created_utc'))
+            .values('day', 'subreddit')
+            .annotate(count=Count('id'), total=Sum(score), total_sq=Sum(score * score))
+        )
+        rows.extend(
+            DailySentimentRollup(stock=stock, scorer=scorer, **group)
+            for group in groups
+        )
+
+    with transaction.atomic():
+        existing = DailySentimentRollup.objects.filter(stock=stock)
+        if days is not None:
+            existing = existing.filter(day__in=days)
+        existing.delete()
+        DailySentimentRollup.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def daily_frame(stock, scorer, since=None, subreddit=None):
+    """
+    Daily totals of a scorer for a stock, summed over subreddits unless one is given
+    :param stock: Stock
+    :param scorer: 'textblob', 'vader' or 'ml'
+    :param since: Optional first day
+    :param subreddit: Optional subreddit name
+    :return: DataFrame indexed by day with 'count', 'total' and 'total_sq' columns
+    """
+    rollups = DailySentimentRollup.objects.filter(stock=stock, scorer=scorer)
+    if since is not None:
+        rollups = rollups.filter(day__gte=since)
+    if subreddit is not None:
+        rollups = rollups.filter(subreddit=subreddit)
+
+    rows = (
+        rollups.values('day')
+        .annotate(day_count=Sum('count'), day_total=Sum('total'), day_total_sq=Sum('total_sq'))
+        .order_by('day')
+        .values_list('day', 'day_count', 'day_total', 'day_total_sq')
+    )
+    frame = pd.DataFrame.from_records(list(rows), columns=['day', 'count', 'total', 'total_sq'])
+    frame.index = pd.DatetimeIndex(frame.pop('day'), name='day')
+    return frame
+
+
+def daily_trend(daily, window_size=7, min_periods=None):
+    """
+    Daily mean sentiment, its moving average and the trend they show
+    :param daily: DataFrame indexed by day with 'count' and 'total' columns, like daily_frame returns
+    :param window_size: Days in the moving average
+    :param min_periods: Days with posts a moving average needs, every day of the window by default
+    :return: Dictionary with 'trend' (Bullish, Bearish or Neutral), 'daily_sentiment',
+        'moving_avg' and 'current_sentiment'
+    """
+    if len(daily) == 0:
+        return {'trend': 'Neutral', 'daily_sentiment': pd.Series(dtype=float),
+                'moving_avg': pd.Series(dtype=float), 'current_sentiment': 0}
+
+    # Days without posts stay in the series as NaN, like a daily resample
+    daily_sentiment = (daily['total'] / daily['count'].where(daily['count'] > 0)).asfreq('D')
+    moving_avg = daily_sentiment.rolling(window=window_size, min_periods=min_periods).mean()
+
+    current = moving_avg.iloc[-1]
+    trend = 'Neutral'
+    if current > 0.2:
+        trend = 'Bullish'
+    elif current < -0.2:
+        trend = 'Bearish'
+
+    return {
+        'trend': trend,
+        'daily_sentiment': daily_sentiment,
+        'moving_avg': moving_avg,
+        'current_sentiment': current,
+    }
@@ -0,0 +1,182 @@
+"""
+Cache for sentiment scores keyed by (scorer name, scorer version, hash of the text).
+
+Scores are kept in an in-process LRU and, optionally, in the CachedScore table so
+they survive restarts and are shared between worker processes.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.db import DatabaseError
+
+# SQLite limits the number of parameters in a single query
+_DB_BATCH_SIZE = 500
+
+
+def text_hash(text):
+    """
+    Stable hash of a text used in cache keys
+    :param text: Text that was scored
+    :return: Hex digest
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ScoreCache:
+    """
+    Two-tier sentiment score cache with hit/miss counters
+    """
+
+    def __init__(self, max_size=10000, persistent=False):
+        """
+        :param max_size: Maximum number of scores held in memory
+        :param persistent: Whether to read and write the CachedScore table
+        """
+        self.max_size = max_size
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._persistent_hits = 0
+        self._misses = 0
+
+    def get_or_compute(self, scorer, version, text, compute):
+        """
+        Return the cached score of a text, computing and storing it on a miss
+        :param scorer: Scorer name
+        :param version: Scorer version
+        :param text: Text to be scored
+        :param compute: Callable taking the text and returning its score
+        :return: Score
+        """
+        return self.get_or_compute_many(
+            scorer, version, [text], lambda texts: [compute(t) for t in texts]
+        )[0]
+
+    def get_or_compute_many(self, scorer, version, texts, compute_many):
+        """
+        Return cached scores for many texts, computing all misses in one call
+        :param scorer: Scorer name
+        :param version: Scorer version
+        :param texts: List of texts to be scored
+        :param compute_many: Callable taking a list of texts and returning their scores
+        :return: List of scores aligned with texts
+        """
+        hashes = [text_hash(text) for text in texts]
+        found = self._get_many(scorer, version, set(hashes))
+
+        missing = {}
+        for text, digest in zip(texts, hashes):
+            if digest not in found and digest not in missing:
+                missing[digest] = text
+
+        if missing:
+            scores = compute_many(list(missing.values()))
+            computed = dict(zip(missing.keys(), scores))
+            self._set_many(scorer, version, computed)
+            found.update(computed)
+
+        return [found[digest] for digest in hashes]
+
+    def _get_many(self, scorer, version, hashes):
+        """
+        Look hashes up in memory first, then in the database
+        :return: Dictionary mapping hash to score for every hit
+        """
+        found = {}
+        with self._lock:
+            for digest in hashes:
+                key = (scorer, version, digest)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[digest] = self._entries[key]
+            self._memory_hits += len(found)
+
+        remaining = [digest for digest in hashes if digest not in found]
+        if remaining and self.persistent:
+            stored = self._load(scorer, version, remaining)
+            if stored:
+                self._remember(scorer, version, stored)
+                found.update(stored)
+            with self._lock:
+                self._persistent_hits += len(stored)
+
+        with self._lock:
+            self._misses += len(hashes) - len(found)
+        return found
+
+    def _set_many(self, scorer, version, scores):
+        """
+        Store freshly computed scores in every tier
+        :param scores: Dictionary mapping hash to score
+        """
+        self._remember(scorer, version, scores)
+        if self.persistent:
+            self._save(scorer, version, scores)
+
+    def _remember(self, scorer, version, scores):
+        with self._lock:
+            for digest, score in scores.items():
+                key = (scorer, version, digest)
+                self._entries[key] = score
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load(self, scorer, version, hashes):
+        from stock.models import CachedScore
+
+        stored = {}
+        try:
+            for start in range(0, len(hashes), _DB_BATCH_SIZE):
+                rows = CachedScore.objects.filter(
+                    scorer=scorer, version=version,
+                    text_hash__in=hashes[start:start + _DB_BATCH_SIZE]
+                ).values_list('text_hash', 'score')
+                stored.update(rows)
+        except DatabaseError as e:
+            print(f"Error reading score cache: {e}")
+        return stored
+
+    def _save(self, scorer, version, scores):
+        from stock.models import CachedScore
+
+        rows = [
+            CachedScore(scorer=scorer, version=version, text_hash=digest, score=score)
+            for digest, score in scores.items()
+        ]
+        try:
+            CachedScore.objects.bulk_create(rows, batch_size=_DB_BATCH_SIZE, ignore_conflicts=True)
+        except DatabaseError as e:
+            print(f"Error writing score cache: {e}")
+
+    def stats(self):
+        """
+        Hit/miss counters since the process started
+        :return: Dictionary of counters
+        """
+        with self._lock:
+            hits = self._memory_hits + self._persistent_hits
+            lookups = hits + self._misses
+            return {
+                'memory_hits': self._memory_hits,
+                'persistent_hits': self._persistent_hits,
+                'misses': self._misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'persistent': self.persistent,
+            }
+
+    def clear(self):
+        """
+        Empty the in-memory tier and reset the counters
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._memory_hits = 0
+            self._persistent_hits = 0
+            self._misses = 0
@@ -0,0 +1,143 @@
+"""
+Process pool for scoring large batches of posts on every core.
+
+TextBlob and VADER are pure Python, so threads cannot score in parallel. Each
+worker process loads the lexicons once in its initializer and then scores
+chunks of texts sent by the parent. Texts are cleaned or preprocessed by the
+caller, and the score cache is checked before anything reaches the pool.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Analyzers of the current worker process, built by _init_worker
+_worker = {}
+
+
+def _init_worker():
+    """
+    Load the lexicons once per worker process
+    """
+    from textblob.en.sentiments import PatternAnalyzer
+    _worker['textblob'] = PatternAnalyzer()
+    try:
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        _worker['vader'] = SentimentIntensityAnalyzer()
+    except LookupError as e:
+        # Only VADER scoring fails, TextBlob scoring still works
+        _worker['vader_error'] = e
+
+
+def _polarity_chunk(texts):
+    """
+    TextBlob polarity of cleaned texts, run in a worker
+    """
+    analyzer = _worker['textblob']
+    return [analyzer.analyze(text).polarity for text in texts]
+
+
+def _compound_chunk(texts):
+    """
+    VADER compound score of preprocessed texts, run in a worker
+    """
+    if 'vader' not in _worker:
+        raise _worker['vader_error']
+    sia = _worker['vader']
+    return [sia.polarity_scores(text)['compound'] for text in texts]
+
+
+class ScoringPool:
+    """
+    Scores batches of texts in worker processes
+    """
+
+    def __init__(self, workers, chunk_size=500, min_batch=200):
+        """
+        :param workers: Number of worker processes
+        :param chunk_size: Number of texts sent to a worker at once
+        :param min_batch: Smaller batches are scored in the calling process,
+            where they finish before a chunk would even reach a worker
+        """
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.min_batch = min_batch
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        executor = self._executor
+        if executor is not None:
+            return executor
+
+        with self._lock:
+            # Another request thread may have started the pool while we were waiting for the lock
+            if self._executor is None:
+                # Forking a process that runs request threads can copy held locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def accepts(self, texts):
+        """
+        Whether a batch is large enough to be sent to the pool
+        :param texts: List of texts
+        :return: bool
+        """
+        return len(texts) >= self.min_batch
+
+    def _map(self, fn, texts):
+        results = []
+        batches = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        for scores in self.executor.map(fn, batches):
+            results.extend(scores)
+        return results
+
+    def polarity_many(self, texts):
+        """
+        TextBlob polarity of every text
+        :param texts: List of cleaned texts
+        :return: List of scores aligned with texts
+        """
+        return self._map(_polarity_chunk, texts)
+
+    def compound_many(self, texts):
+        """
+        VADER compound score of every text
+        :param texts: List of preprocessed texts
+        :return: List of scores aligned with texts
+        """
+        return self._map(_compound_chunk, texts)
+
+    def shutdown(self):
+        """
+        Stop the worker processes, a later call starts new ones
+        :return: None
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+def score_with_pool(pool, method, texts, fallback):
+    """
+    Score texts in the pool when there is one and the batch is large enough,
+    otherwise, or when the pool broke, with fallback in this process
+    :param pool: ScoringPool or None
+    :param method: Name of the ScoringPool method to use
+    :param texts: List of texts
+    :param fallback: Callable scoring a list of texts in this process
+    :return: List of scores aligned with texts
+    """
+    if pool is not None and pool.accepts(texts):
+        try:
+            return getattr(pool, method)(texts)
+        except BrokenProcessPool as e:
+            print(f"Error scoring in the process pool: {e}")
+            pool.shutdown()
+    return fallback(texts)
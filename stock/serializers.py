@@ -0,0 +1,58 @@
+"""
+Serializers of the REST API (see stock/api.py).
+"""
+
+from rest_framework import serializers
+
+from stock.models import RedditPost
+
+
+class TopPostSerializer(serializers.Serializer):
+    title = serializers.CharField()
+    sentiment = serializers.FloatField()
+    url = serializers.URLField()
+
+
+class SentimentSummarySerializer(serializers.Serializer):
+    """
+    Data of a stored_analysis result, with top post scores under one key whatever the scorer
+    """
+    symbol = serializers.CharField()
+    scorer = serializers.CharField()
+    time_filter = serializers.CharField()
+    average_sentiment = serializers.FloatField()
+    posts_count = serializers.IntegerField()
+    sentiment_distribution = serializers.DictField(child=serializers.IntegerField())
+    top_posts = TopPostSerializer(many=True)
+
+
+class PostSerializer(serializers.ModelSerializer):
+    """
+    Stored post with its scores, read with select_related('scores')
+    """
+    url = serializers.ReadOnlyField()
+    textblob = serializers.FloatField(source='scores.textblob', default=None)
+    vader = serializers.FloatField(source='scores.vader', default=None)
+    ml = serializers.FloatField(source='scores.ml', default=None)
+
+    class Meta:
+        model = RedditPost
+        fields = ['reddit_id', 'subreddit', 'title', 'url', 'score', 'created_utc', 'textblob', 'vader', 'ml']
+
+
+class TrendPointSerializer(serializers.Serializer):
+    day = serializers.DateField()
+    count = serializers.IntegerField()
+    mean = serializers.FloatField()
+    std = serializers.FloatField()
+    moving_average = serializers.FloatField(allow_null=True)
+
+
+class QuoteSerializer(serializers.Serializer):
+    """
+    A FetchStockData result flattened to its price and currency
+    """
+    success = serializers.BooleanField()
+    current_price = serializers.FloatField(source='data.current_price', default=None)
+    currency = serializers.CharField(source='data.currency', default=None)
+    error = serializers.CharField(allow_null=True)
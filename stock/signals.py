@@ -0,0 +1,20 @@
+"""
+Signal receivers of the stock app, connected in StockConfig.ready.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from stock import registry
+from user.models import Stock
+
+
+@receiver(post_save, sender=Stock)
+def add_mentioned_symbol(sender, instance, created, **kwargs):
+    """
+    Teach the shared mention extractor a new symbol without rebuilding it. An
+    extractor not built yet will read the symbol from the Stock table anyway.
+    """
+    extractor = registry.peek('mention_extractor')
+    if created and extractor is not None:
+        extractor.add(instance.symbol)
@@ -2,145 +2,244 @@
 This module contains a class to fetch stock data using the yfinance library.
 """
 
-import time
 import yfinance as yf
-from requests.exceptions import HTTPError, RequestException
+from django.conf import settings
+from requests.exceptions import RequestException
+
+from stock import registry
+from stock.retry import CircuitOpenError, RetryError, RetryPolicy
+
 
 class FetchStockData:
     """
     A class to fetch stock data using the yfinance library.
     """
 
+    def __init__(self, quote_cache=None, circuit_breaker=None, price_store=None):
+        """
+        :param quote_cache: QuoteCache to use, defaults to the shared one from stock.registry
+        :param circuit_breaker: CircuitBreaker to use, defaults to the shared Yahoo Finance one
+        :param price_store: PriceStore to use, defaults to the shared one from stock.registry
+        """
+        self.quote_cache = quote_cache or registry.get_quote_cache()
+        self.circuit_breaker = circuit_breaker or registry.get_circuit_breaker('yahoo')
+        self.price_store = price_store or registry.get_price_store()
+
     def get_stock_data(self, stock_symbol: str, max_tries: int = 5, delay: int = 6):
         """
-        Fetches stock data for a given stock symbol.
+        Fetches stock data for a given stock symbol, served from the quote cache when possible.
         :param stock_symbol: The stock symbol to fetch data for.
         :param max_tries: The maximum number of attempts to fetch data.
-        :param delay: The delay between attempts in seconds.
+        :param delay: The delay before the first retry in seconds.
         :return: A dictionary containing the stock data or error information.
         """
-        result = {
+        return self.quote_cache.get(
+            stock_symbol.upper(),
+            lambda: self._fetch_stock_data(stock_symbol, max_tries, delay)
+        )
+
+    def _retry_policy(self, max_tries: int, delay: float):
+        """
+        Retry policy for one upstream request
+        :param max_tries: The maximum number of attempts to fetch data.
+        :param delay: The delay before the first retry in seconds, doubled on every retry.
+        :return: RetryPolicy sharing the Yahoo Finance circuit breaker
+        """
+        return RetryPolicy(
+            max_tries=max_tries,
+            base_delay=delay,
+            deadline=getattr(settings, 'STOCK_FETCH_DEADLINE', 10),
+            breaker=self.circuit_breaker,
+        )
+
+    def _failure(self, error, message):
+        """
+        Builds the error result for a failed upstream request
+        :param error: The exception that ended the request.
+        :param message: Error message used when the request was not rate limited.
+        :return: A dictionary containing the error information.
+        """
+        rate_limited = isinstance(error, CircuitOpenError) or (
+            isinstance(error, RetryError) and error.rate_limited
+        )
+        return {
             'success': False,
             'data': None,
+            'error': "Rate limit exceeded. Try again later" if rate_limited else message,
+        }
+
+    def _fetch_stock_data(self, stock_symbol: str, max_tries: int = 5, delay: int = 6):
+        """
+        Fetches stock data for a given stock symbol from Yahoo Finance.
+        :param stock_symbol: The stock symbol to fetch data for.
+        :param max_tries: The maximum number of attempts to fetch data.
+        :param delay: The delay before the first retry in seconds.
+        :return: A dictionary containing the stock data or error information.
+        """
+        def request(timeout):
+            # One chart request with a timeout: its metadata holds the price and currency,
+            # while the .info scrape makes several requests none of which can be bounded
+            ticker = yf.Ticker(stock_symbol)
+            bars = ticker.history(period='5d', interval='1d', timeout=timeout)
+            return bars, ticker.history_metadata
+
+        try:
+            bars, info = self._retry_policy(max_tries, delay).call(request, pass_timeout=True)
+        except (RetryError, CircuitOpenError, RequestException) as e:
+            return self._failure(e, f"Failed to fetch stock data for {stock_symbol}")
+
+        current_price = info.get('regularMarketPrice')
+        if current_price is None and 'Close' in bars and bars['Close'].notna().any():
+            current_price = float(bars['Close'].dropna().iloc[-1])
+
+        # Checking if current price is available
+        if current_price is None:
+            return {
+                'success': False,
+                'data': None,
+                'error': f"Current price for {stock_symbol} is not available"
+            }
+
+        return {
+            'success': True,
+            'data' : {
+                'current_price': current_price,
+                'currency' : info.get('currency')
+            },
             'error': None
         }
 
-        for attempt in range(max_tries):
+    @staticmethod
+    def bulk_key(stock_symbol: str):
+        """
+        Quote cache key of a quote from a bulk download. Bulk quotes hold the last daily
+        close and no currency, so they are kept apart from the get_stock_data quotes.
+        :param stock_symbol: The upper-case stock symbol.
+        :return: Cache key
+        """
+        return f'{stock_symbol}:bulk'
+
+    def cached_quote(self, stock_symbol: str):
+        """
+        Fresh cached quote of a symbol, preferring a full quote to a bulk one.
+        :param stock_symbol: The upper-case stock symbol.
+        :return: Tuple of (quote, age in seconds) or None
+        """
+        for key in (stock_symbol, self.bulk_key(stock_symbol)):
+            cached = self.quote_cache.peek(key)
+            if cached is not None and cached[1] < self.quote_cache.ttl:
+                return cached
+        return None
+
+    def get_stock_data_many(self, stock_symbols, max_tries: int = 3, delay: int = 1):
+        """
+        Fetches stock data for many symbols with one batched upstream request.
+        Fresh quotes are taken from the quote cache, the rest are downloaded together
+        and stored in the cache under their bulk key.
+        :param stock_symbols: The stock symbols to fetch data for.
+        :param max_tries: The maximum number of attempts to fetch data.
+        :param delay: The delay before the first retry in seconds.
+        :return: A dictionary mapping each symbol to a result like get_stock_data returns.
+        """
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in stock_symbols if symbol.strip()))
+        results = {}
+        missing = []
+        for symbol in symbols:
+            cached = self.cached_quote(symbol)
+            if cached is not None:
+                results[symbol] = cached[0]
+            else:
+                missing.append(symbol)
+
+        if missing:
             try:
-                if attempt > 0:
-                    time.sleep(delay)
-
-                stock = yf.Ticker(stock_symbol)
-                info = stock.info
-                current_price = info.get('currentPrice')
-
-                # Checking if current price is available
-                if current_price is None:
-                    result.update({
-                        'success': False,
-                        'data': None,
-                        'error': f"Current price for {stock_symbol} is not available"
-                    })
-                    break
-
-                result.update({
-                    'success': True,
-                    'data' : {
-                        'current_price': current_price,
-                        'currency' : info.get('currency')
-                    },
-                    'error': None
-                })
-                return result
-
-            except HTTPError as e:
-                if hasattr(e, 'response') and e.response.status_code == 429:
-                    print(f"Attempt: {attempt + 1} of {max_tries} failed due to rate limit. Retrying...")
-                    if attempt == max_tries - 1:
-                        result.update({
-                            'success': False,
-                            'data': None,
-                            'error': "Rate limit exceeded. Try again later",
-                        })
-                continue
-
-            except RequestException as e:
-                result.update({
-                    'success': False,
-                    'error': f"Failed to fetch stock data for {stock_symbol}",
-                    'data': None
-                })
-                break
-
-        return result
+                frame = self._retry_policy(max_tries, delay).call(lambda timeout: yf.download(
+                    missing, period='5d', interval='1d', group_by='ticker',
+                    auto_adjust=False, progress=False, threads=False, timeout=timeout,
+                ), pass_timeout=True)
+            except (RetryError, CircuitOpenError, RequestException) as e:
+                failure = self._failure(e, "Failed to fetch stock data")
+                for symbol in missing:
+                    results[symbol] = failure
+            else:
+                for symbol in missing:
+                    results[symbol] = self._quote_from_download(frame, symbol)
+                    if results[symbol]['success']:
+                        self.quote_cache.set(self.bulk_key(symbol), results[symbol])
+
+        return {symbol: results[symbol] for symbol in symbols}
+
+    def _quote_from_download(self, frame, stock_symbol: str):
+        """
+        Builds the quote of one symbol from a yfinance bulk download.
+        The latest close is the current price while the market is open.
+        :param frame: DataFrame returned by yf.download grouped by ticker.
+        :param stock_symbol: The stock symbol to extract.
+        :return: A dictionary containing the stock data or error information.
+        """
+        closes = None
+        if frame is not None and not frame.empty and stock_symbol in frame.columns.get_level_values(0):
+            closes = frame[stock_symbol]['Close'].dropna()
+
+        if closes is None or closes.empty:
+            return {
+                'success': False,
+                'data': None,
+                'error': f"Current price for {stock_symbol} is not available"
+            }
+
+        # The bulk download has no currency, keep the one a full quote already gave
+        cached = self.quote_cache.peek(stock_symbol)
+        currency = cached[0]['data'].get('currency') if cached is not None else None
+
+        return {
+            'success': True,
+            'data': {
+                'current_price': float(closes.iloc[-1]),
+                'currency': currency
+            },
+            'error': None
+        }
 
     def get_historical_stock_data(self, stock_symbol: str, period: str = "1mo", interval: str = "1d", max_tries: int = 5, delay: int = 6):
         """
         Fetches historical stock data for a given stock symbol.
+        Bars are read from the local price store, which only downloads the bars it is missing.
         :param stock_symbol: The stock symbol to fetch data for.
         :param period: The period of data to fetch (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max).
         :param interval: The interval between data points (1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo).
         :param max_tries: The maximum number of attempts to fetch data.
-        :param delay: The delay between attempts in seconds.
+        :param delay: The delay before the first retry in seconds.
         :return: A dictionary containing the historical stock data or error information.
         """
-        # Result dictionary to store the response
-        result = {
-            'success': False,
-            'data': None,
-            'error': None
+        def download(**kwargs):
+            return self._retry_policy(max_tries, delay).call(
+                lambda timeout: yf.Ticker(stock_symbol).history(timeout=timeout, **kwargs), pass_timeout=True
+            )
+
+        try:
+            historical_data = self.price_store.get_history(stock_symbol, period, interval, download)
+        except (RetryError, CircuitOpenError, RequestException) as e:
+            return self._failure(e, f"Failed to fetch historical data for {stock_symbol}")
+
+        if historical_data.empty:
+            return {
+                'success': False,
+                'data': None,
+                'error': f"No historical data available for {stock_symbol}"
+            }
+
+        formatted_data = {
+            'dates' : list(historical_data.index.strftime('%Y-%m-%d')),
+            'prices' : historical_data['Close'].tolist(),
+            'volume' : historical_data['Volume'].tolist()
         }
 
-        # Loop to retry fetching data in case of errors
-        for attempt in range(max_tries):
-            try:
-                if attempt > 0:
-                    time.sleep(delay)
-
-                stock = yf.Ticker(stock_symbol)
-                historical_data = stock.history(period=period, interval=interval)
-
-                if historical_data.empty:
-                    result.update({
-                        'success': False,
-                        'data': None,
-                        'error': f"No historical data available for {stock_symbol}"
-                    })
-                    break
-                hist_data = historical_data.reset_index()
-                hist_data['Date'] = hist_data['Date'].dt.strftime('%Y-%m-%d')
-
-                formatted_data = {
-                    'dates' : hist_data['Date'].tolist(),
-                    'prices' : hist_data['Close'].tolist(),
-                    'volume' : hist_data['Volume'].tolist()
-                }
-
-                result.update({
-                    'success': True,
-                    'data': formatted_data,
-                    'error': None
-                })
-                return result
-
-            except HTTPError as e:
-                if hasattr(e, 'response') and e.response.status_code == 429:
-                    print(f"Attempt: {attempt + 1} of {max_tries} failed due to rate limit. Retrying...")
-                    if attempt == max_tries - 1:
-                        result.update({
-                            'success': False,
-                            'data': None,
-                            'error': "Rate limit exceeded. Try again later",
-                        })
-                continue
-
-            except RequestException as e:
-                result.update({
-                    'success': False,
-                    'error': f"Failed to fetch historical data for {stock_symbol}",
-                    'data': None
-                })
-                break
+        return {
+            'success': True,
+            'data': formatted_data,
+            'error': None
+        }
 
 if __name__ == "__main__":
     fetcher = FetchStockData()
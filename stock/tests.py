@@ -1,13 +1,52 @@
 """
 Unitests for stock app
 """
+import asyncio
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
-from unittest.mock import patch, Mock, PropertyMock
-from django.test import TestCase
+from unittest.mock import ANY, patch, AsyncMock, Mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from requests.exceptions import HTTPError, RequestException
+from rest_framework.exceptions import Throttled
 from .stock_data import FetchStockData
 from .reddit_sentiment import RedditSentiment
+from .posts import PostBatch, PostRecord
+from . import registry
+from .models import CachedScore
+from .score_cache import ScoreCache
+from .quote_cache import QuoteCache
+from .retry import CircuitBreaker, CircuitOpenError, RetryError, RetryPolicy
+from .ml.analyzer_ml import MlSentimentAnalyzer
+from user.models import Stock
+from .fanout import SourceBusy, SourceTimeout, fan_out
+from .models import PriceBar, PriceHistory, RedditPost, PostScore, IngestionState
+from .ingestion import ingest_stock, ingest_stocks_concurrently, stored_analysis, upsert_posts, watched_stocks
+from .rollups import daily_frame, refresh_rollups
+from .models import DailySentimentRollup
+from .price_store import PriceStore
+from . import result_cache, text_normalization
+from .compare import search_queries
+from .mentions import MentionExtractor
+from .live import LiveHub, _poll_symbol, format_event, poll_symbol
+from .scoring_pool import ScoringPool, score_with_pool
+from .ml.model_store import ModelStore, latest_path, load_model
+from .ml.training import training_batches, training_data
+from .reddit_sentiment_async import AsyncRedditSentiment, AsyncTokenBucket
 
 
 class FetchStockDataTests(TestCase):
@@ -15,7 +54,7 @@ class FetchStockDataTests(TestCase):
     Unit tests for the FetchStockData class.
     """
     def setUp(self):
-        self.fetcher = FetchStockData()
+        self.fetcher = FetchStockData(quote_cache=QuoteCache(), circuit_breaker=CircuitBreaker())
         self.test_symbol = "AAPL"
 
     @patch('yfinance.Ticker')
@@ -25,8 +64,9 @@ class FetchStockDataTests(TestCase):
         """
 
         mock_instance = Mock()
-        mock_instance.info = {
-            'currentPrice': 150.0,
+        mock_instance.history.return_value = pd.DataFrame({'Close': [148.0, 149.0]})
+        mock_instance.history_metadata = {
+            'regularMarketPrice': 150.0,
             'currency': 'USD'
         }
         mock_ticker.return_value = mock_instance
@@ -37,6 +77,8 @@ class FetchStockDataTests(TestCase):
         self.assertIsNone(result['error'])
         self.assertEqual(result['data']['current_price'], 150.0)
         self.assertEqual(result['data']['currency'], 'USD')
+        # One chart request bounded by the time left of the deadline, not the .info scrape
+        self.assertIsNotNone(mock_instance.history.call_args.kwargs['timeout'])
 
     @patch('yfinance.Ticker')
     def test_missing_current_price(self, mock_ticker):
@@ -45,7 +87,8 @@ class FetchStockDataTests(TestCase):
         """
 
         mock_instance = Mock()
-        mock_instance.info = {
+        mock_instance.history.return_value = pd.DataFrame()
+        mock_instance.history_metadata = {
             'currency': 'USD'
         }
         mock_ticker.return_value = mock_instance
@@ -70,8 +113,7 @@ class FetchStockDataTests(TestCase):
         mock_response.status_code = 429
         http_error = HTTPError(response=mock_response)
 
-        info_property = PropertyMock(side_effect=http_error)
-        type(mock_ticker.return_value).info = info_property
+        mock_ticker.return_value.history.side_effect = http_error
 
         result = self.fetcher.get_stock_data(self.test_symbol, max_tries=2, delay=0)
 
@@ -82,8 +124,7 @@ class FetchStockDataTests(TestCase):
     @patch('yfinance.Ticker')
     def test_network_error(self, mock_ticker):
         """Testing handling of general network errors"""
-        info_property = PropertyMock(side_effect=RequestException("Network error"))
-        type(mock_ticker.return_value).info = info_property
+        mock_ticker.return_value.history.side_effect = RequestException("Network error")
 
         result = self.fetcher.get_stock_data(self.test_symbol)
 
@@ -107,24 +148,235 @@ class FetchStockDataTests(TestCase):
         mock_response.status_code = 429
         http_error = HTTPError(response=mock_response)
 
-        info_property = PropertyMock(side_effect=[
-            http_error,
-            {'currentPrice': 150.0, 'currency': 'USD'}
-        ])
-        type(mock_ticker.return_value).info = info_property
+        mock_ticker.return_value.history.side_effect = [http_error, pd.DataFrame({'Close': [150.0]})]
+        mock_ticker.return_value.history_metadata = {'currency': 'USD'}
 
         result = self.fetcher.get_stock_data(self.test_symbol, max_tries=2, delay=1)
 
         self.assertTrue(result['success'])
         self.assertIsNone(result['error'])
         self.assertEqual(result['data']['current_price'], 150.0)
-        mock_sleep.assert_called_once_with(1)
+        mock_sleep.assert_called_once()
+        # First retry waits the base delay plus up to 50% jitter
+        self.assertTrue(1 <= mock_sleep.call_args[0][0] <= 1.5)
+
+    @patch('time.sleep')
+    @patch('yfinance.Ticker')
+    def test_historical_rate_limit_returns_error(self, mock_ticker, mock_sleep):
+        """
+        Testing that historical data returns an error result once retries run out
+        """
+        mock_response = Mock()
+        mock_response.status_code = 429
+        mock_ticker.return_value.history.side_effect = HTTPError(response=mock_response)
+
+        result = self.fetcher.get_historical_stock_data(self.test_symbol, max_tries=2, delay=0)
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], "Rate limit exceeded. Try again later")
+
+    @patch('yfinance.Ticker')
+    def test_stock_data_is_cached(self, mock_ticker):
+        """
+        Testing that a second lookup of the same symbol is served from the cache
+        """
+        mock_ticker.return_value.history_metadata = {'regularMarketPrice': 150.0, 'currency': 'USD'}
+
+        first = self.fetcher.get_stock_data(self.test_symbol)
+        second = self.fetcher.get_stock_data(self.test_symbol.lower())
+
+        self.assertEqual(first, second)
+        mock_ticker.assert_called_once_with(self.test_symbol)
+
+
+class FetchStockDataManyTests(TestCase):
+    """
+    Unit tests for batched quote fetching.
+    """
+    def setUp(self):
+        self.fetcher = FetchStockData(quote_cache=QuoteCache(), circuit_breaker=CircuitBreaker())
+
+    def download_frame(self, closes):
+        columns = pd.MultiIndex.from_product([list(closes), ['Open', 'Close']])
+        data = [[value for close in closes.values() for value in (close, close)]]
+        return pd.DataFrame(data, columns=columns)
+
+    @patch('yfinance.download')
+    def test_one_request_for_many_symbols(self, mock_download):
+        """
+        Testing that a watchlist is fetched with a single download
+        """
+        mock_download.return_value = self.download_frame({'AAPL': 150.0, 'TSLA': 200.0, 'MSFT': float('nan')})
+
+        result = self.fetcher.get_stock_data_many(['aapl', 'TSLA', 'MSFT', 'AAPL'])
+
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args[0][0], ['AAPL', 'TSLA', 'MSFT'])
+        self.assertEqual(list(result), ['AAPL', 'TSLA', 'MSFT'])
+        self.assertEqual(result['TSLA']['data']['current_price'], 200.0)
+        self.assertFalse(result['MSFT']['success'])
+
+    @patch('yfinance.download')
+    def test_cached_quotes_are_not_downloaded(self, mock_download):
+        """
+        Testing that fresh cached quotes fill the result without an upstream call
+        """
+        cached = {'success': True, 'data': {'current_price': 1.0, 'currency': 'USD'}, 'error': None}
+        self.fetcher.quote_cache.set('AAPL', cached)
+        mock_download.return_value = self.download_frame({'TSLA': 200.0})
+
+        result = self.fetcher.get_stock_data_many(['AAPL', 'TSLA'])
+
+        self.assertIs(result['AAPL'], cached)
+        self.assertEqual(mock_download.call_args[0][0], ['TSLA'])
+        self.assertIsNotNone(self.fetcher.cached_quote('TSLA'))
+
+    @patch('yfinance.Ticker')
+    @patch('yfinance.download')
+    def test_bulk_quotes_do_not_replace_full_quotes(self, mock_download, mock_ticker):
+        """
+        Testing that a bulk quote without currency is not served by get_stock_data
+        """
+        mock_download.return_value = self.download_frame({'TSLA': 200.0})
+        mock_ticker.return_value.history_metadata = {'regularMarketPrice': 201.5, 'currency': 'USD'}
+
+        self.assertIsNone(self.fetcher.get_stock_data_many(['TSLA'])['TSLA']['data']['currency'])
+        result = self.fetcher.get_stock_data('TSLA')
+
+        mock_ticker.assert_called_once_with('TSLA')
+        self.assertEqual(result['data'], {'current_price': 201.5, 'currency': 'USD'})
+
+    def test_quotes_endpoint_requires_symbols(self):
+        """
+        Testing that the endpoint rejects an empty watchlist
+        """
+        response = self.client.get('/quotes/')
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch.object(FetchStockData, 'get_stock_data_many', return_value={'AAPL': {'success': True}})
+    def test_quotes_endpoint(self, mock_many):
+        """
+        Testing that the endpoint returns per-symbol results
+        """
+        response = self.client.get('/quotes/', {'symbols': 'AAPL, ,'})
+
+        self.assertEqual(response.json(), {'results': {'AAPL': {'success': True}}})
+        mock_many.assert_called_once_with(['AAPL'])
+
+
+class PriceStoreTests(TestCase):
+    """
+    Unit tests for the local OHLCV store behind get_historical_stock_data.
+    """
+    def setUp(self):
+        self.fetcher = FetchStockData(
+            quote_cache=QuoteCache(), circuit_breaker=CircuitBreaker(), price_store=PriceStore(refresh_interval=60)
+        )
+
+    def bars(self, start, periods):
+        index = pd.date_range(start, periods=periods, freq='D', tz='America/New_York', name='Date')
+        closes = [100.0 + i for i in range(periods)]
+        return pd.DataFrame({
+            'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+            'Volume': [1000] * periods, 'Dividends': [0.0] * periods,
+        }, index=index)
+
+    @patch('yfinance.Ticker')
+    def test_history_is_stored_and_reused(self, mock_ticker):
+        """
+        Testing that a repeated request is served from the store
+        """
+        start = (pd.Timestamp.now(tz='America/New_York') - pd.Timedelta(days=10)).normalize()
+        mock_ticker.return_value.history.return_value = self.bars(start, 10)
 
+        first = self.fetcher.get_historical_stock_data("aapl")
+        second = self.fetcher.get_historical_stock_data("AAPL")
 
+        mock_ticker.return_value.history.assert_called_once_with(period='1mo', interval='1d', timeout=ANY)
+        self.assertTrue(first['success'])
+        self.assertEqual(first, second)
+        self.assertEqual(first['data']['dates'][0], start.strftime('%Y-%m-%d'))
+        self.assertEqual(len(first['data']['prices']), 10)
+        self.assertEqual(PriceBar.objects.filter(symbol='AAPL').count(), 10)
+
+    @patch('yfinance.Ticker')
+    def test_stale_history_is_topped_up(self, mock_ticker):
+        """
+        Testing that only bars newer than the last stored one are downloaded
+        """
+        start = (pd.Timestamp.now(tz='America/New_York') - pd.Timedelta(days=10)).normalize()
+        history = mock_ticker.return_value.history
+        history.return_value = self.bars(start, 9)
+        self.fetcher.get_historical_stock_data("AAPL")
+
+        PriceHistory.objects.update(updated_at=pd.Timestamp.now(tz='UTC') - pd.Timedelta(hours=1))
+        # The last stored bar is fetched again with a corrected close, plus one new bar
+        delta = self.bars(start + pd.Timedelta(days=8), 2)
+        delta['Close'] = [500.0, 501.0]
+        history.return_value = delta
+
+        result = self.fetcher.get_historical_stock_data("AAPL")
+
+        last_stored = PriceHistory.objects.get(symbol='AAPL').last_timestamp
+        self.assertEqual(history.call_args.kwargs['interval'], '1d')
+        self.assertIn('start', history.call_args.kwargs)
+        self.assertEqual(len(result['data']['prices']), 10)
+        self.assertEqual(result['data']['prices'][-2:], [500.0, 501.0])
+        self.assertEqual(last_stored, (start + pd.Timedelta(days=9)).tz_convert('UTC').to_pydatetime())
+
+    @patch('yfinance.Ticker')
+    def test_longer_period_downloads_full_range(self, mock_ticker):
+        """
+        Testing that a period reaching past the stored range is downloaded in full
+        """
+        start = (pd.Timestamp.now(tz='America/New_York') - pd.Timedelta(days=10)).normalize()
+        history = mock_ticker.return_value.history
+        history.return_value = self.bars(start, 10)
+        self.fetcher.get_historical_stock_data("AAPL", period="1mo")
+
+        history.return_value = self.bars(start - pd.Timedelta(days=60), 70)
+        result = self.fetcher.get_historical_stock_data("AAPL", period="3mo")
+
+        history.assert_called_with(period='3mo', interval='1d', timeout=ANY)
+        self.assertEqual(len(result['data']['prices']), 70)
+
+    @patch('yfinance.Ticker')
+    def test_history_without_closes(self, mock_ticker):
+        """
+        Testing that a download whose every close is NaN stores nothing
+        """
+        mock_ticker.return_value.history.return_value = pd.DataFrame(
+            {'Open': [1.0], 'High': [1.0], 'Low': [1.0], 'Close': [float('nan')], 'Volume': [0]},
+            index=pd.DatetimeIndex(['2024-01-02'], tz='America/New_York'),
+        )
+
+        result = self.fetcher.get_historical_stock_data("NOPE")
+
+        self.assertFalse(result['success'])
+        self.assertFalse(PriceHistory.objects.filter(symbol='NOPE').exists())
+
+    @patch('yfinance.Ticker')
+    def test_empty_history(self, mock_ticker):
+        """
+        Testing handling of a symbol without history
+        """
+        mock_ticker.return_value.history.return_value = pd.DataFrame()
+
+        result = self.fetcher.get_historical_stock_data("NOPE")
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], "No historical data available for NOPE")
+
+
+# Fetching and scoring are tested on posts that need not mention the symbol,
+# see MentionExtractorTests.test_require_mention for the filter
+@override_settings(REDDIT_REQUIRE_MENTION=False)
 class RedditSentimentTests(TestCase):
     """Unit tests for RedditSentiment class"""
 
     def setUp(self):
+        registry.reset()
         self.sentiment = RedditSentiment()
 
     def test_clean_text(self):
@@ -195,6 +447,57 @@ class RedditSentimentTests(TestCase):
         self.assertTrue('title' in result.columns)
         self.assertTrue('sentiment' in result.columns)
 
+    def test_posts_before_error_are_kept(self):
+        """An error mid-search keeps the posts fetched before it"""
+        now = timezone.now().timestamp()
+
+        def search(*args, **kwargs):
+            yield make_submission('a', 'Good news', now)
+            yield make_submission('b', 'Bad news', now)
+            raise RequestException("connection reset")
+
+        with patch.object(RedditSentiment, 'search', side_effect=search):
+            result = self.sentiment.get_reddit_posts("AAPL", chunk_size=1)
+
+        self.assertEqual(list(result['title']), ['Good news', 'Bad news'])
+
+    def test_post_batch_frame(self):
+        """A batch builds the same DataFrame as one dictionary per post did"""
+        posts = [make_submission('a', 'First', 1234567890, selftext='Body'),
+                 make_submission('b', 'Second', 1234567990, subreddit='investing')]
+        records = [PostRecord.from_submission(post) for post in posts]
+        batches = [PostBatch(records[:1], [0.5]), PostBatch(records[1:], [-0.25])]
+
+        frame = PostBatch.concat(batches).to_frame()
+        legacy = pd.DataFrame([{
+            'title': post.title,
+            'text': post.selftext,
+            'created_utc': datetime.fromtimestamp(post.created_utc),
+            'sentiment': score,
+            'created_at': datetime.fromtimestamp(post.created_utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'url': f'https://www.reddit.com{post.permalink}',
+            'subreddit': post.subreddit.display_name,
+        } for post, score in zip(posts, [0.5, -0.25])])
+
+        pd.testing.assert_frame_equal(frame, legacy, check_dtype=False)
+        self.assertFalse(hasattr(records[0], '__dict__'))
+        self.assertTrue(PostBatch().to_frame().empty)
+
+    def test_analyze_sentiment_stream(self):
+        """Chunked aggregation gives the same result as the DataFrame analysis"""
+        now = timezone.now().timestamp()
+        titles = ['Great gains', 'Terrible loss', 'Great gains', 'It is a day', 'Good', 'Bad', 'Nice', 'Awful']
+        posts = [make_submission(str(i), title, now) for i, title in enumerate(titles)]
+
+        with patch.object(RedditSentiment, 'search', side_effect=lambda *args, **kwargs: iter(posts)):
+            streamed = self.sentiment.analyze_sentiment_stream("AAPL", chunk_size=3)
+            expected = self.sentiment.analyze_sentiment("AAPL")
+
+        self.assertEqual(streamed['data']['top_posts'], expected['data']['top_posts'])
+        self.assertEqual(streamed['data']['sentiment_distribution'], expected['data']['sentiment_distribution'])
+        self.assertAlmostEqual(streamed['data']['average_sentiment'], expected['data']['average_sentiment'])
+        self.assertEqual(streamed['data']['posts_count'], 8)
+
     @patch('praw.Reddit')
     def test_analyze_sentiment_success(self, mock_reddit):
         """Test successful sentiment analysis"""
@@ -222,4 +525,1628 @@ class RedditSentimentTests(TestCase):
 
         self.assertFalse(result['success'])
         self.assertIsNone(result['data'])
-        self.assertEqual(result['error'], "No Reddit posts found for INVALID")
\ No newline at end of file
+        self.assertEqual(result['error'], "No Reddit posts found for INVALID")
+
+
+class RegistryTests(TestCase):
+    """Unit tests for the shared service registry"""
+
+    def setUp(self):
+        registry.reset()
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_reddit_sentiment_is_shared(self):
+        """The same instance is returned on every call"""
+        first = registry.get_reddit_sentiment()
+        second = registry.get_reddit_sentiment()
+        self.assertIs(first, second)
+
+    def test_shared_across_threads(self):
+        """Concurrent first calls build the instance only once"""
+        built = []
+
+        def factory():
+            built.append(object())
+            return built[-1]
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry._get_or_create('test', factory)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(built), 1)
+        self.assertTrue(all(result is built[0] for result in results))
+
+    def test_praw_client_is_per_thread(self):
+        """Each thread gets its own PRAW client from the shared instance"""
+        sentiment = registry.get_reddit_sentiment()
+        with patch('praw.Reddit', side_effect=lambda **kwargs: Mock()):
+            main_client = sentiment.reddit
+            other = []
+            thread = threading.Thread(target=lambda: other.append(sentiment.reddit))
+            thread.start()
+            thread.join()
+
+            self.assertIs(sentiment.reddit, main_client)
+            self.assertIsNot(other[0], main_client)
+
+    @patch('stock.registry.get_ml_analyzer', side_effect=LookupError("vader_lexicon"))
+    def test_warm_up_reports_failures(self, mock_get_ml_analyzer):
+        """A failing service does not stop the warm-up of the others"""
+        status = registry.warm_up()
+
+        self.assertTrue(status['reddit_sentiment'])
+        self.assertFalse(status['ml_analyzer'])
+
+
+class FakeVader:
+    """Deterministic stand-in for VADER, which needs the NLTK lexicon"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def polarity_scores(self, text):
+        self.calls += 1
+        return {'compound': ((len(text) * 37) % 200 - 100) / 100}
+
+
+@patch('stock.ml.analyzer_ml.stopwords', Mock(words=Mock(return_value=['the', 'a', 'is'])))
+@patch('stock.ml.analyzer_ml.SentimentIntensityAnalyzer', FakeVader)
+class MlSentimentAnalyzerTests(TestCase):
+    """Unit tests for the MlSentimentAnalyzer class"""
+
+    texts = [
+        "Great earnings, buying more!",
+        "Is this the top?",
+        "",
+        "Great earnings, buying more!",
+        "x" * 1500,
+        "Terrible guidance?! Selling everything",
+    ]
+
+    def setUp(self):
+        registry.reset()
+
+    def legacy_sentiment(self, analyzer, text):
+        vader_sentiment = analyzer.sia.polarity_scores(text)
+        text_length = min(1000, len(text))
+        has_question = 1 if '?' in text else 0
+        has_exclamation = 1 if '!' in text else 0
+        return (
+                vader_sentiment['compound'] * 0.7 +
+                (text_length / 1000) * 0.1 +
+                (has_question * -0.1) +
+                (has_exclamation * 0.1)
+        )
+
+    def test_analyze_sentiment_batch_matches_per_row(self):
+        """Batched scores are identical to the row-by-row formula"""
+        analyzer = MlSentimentAnalyzer()
+        expected = [self.legacy_sentiment(analyzer, text) for text in self.texts]
+
+        result = analyzer.analyze_sentiment_batch(self.texts)
+
+        self.assertEqual(list(result), expected)
+        self.assertEqual(analyzer.analyze_sentiment(self.texts[1]), expected[1])
+
+    def test_analyze_sentiment_batch_scores_unique_texts_once(self):
+        """VADER is only called once per distinct text"""
+        analyzer = MlSentimentAnalyzer()
+
+        analyzer.analyze_sentiment_batch(self.texts)
+
+        self.assertEqual(analyzer.sia.calls, len(set(self.texts)))
+
+    def test_calculate_quality_batch(self):
+        """Batched quality scores match the single post wrapper"""
+        analyzer = MlSentimentAnalyzer()
+        posts_df = pd.DataFrame({'text': self.texts, 'score': [0, 11, 50, 10, 3, 100]})
+
+        result = analyzer.calculate_quality_batch(posts_df)
+
+        for i, (_, post) in enumerate(posts_df.iterrows()):
+            self.assertEqual(result[i], analyzer.calculate_quality(post))
+        self.assertEqual(result[2], 0.25 + abs(analyzer.sia.polarity_scores('')['compound']) * 0.5)
+
+        filtered = analyzer.filter_posts(posts_df)
+        self.assertTrue((filtered['quality_score'] > analyzer.quality_threshold).all())
+
+    def test_vader_scores_are_cached(self):
+        """A second batch with the same texts does not call VADER again"""
+        analyzer = MlSentimentAnalyzer()
+        first = analyzer.analyze_sentiment_batch(self.texts)
+        calls = analyzer.sia.calls
+
+        second = analyzer.analyze_sentiment_batch(self.texts)
+
+        self.assertEqual(analyzer.sia.calls, calls)
+        self.assertEqual(list(first), list(second))
+
+    def test_analyze_trend_does_not_mutate_input(self):
+        """Trend matches a daily resample and leaves the frame untouched"""
+        analyzer = MlSentimentAnalyzer()
+        posts_df = pd.DataFrame({
+            'created_utc': pd.to_datetime(['2024-01-01 10:00', '2024-01-01 15:00', '2024-01-03 09:00',
+                                           '2024-01-04 09:00']),
+            'sentiment': [0.5, 0.3, -0.2, 0.9],
+        })
+        original = posts_df.copy()
+
+        result = analyzer.analyze_trend(posts_df, window_size=2)
+
+        pd.testing.assert_frame_equal(posts_df, original)
+        expected = original.set_index('created_utc')['sentiment'].resample('D').mean()
+        pd.testing.assert_series_equal(result['daily_sentiment'], expected, check_names=False, check_freq=False)
+        self.assertAlmostEqual(result['current_sentiment'], 0.35)
+        self.assertEqual(result['trend'], 'Bullish')
+
+    def test_empty_batches(self):
+        """Empty input gives empty arrays"""
+        analyzer = MlSentimentAnalyzer()
+
+        self.assertEqual(len(analyzer.analyze_sentiment_batch([])), 0)
+        self.assertEqual(len(analyzer.calculate_quality_batch(pd.DataFrame(columns=['text', 'score']))), 0)
+
+
+def legacy_clean_text(text):
+    """RedditSentiment.clean_text before it moved to text_normalization"""
+    if not isinstance(text, str):
+        return ""
+    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'@\w+|#\w+', '', text)
+    text = re.sub(r'[^A-Za-z0-9\s]', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_preprocess(text, stop_words, tokenize):
+    """MlSentimentAnalyzer.preprocess before it moved to text_normalization"""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    tokens = tokenize(text)
+    tokens = [word for word in tokens if word not in stop_words]
+    return ' '.join(tokens)
+
+
+class TextNormalizationTests(TestCase):
+    """The shared normalization gives the same results as the code it replaced"""
+
+    STOP_WORDS = frozenset(['i', 'the', 'a', 'is', 'can', 'not', 'to', 'me', 't', 'don'])
+
+    def setUp(self):
+        rng = random.Random(15)
+        alphabet = 'aBz09 \t\n\xa0@#_.$\'-/:éİhtpw'
+        self.texts = [
+            "Hello @user #tag World!", "Check https://example.com/x?y=1 now", "@http://x.com",
+            "#www.site.org is #1", "I cannot believe it, gonna buy and wanna hold",
+            "Lemme gimme GOTTA wanna", "don't won't can't", "@@x ##y", "a@b#c", "   ", "", 123, None,
+            "$AAPL to the moon 🚀🚀", "line\nbreak\x1ctab", "İstanbul ÉCOLE",
+        ] + [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(300)]
+
+    def test_clean_text_matches_legacy(self):
+        expected = [legacy_clean_text(text) for text in self.texts]
+
+        self.assertEqual([text_normalization.clean_text(text) for text in self.texts], expected)
+        self.assertEqual(text_normalization.clean_text_batch(self.texts).tolist(), expected)
+
+    def test_preprocess_matches_treebank_tokenizer(self):
+        from nltk.tokenize import NLTKWordTokenizer
+        tokenizer = NLTKWordTokenizer()
+        expected = [legacy_preprocess(text, self.STOP_WORDS, tokenizer.tokenize) for text in self.texts]
+
+        self.assertEqual([text_normalization.preprocess(text, self.STOP_WORDS) for text in self.texts], expected)
+        self.assertEqual(text_normalization.preprocess_batch(self.texts, self.STOP_WORDS).tolist(), expected)
+
+    def test_preprocess_tokens(self):
+        """Fixed tokens for contractions, punctuation and links, needing no NLTK data"""
+        cases = {
+            "I cannot believe it": ['i', 'can', 'not', 'believe', 'it'],
+            "Gonna buy, gimme MORE... lemme see!": ['gon', 'na', 'buy', 'gim', 'me', 'more', 'lem', 'me', 'see'],
+            "Gotta wanna": ['got', 'ta', 'wan', 'na'],
+            "don't won't can't": ['dont', 'wont', 'cant'],
+            "(wow) -- $AAPL, up 5%?!": ['wow', 'aapl', 'up'],
+            "See https://example.com/a-b?c=1 now": ['see', 'httpsexamplecomabc', 'now'],
+            "cannotx xgonna": ['cannotx', 'xgonna'],
+        }
+        for text, tokens in cases.items():
+            self.assertEqual(text_normalization.preprocess(text, frozenset()).split(), tokens, text)
+        self.assertEqual(text_normalization.preprocess_batch(list(cases), frozenset()).str.split().tolist(),
+                         list(cases.values()))
+        self.assertEqual(text_normalization.clean_text("See https://example.com/a-b?c=1, @bob #tag now!"),
+                         'See now')
+
+    def test_preprocess_matches_word_tokenize(self):
+        from nltk.tokenize import word_tokenize
+        try:
+            word_tokenize("probe")
+        except LookupError:
+            self.skipTest("NLTK punkt data is not installed")
+        expected = [legacy_preprocess(text, self.STOP_WORDS, word_tokenize) for text in self.texts]
+
+        self.assertEqual([text_normalization.preprocess(text, self.STOP_WORDS) for text in self.texts], expected)
+
+
+class ScoringPoolTests(TestCase):
+    """Tests for the scoring process pool"""
+
+    def test_polarity_in_workers(self):
+        """Worker processes score chunks in order, like TextBlob in this process"""
+        from textblob import TextBlob
+        texts = ['great gains', 'terrible loss', 'a day', 'good', 'awful news']
+        pool = ScoringPool(workers=2, chunk_size=2, min_batch=0)
+        try:
+            scores = pool.polarity_many(texts)
+        finally:
+            pool.shutdown()
+
+        self.assertEqual(scores, [TextBlob(text).sentiment.polarity for text in texts])
+
+    def test_concurrent_threads_share_one_pool(self):
+        """Threads asking for the pool at the same time start a single one"""
+        pool = ScoringPool(workers=2)
+        barrier = threading.Barrier(8)
+
+        def slow_executor(**kwargs):
+            time.sleep(0.05)
+            return Mock()
+
+        def get_executor():
+            barrier.wait()
+            return pool.executor
+
+        with patch('stock.scoring_pool.ProcessPoolExecutor', side_effect=slow_executor) as executor_class:
+            with ThreadPoolExecutor(max_workers=8) as threads:
+                executors = list(threads.map(lambda _: get_executor(), range(8)))
+
+        executor_class.assert_called_once()
+        self.assertTrue(all(executor is executors[0] for executor in executors))
+
+    def test_small_batches_stay_in_process(self):
+        """Batches below min_batch and a missing pool use the fallback"""
+        pool = Mock(accepts=Mock(return_value=False))
+        fallback = Mock(return_value=[0.1])
+
+        self.assertEqual(score_with_pool(pool, 'polarity_many', ['x'], fallback), [0.1])
+        self.assertEqual(score_with_pool(None, 'polarity_many', ['x'], fallback), [0.1])
+        pool.polarity_many.assert_not_called()
+
+    def test_broken_pool_falls_back(self):
+        """A crashed worker does not fail the scoring"""
+        pool = Mock(accepts=Mock(return_value=True), polarity_many=Mock(side_effect=BrokenProcessPool("died")))
+
+        self.assertEqual(score_with_pool(pool, 'polarity_many', ['x'], lambda texts: [0.2]), [0.2])
+        pool.shutdown.assert_called_once()
+
+    def test_registry_pool_is_opt_in(self):
+        """No pool is built unless workers are configured"""
+        registry.reset()
+        with self.settings(SCORING_POOL_WORKERS=0):
+            self.assertIsNone(registry.get_scoring_pool())
+        with self.settings(SCORING_POOL_WORKERS=2, SCORING_POOL_MIN_BATCH=50):
+            self.assertEqual(registry.get_scoring_pool().min_batch, 50)
+        registry.reset()
+
+
+class ScoreCacheTests(TestCase):
+    """Unit tests for the ScoreCache class"""
+
+    def test_memory_tier(self):
+        """Scores are computed once and then served from memory"""
+        cache = ScoreCache(max_size=10)
+        compute = Mock(side_effect=lambda text: len(text))
+
+        self.assertEqual(cache.get_or_compute('test', '1', 'abc', compute), 3)
+        self.assertEqual(cache.get_or_compute('test', '1', 'abc', compute), 3)
+
+        compute.assert_called_once_with('abc')
+        stats = cache.stats()
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_version_is_part_of_key(self):
+        """A new scorer version does not reuse old scores"""
+        cache = ScoreCache()
+        cache.get_or_compute('test', '1', 'abc', lambda text: 1.0)
+
+        self.assertEqual(cache.get_or_compute('test', '2', 'abc', lambda text: 2.0), 2.0)
+
+    def test_lru_eviction(self):
+        """The least recently used score is dropped first"""
+        cache = ScoreCache(max_size=2)
+        cache.get_or_compute('test', '1', 'a', lambda text: 1)
+        cache.get_or_compute('test', '1', 'b', lambda text: 2)
+        cache.get_or_compute('test', '1', 'a', lambda text: 1)
+        cache.get_or_compute('test', '1', 'c', lambda text: 3)
+
+        compute = Mock(return_value=2)
+        cache.get_or_compute('test', '1', 'b', compute)
+        compute.assert_called_once()
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_persistent_tier_survives_restart(self):
+        """Scores stored in the database are found by a fresh cache"""
+        ScoreCache(persistent=True).get_or_compute_many(
+            'test', '1', ['a', 'b', 'a'], lambda texts: [len(texts)] * len(texts)
+        )
+        self.assertEqual(CachedScore.objects.count(), 2)
+
+        cache = ScoreCache(persistent=True)
+        compute = Mock()
+        self.assertEqual(cache.get_or_compute_many('test', '1', ['b', 'a'], compute), [2, 2])
+        compute.assert_not_called()
+        self.assertEqual(cache.stats()['persistent_hits'], 2)
+
+    def test_get_sentiment_uses_cache(self):
+        """TextBlob is only run once for the same cleaned text"""
+        registry.reset()
+        sentiment = RedditSentiment()
+
+        with patch('stock.reddit_sentiment.TextBlob') as mock_textblob:
+            mock_textblob.return_value.sentiment.polarity = 0.5
+            self.assertEqual(sentiment.get_sentiment("Good stock!"), 0.5)
+            self.assertEqual(sentiment.get_sentiment("Good stock"), 0.5)
+
+        mock_textblob.assert_called_once_with("Good stock")
+
+
+class QuoteCacheTests(TestCase):
+    """Unit tests for the QuoteCache class"""
+
+    def test_fresh_entry_is_served(self):
+        """A fresh quote does not call the loader again"""
+        cache = QuoteCache(ttl=60)
+        loader = Mock(return_value={'success': True, 'data': 1})
+
+        cache.get('AAPL', loader)
+        cache.get('AAPL', loader)
+
+        loader.assert_called_once()
+
+    def test_failures_are_not_cached(self):
+        """Unsuccessful results are loaded again on the next call"""
+        cache = QuoteCache(ttl=60)
+        loader = Mock(return_value={'success': False, 'data': None})
+
+        cache.get('AAPL', loader)
+        cache.get('AAPL', loader)
+
+        self.assertEqual(loader.call_count, 2)
+
+    def test_concurrent_misses_share_one_load(self):
+        """Callers arriving while a load is running wait for its result"""
+        cache = QuoteCache(ttl=60)
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return {'success': True, 'data': 1}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('AAPL', loader)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while 'AAPL' not in cache._inflight:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        """An expired quote is returned at once and refreshed in the background"""
+        cache = QuoteCache(ttl=0, stale_ttl=60)
+        cache.set('AAPL', {'success': True, 'data': 'old'})
+        fresh = {'success': True, 'data': 'new'}
+
+        result = cache.get('AAPL', lambda: fresh)
+
+        self.assertEqual(result['data'], 'old')
+        for _ in range(100):
+            if 'AAPL' not in cache._inflight:
+                break
+            time.sleep(0.01)
+        self.assertIs(cache.peek('AAPL')[0], fresh)
+
+    def test_expired_entry_is_reloaded(self):
+        """Quotes older than the stale window are loaded synchronously"""
+        cache = QuoteCache(ttl=0, stale_ttl=0)
+        cache.set('AAPL', {'success': True, 'data': 'old'})
+
+        result = cache.get('AAPL', lambda: {'success': True, 'data': 'new'})
+
+        self.assertEqual(result['data'], 'new')
+
+
+class RetryPolicyTests(TestCase):
+    """Unit tests for RetryPolicy and CircuitBreaker"""
+
+    def rate_limit_error(self):
+        mock_response = Mock()
+        mock_response.status_code = 429
+        return HTTPError(response=mock_response)
+
+    def test_backoff_is_exponential_with_jitter(self):
+        """Delays double on every retry and add at most the jitter fraction"""
+        policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0.5)
+
+        for retry, base in ((1, 1), (2, 2), (3, 4), (4, 5)):
+            delay = policy.backoff(retry)
+            self.assertTrue(base <= delay <= base * 1.5)
+
+    def test_deadline_stops_retries(self):
+        """No retry is attempted when its delay would exceed the deadline"""
+        clock = [0.0]
+        policy = RetryPolicy(max_tries=5, base_delay=4, jitter=0, deadline=10)
+        fn = Mock(side_effect=self.rate_limit_error())
+
+        with patch('time.monotonic', side_effect=lambda: clock[0]), \
+                patch('time.sleep', side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds)) as mock_sleep:
+            with self.assertRaises(RetryError) as context:
+                policy.call(fn)
+
+        # Sleeps of 4s then 8s would exceed the 10s budget
+        self.assertEqual(fn.call_count, 2)
+        mock_sleep.assert_called_once_with(4)
+        self.assertTrue(context.exception.rate_limited)
+
+    def test_deadline_bounds_attempts(self):
+        """Attempts are given the time left of the deadline, none starts after it"""
+        clock = [0.0]
+        policy = RetryPolicy(max_tries=5, base_delay=2, jitter=0, deadline=10)
+        timeouts = []
+
+        def fn(timeout):
+            timeouts.append(timeout)
+            clock[0] += 3
+            raise self.rate_limit_error()
+
+        with patch('time.monotonic', side_effect=lambda: clock[0]), \
+                patch('time.sleep', side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds)):
+            with self.assertRaises(RetryError):
+                policy.call(fn, pass_timeout=True)
+
+        # 3s attempt, 2s delay, 3s attempt with 5s left; a 4s delay would leave none
+        self.assertEqual(timeouts, [10, 5])
+
+    def test_async_attempt_is_cancelled_at_deadline(self):
+        """A hanging async attempt ends with the deadline"""
+        async def fn():
+            await asyncio.sleep(5)
+
+        started = time.monotonic()
+        with self.assertRaises(RetryError):
+            asyncio.run(RetryPolicy(deadline=0.1).acall(fn))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_no_tries(self):
+        """A policy without attempts raises instead of returning None"""
+        fn = Mock()
+
+        with self.assertRaises(RetryError) as context:
+            RetryPolicy(max_tries=0).call(fn)
+        with self.assertRaises(RetryError):
+            asyncio.run(RetryPolicy(max_tries=0).acall(fn))
+
+        fn.assert_not_called()
+        self.assertEqual(context.exception.attempts, 0)
+
+    def test_circuit_breaker_counts_consecutive_rate_limits(self):
+        """Another failure between rate limits starts the count again"""
+        breaker = CircuitBreaker(failure_threshold=2)
+
+        breaker.record_rate_limit()
+        breaker.record_other_failure()
+        breaker.record_rate_limit()
+        self.assertFalse(breaker.is_open)
+
+        breaker.record_rate_limit()
+        self.assertTrue(breaker.is_open)
+
+    def test_non_retryable_errors_are_raised(self):
+        """Errors outside retry_on are not retried"""
+        fn = Mock(side_effect=ValueError("bad"))
+
+        with self.assertRaises(ValueError):
+            RetryPolicy(base_delay=0).call(fn)
+        fn.assert_called_once()
+
+    def test_circuit_breaker_fails_fast(self):
+        """Once open, the breaker rejects calls until the reset timeout passes"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        policy = RetryPolicy(max_tries=2, base_delay=0, jitter=0, breaker=breaker)
+        fn = Mock(side_effect=self.rate_limit_error())
+
+        with self.assertRaises(RetryError):
+            policy.call(fn)
+        self.assertTrue(breaker.is_open)
+
+        with self.assertRaises(CircuitOpenError):
+            policy.call(fn)
+        self.assertEqual(fn.call_count, 2)
+
+    def test_circuit_breaker_trial_call_closes(self):
+        """A successful trial call after the reset timeout closes the breaker"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_rate_limit()
+        self.assertTrue(breaker.is_open)
+
+        result = RetryPolicy(breaker=breaker).call(lambda: 'ok')
+
+        self.assertEqual(result, 'ok')
+        self.assertFalse(breaker.is_open)
+
+    def test_async_call(self):
+        """The async variant retries without blocking the event loop"""
+        attempts = []
+
+        async def fn():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise self.rate_limit_error()
+            return 'ok'
+
+        result = asyncio.run(RetryPolicy(base_delay=0, jitter=0).acall(fn))
+
+        self.assertEqual(result, 'ok')
+        self.assertEqual(len(attempts), 2)
+
+
+class FanOutTests(TestCase):
+    """Unit tests for concurrent source fetching"""
+
+    def test_tasks_run_concurrently(self):
+        """Total time is the slowest task, not the sum"""
+        started = time.monotonic()
+        results = fan_out({
+            'a': lambda: time.sleep(0.2) or 'a',
+            'b': lambda: time.sleep(0.2) or 'b',
+        }, timeouts={'default': 5})
+
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual(results, {'a': ('a', None), 'b': ('b', None)})
+
+    def test_timeout_and_error_are_reported(self):
+        """A slow or failing source does not hide the others"""
+        results = fan_out({
+            'slow': lambda: time.sleep(1) or 'late',
+            'broken': Mock(side_effect=ValueError("boom")),
+            'ok': lambda: 'fine',
+        }, timeouts={'slow': 0.1, 'default': 5})
+
+        self.assertIsNone(results['slow'][0])
+        self.assertIsInstance(results['slow'][1], SourceTimeout)
+        self.assertIsInstance(results['broken'][1], ValueError)
+        self.assertEqual(results['ok'], ('fine', None))
+
+
+    def test_hung_source_does_not_delay_later_calls(self):
+        """Stuck calls hold their source's slots only, later calls neither queue nor wait"""
+        release = threading.Event()
+        registry.reset()
+        try:
+            with self.settings(STOCK_FETCH_WORKERS=3, STOCK_SOURCE_SLOTS={'reddit': 1, 'default': 2}):
+                first = fan_out({'reddit': release.wait}, timeouts={'default': 0.05})
+
+                started = time.monotonic()
+                second = fan_out({'reddit': lambda: 'posts', 'price': lambda: time.sleep(0.1) or 'price'},
+                                 timeouts={'default': 1})
+                elapsed = time.monotonic() - started
+        finally:
+            release.set()
+            registry.reset()
+
+        self.assertIsInstance(first['reddit'][1], SourceTimeout)
+        self.assertIsInstance(second['reddit'][1], SourceBusy)
+        self.assertEqual(second['price'], ('price', None))
+        self.assertLess(elapsed, 0.5)
+
+
+class SentimentViewTests(TestCase):
+    """Tests for the sentiment pages"""
+
+    def setUp(self):
+        cache.clear()
+        self.analysis = {
+            'success': True,
+            'data': {
+                'average_sentiment': 0.25,
+                'sentiment_distribution': {'positive': 1},
+                'posts_count': 1,
+                'top_posts': [],
+                'time_filter': 'week',
+            },
+            'error': None,
+        }
+        self.reddit = RedditSentiment()
+
+    def get_page(self, **params):
+        """Sentiment page with the Reddit analysis and price lookup mocked"""
+        with patch('stock.registry.get_reddit_sentiment', return_value=self.reddit), \
+                patch.object(RedditSentiment, 'analyze_sentiment', return_value=self.analysis) as mock_analyze, \
+                patch.object(FetchStockData, 'get_stock_data', return_value=None):
+            response = self.client.get('/reddit_sentiment/', params)
+        return response, mock_analyze
+
+    def test_partial_result_when_price_fails(self):
+        """The Reddit analysis is shown even if the price lookup fails"""
+        with patch('stock.registry.get_reddit_sentiment', return_value=self.reddit), \
+                patch.object(RedditSentiment, 'analyze_sentiment', return_value=self.analysis), \
+                patch.object(FetchStockData, 'get_stock_data', side_effect=RequestException("down")):
+            response = self.client.get('/reddit_sentiment/', {'symbol': 'AAPL'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['result']['success'])
+        self.assertFalse(response.context['stock_data']['success'])
+        self.assertContains(response, "Could not load the price of AAPL")
+
+    def test_no_symbol(self):
+        """Nothing is fetched without a symbol"""
+        with patch('stock.views.fan_out') as mock_fan_out:
+            response = self.client.get('/reddit_sentiment/')
+
+        mock_fan_out.assert_not_called()
+        self.assertEqual(response.context['result']['error'], 'No symbol provided')
+
+    def test_result_is_cached(self):
+        """A repeated request is served from the cache, whatever the case of the symbol"""
+        self.get_page(symbol='TSLA')
+        response, mock_analyze = self.get_page(symbol='tsla')
+
+        mock_analyze.assert_not_called()
+        self.assertEqual(response.context['result']['data']['posts_count'], 1)
+
+        # Another window or scorer version is analysed again
+        _, mock_analyze = self.get_page(symbol='TSLA', time_filter='year')
+        mock_analyze.assert_called_once()
+        self.reddit.SCORER_VERSION = '2'
+        _, mock_analyze = self.get_page(symbol='TSLA')
+        mock_analyze.assert_called_once()
+
+    def test_failures_are_not_cached(self):
+        """A failed analysis is retried on the next request"""
+        self.analysis = {'success': False, 'data': None, 'error': 'No posts found for TSLA'}
+        self.get_page(symbol='TSLA')
+        _, mock_analyze = self.get_page(symbol='TSLA')
+
+        mock_analyze.assert_called_once()
+
+    def test_ingestion_run_invalidates(self):
+        """A new ingestion run of a symbol, from any process, drops its cached results only"""
+        state = IngestionState.objects.create(stock=Stock.objects.create(symbol='TSLA'), last_run=timezone.now())
+        self.get_page(symbol='TSLA')
+        self.get_page(symbol='AAPL')
+        state.last_run += timezone.timedelta(minutes=5)
+        state.save()
+
+        _, mock_analyze = self.get_page(symbol='TSLA')
+        mock_analyze.assert_called_once()
+        _, mock_analyze = self.get_page(symbol='AAPL')
+        mock_analyze.assert_not_called()
+
+    def test_ttl_depends_on_window(self):
+        """Longer windows are cached longer, and odd symbols not at all"""
+        self.assertLess(result_cache.ttl('week'), result_cache.ttl('year'))
+        self.assertIsNone(result_cache.normalize_symbol('TSLA stock'))
+        self.assertIsNone(result_cache.result_key('TSLA stock', 'week', 'textblob', '1'))
+
+
+class MentionExtractorTests(TestCase):
+    """Tests for the ticker mention extractor"""
+
+    def setUp(self):
+        registry.reset()
+
+    def test_mentions(self):
+        """Cashtags match in any case, bare tickers only in upper case and as whole words"""
+        extractor = MentionExtractor(['AAPL', 'TSLA', 'BRK.B', 'BRK'])
+
+        self.assertEqual(extractor.extract('$tsla and AAPL beat BRK.B'), {'TSLA', 'AAPL', 'BRK.B'})
+        self.assertEqual(extractor.extract('aapl TSLAQ XAAPL $AAPLX'), set())
+        self.assertEqual(extractor.extract('BRK, $brk'), {'BRK'})
+        # A tracked B is not found inside BRK.B, while a sentence ending in a ticker still matches
+        self.assertEqual(MentionExtractor(['B', 'BRK']).extract('BRK.B rallied. So did B.'), {'B'})
+        # Sharp s upper-cases to two letters, which must not shift the match
+        self.assertEqual(extractor.extract('Straße AAPL'), {'AAPL'})
+
+    def test_blocklist(self):
+        """Tickers that are common words only count as cashtags"""
+        extractor = MentionExtractor(['IT', 'ON', 'TSLA'])
+
+        self.assertEqual(extractor.extract('IT is ON, buy TSLA'), {'TSLA'})
+        self.assertEqual(extractor.extract('$IT and $on'), {'IT', 'ON'})
+
+    def test_new_stocks_are_added(self):
+        """Stocks created after the shared extractor was built are recognised"""
+        Stock.objects.create(symbol='AAPL')
+        # Creating a stock does not build the extractor
+        self.assertIsNone(registry.peek('mention_extractor'))
+        extractor = registry.get_mention_extractor()
+        self.assertEqual(extractor.extract('AAPL and MSFT'), {'AAPL'})
+
+        Stock.objects.create(symbol='MSFT')
+
+        self.assertIs(registry.get_mention_extractor(), extractor)
+        self.assertEqual(extractor.extract('AAPL and MSFT'), {'AAPL', 'MSFT'})
+
+    def test_require_mention(self):
+        """Posts that do not mention the symbol are dropped unless asked to keep them"""
+        now = timezone.now().timestamp()
+        posts = [make_submission('a', 'TSLA earnings', now - 10), make_submission('b', 'EV stocks in general', now - 20)]
+        reddit = RedditSentiment()
+        reddit.get_sentiment_batch = lambda texts: [0.0] * len(texts)
+
+        with patch.object(RedditSentiment, 'search', return_value=posts):
+            with self.settings(REDDIT_REQUIRE_MENTION=False):
+                self.assertEqual(len(reddit.get_reddit_posts('TSLA')), 2)
+            posts_df = reddit.get_reddit_posts('tsla')
+
+        self.assertEqual(posts_df['title'].tolist(), ['TSLA earnings'])
+
+
+class CompareTests(TestCase):
+    """Tests for the multi-symbol comparison"""
+
+    def test_search_queries(self):
+        """Symbols are joined into as few queries as fit Reddit's length limit"""
+        self.assertEqual(search_queries(['AAPL', 'TSLA']), ['AAPL OR TSLA'])
+
+        symbols = [f'S{i:03d}' for i in range(100)]
+        queries = search_queries(symbols, max_length=50)
+        self.assertTrue(all(len(query) <= 50 for query in queries))
+        self.assertEqual(' OR '.join(queries).split(' OR '), symbols)
+
+    def test_compare_shares_fetch_and_scoring(self):
+        """One search and one scoring pass serve every symbol a post mentions"""
+        now = timezone.now().timestamp()
+        posts = [
+            make_submission('a', 'AAPL and TSLA are good', now - 10),
+            make_submission('b', '$tsla is bad', now - 20),
+            make_submission('c', 'Nothing relevant here', now - 30),
+        ]
+        reddit = RedditSentiment()
+        scored = []
+
+        def score(texts):
+            scored.extend(texts)
+            return [0.5 if 'good' in text else -0.5 for text in texts]
+
+        with patch('stock.registry.get_reddit_sentiment', return_value=reddit), \
+                patch.object(RedditSentiment, 'search_query', return_value=posts) as mock_search, \
+                patch.object(RedditSentiment, 'get_sentiment_batch', side_effect=score):
+            response = self.client.get('/compare/', {'symbols': 'aapl, TSLA', 'format': 'json'})
+
+        mock_search.assert_called_once()
+        self.assertEqual(mock_search.call_args.args[0], 'AAPL OR TSLA')
+        self.assertEqual(len(scored), 2)
+
+        data = response.json()['data']
+        self.assertEqual(data['posts_fetched'], 3)
+        self.assertEqual(data['symbols']['AAPL']['data']['posts_count'], 1)
+        self.assertEqual(data['symbols']['TSLA']['data']['posts_count'], 2)
+        self.assertEqual(data['symbols']['TSLA']['data']['average_sentiment'], 0.0)
+
+    def test_invalid_symbols(self):
+        """Malformed or missing symbols are rejected before searching"""
+        with patch.object(RedditSentiment, 'search_query') as mock_search:
+            response = self.client.get('/compare/', {'symbols': 'AAPL,TSLA stock', 'format': 'json'})
+            page = self.client.get('/compare/')
+
+        mock_search.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(page, 'No symbols provided', status_code=400)
+
+
+def make_submission(reddit_id, title, created_utc, selftext="", subreddit="stocks", score=1):
+    """Mock PRAW submission"""
+    post = Mock()
+    post.id = reddit_id
+    post.title = title
+    post.selftext = selftext
+    post.created_utc = created_utc
+    post.permalink = f"/r/{subreddit}/comments/{reddit_id}"
+    post.subreddit.display_name = subreddit
+    post.score = score
+    return post
+
+
+# See MentionExtractorTests for the mention filter
+@override_settings(REDDIT_REQUIRE_MENTION=False)
+class IngestionTests(TestCase):
+    """Tests for Reddit ingestion and the stored aggregates"""
+
+    def setUp(self):
+        registry.reset()
+        cache.clear()
+        self.stock = Stock.objects.create(symbol='AAPL')
+        self.reddit = RedditSentiment()
+        self.reddit.get_sentiment_batch = lambda texts: [0.5 if 'good' in text.lower() else -0.5 for text in texts]
+        self.ml_analyzer = Mock()
+        self.ml_analyzer.preprocess_batch = lambda texts: texts
+        self.ml_analyzer.analyze_sentiment_batch = lambda texts: np.full(len(texts), 0.25)
+        self.ml_analyzer.vader_compound_batch = lambda texts: np.full(len(texts), 0.1)
+        self.patches = [
+            patch('stock.registry.get_reddit_sentiment', return_value=self.reddit),
+            patch('stock.registry.get_ml_analyzer', return_value=self.ml_analyzer),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        registry.reset()
+
+    @override_settings(REDDIT_REQUIRE_MENTION=True)
+    def test_ingestion_requires_mention(self):
+        """Only posts mentioning the stock are stored, the high-water mark moves past all of them"""
+        now = timezone.now().timestamp()
+        posts = [make_submission('a', 'Tech stocks in general', now - 10), make_submission('b', 'AAPL is good', now - 20)]
+
+        with patch.object(RedditSentiment, 'search', return_value=posts):
+            self.assertEqual(ingest_stock(self.stock, backfill='week'), 1)
+
+        self.assertEqual(list(RedditPost.objects.values_list('reddit_id', flat=True)), ['b'])
+        self.assertAlmostEqual(IngestionState.objects.get(stock=self.stock).high_water_mark.timestamp(), now - 10)
+
+    def test_watched_stocks_by_fans(self):
+        """Stocks with more fans are ingested first"""
+        popular = Stock.objects.create(symbol='TSLA')
+        for name in ('a', 'b'):
+            profile = User.objects.create(username=name).userprofile
+            profile.favourite_stocks.add(popular)
+
+        self.assertEqual([stock.symbol for stock in watched_stocks()], ['TSLA', 'AAPL'])
+
+    def test_incremental_ingestion(self):
+        """A second run stops at the high-water mark"""
+        now = timezone.now().timestamp()
+        first = [make_submission('b', 'Good news', now - 100), make_submission('a', 'Bad news', now - 200)]
+
+        with patch.object(RedditSentiment, 'search', return_value=first) as mock_search:
+            self.assertEqual(ingest_stock(self.stock), 2)
+        self.assertEqual(mock_search.call_args.kwargs['sort'], 'new')
+
+        second = [make_submission('c', 'Good again', now - 10)] + first
+        with patch.object(RedditSentiment, 'search', return_value=second):
+            self.assertEqual(ingest_stock(self.stock), 1)
+
+        self.assertEqual(RedditPost.objects.count(), 3)
+        state = IngestionState.objects.get(stock=self.stock)
+        self.assertAlmostEqual(state.high_water_mark.timestamp(), now - 10, places=3)
+
+    def test_upsert_posts(self):
+        """Posts and scores are inserted or updated with a bounded number of queries"""
+        created = timezone.now()
+        records = [
+            {'reddit_id': str(i), 'subreddit': 'stocks', 'title': f'Post {i}', 'selftext': '',
+             'permalink': f'/r/stocks/{i}', 'score': i, 'created_utc': created}
+            for i in range(20)
+        ]
+        scores = [{'textblob': 0.1, 'vader': 0.2, 'ml': 0.3}] * 20
+        upsert_posts(self.stock, records, scores)
+
+        records[0]['score'] = 99
+        scores = [{'textblob': -0.1, 'vader': 0.2, 'ml': 0.3}] * 20
+        with self.assertNumQueries(5):
+            upsert_posts(self.stock, records, scores)
+
+        self.assertEqual(RedditPost.objects.count(), 20)
+        self.assertEqual(RedditPost.objects.get(reddit_id='0').score, 99)
+        self.assertEqual(PostScore.objects.filter(textblob=-0.1).count(), 20)
+
+    def test_stored_analysis(self):
+        """Aggregates are computed from stored posts"""
+        now = timezone.now().timestamp()
+        posts = [make_submission('a', 'Good news', now - 100), make_submission('b', 'Bad news', now - 200)]
+        with patch.object(RedditSentiment, 'search', return_value=posts):
+            ingest_stock(self.stock, backfill='week')
+
+        result = stored_analysis('aapl', 'week')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data']['posts_count'], 2)
+        self.assertEqual(result['data']['average_sentiment'], 0.0)
+        self.assertEqual(result['data']['sentiment_distribution'], {'positive': 1, 'negative': 1})
+        self.assertEqual(result['data']['top_posts'][0]['title'], 'Good news')
+        self.assertEqual(stored_analysis('AAPL', 'week', scorer='ml')['data']['average_sentiment'], 0.25)
+        # The backfill only covered a week
+        self.assertIsNone(stored_analysis('AAPL', 'month'))
+
+    def test_post_found_for_two_symbols(self):
+        """A thread returned by two symbols' searches counts for both"""
+        tsla = Stock.objects.create(symbol='TSLA')
+        now = timezone.now().timestamp()
+        shared = make_submission('s', 'Good AAPL and TSLA news', now - 100)
+
+        with patch.object(RedditSentiment, 'search', return_value=[shared]):
+            self.assertEqual(ingest_stock(self.stock, backfill='week'), 1)
+            self.assertEqual(ingest_stock(tsla, backfill='week'), 1)
+
+        self.assertEqual(RedditPost.objects.filter(reddit_id='s').count(), 2)
+        self.assertEqual(stored_analysis('AAPL', 'week')['data']['posts_count'], 1)
+        self.assertEqual(stored_analysis('TSLA', 'week')['data']['posts_count'], 1)
+        self.assertEqual(DailySentimentRollup.objects.filter(stock=tsla, scorer='textblob').count(), 1)
+
+    def test_stale_ingestion_is_ignored(self):
+        """Stored posts are not used when ingestion has not run recently"""
+        IngestionState.objects.create(
+            stock=self.stock, covered_from=timezone.now() - timezone.timedelta(days=60),
+            last_run=timezone.now() - timezone.timedelta(days=1),
+        )
+
+        self.assertIsNone(stored_analysis('AAPL', 'week'))
+
+    def test_view_reads_stored_posts(self):
+        """The sentiment page does not search Reddit when stored posts are fresh"""
+        now = timezone.now().timestamp()
+        with patch.object(RedditSentiment, 'search', return_value=[make_submission('a', 'Good', now - 100)]):
+            call_command('ingest_reddit', '--once', '--backfill', 'week', stdout=Mock())
+
+        with patch.object(RedditSentiment, 'analyze_sentiment') as mock_analyze, \
+                patch.object(FetchStockData, 'get_stock_data', return_value=None):
+            response = self.client.get('/reddit_sentiment/', {'symbol': 'AAPL'})
+
+        mock_analyze.assert_not_called()
+        self.assertEqual(response.context['result']['data']['posts_count'], 1)
+
+        # New posts invalidate the cached page
+        with patch.object(RedditSentiment, 'search', return_value=[make_submission('b', 'Good', now - 50)]):
+            call_command('ingest_reddit', '--once', stdout=Mock())
+        with patch.object(FetchStockData, 'get_stock_data', return_value=None):
+            response = self.client.get('/reddit_sentiment/', {'symbol': 'AAPL'})
+        self.assertEqual(response.context['result']['data']['posts_count'], 2)
+
+    def test_concurrent_ingestion(self):
+        """Several stocks are searched in one event loop and stored like serial runs"""
+        Stock.objects.create(symbol='TSLA')
+        now = timezone.now().timestamp()
+        listings = {
+            'AAPL stock': [make_submission('a', 'Good', now - 10)],
+            'TSLA stock': [make_submission('t', 'Bad', now - 20), make_submission('u', 'Good', now - 30)],
+        }
+        async_reddit = AsyncRedditSentiment()
+
+        with patch('stock.reddit_sentiment_async.asyncpraw.Reddit', return_value=fake_async_reddit(listings)), \
+                patch('stock.reddit_sentiment_async.aiohttp.ClientSession'), \
+                patch('stock.registry.get_async_reddit_sentiment', return_value=async_reddit):
+            results = ingest_stocks_concurrently(watched_stocks())
+
+        self.assertEqual(results, {'AAPL': 1, 'TSLA': 2})
+        self.assertEqual(RedditPost.objects.filter(stock__symbol='TSLA').count(), 2)
+        self.assertIsNotNone(IngestionState.objects.get(stock__symbol='TSLA').last_run)
+
+
+# See MentionExtractorTests for the mention filter
+@override_settings(REDDIT_REQUIRE_MENTION=False)
+class RollupTests(TestCase):
+    """Tests for the daily sentiment rollups"""
+
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol='AAPL')
+
+    def add_post(self, reddit_id, created, subreddit, textblob, ml):
+        upsert_posts(self.stock, [{
+            'reddit_id': reddit_id, 'subreddit': subreddit, 'title': reddit_id, 'selftext': '',
+            'permalink': f'/r/{subreddit}/{reddit_id}', 'score': 1, 'created_utc': created,
+        }], [{'textblob': textblob, 'vader': None, 'ml': ml}])
+
+    def test_refresh_rollups(self):
+        """Rollups hold count, sum and sum of squares per day and subreddit"""
+        day = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        self.add_post('a', day, 'stocks', 0.5, 0.1)
+        self.add_post('b', day, 'stocks', -0.1, 0.1)
+        self.add_post('c', day, 'investing', 0.2, 0.1)
+        self.add_post('d', day - timezone.timedelta(days=2), 'stocks', 0.4, 0.1)
+
+        refresh_rollups(self.stock)
+
+        rollup = DailySentimentRollup.objects.get(stock=self.stock, scorer='textblob', day=day.date(),
+                                                  subreddit='stocks')
+        self.assertEqual(rollup.count, 2)
+        self.assertAlmostEqual(rollup.total, 0.4)
+        self.assertAlmostEqual(rollup.total_sq, 0.26)
+        self.assertFalse(DailySentimentRollup.objects.filter(scorer='vader').exists())
+
+        frame = daily_frame(self.stock, 'textblob')
+        self.assertEqual(list(frame['count']), [1, 3])
+        self.assertAlmostEqual(frame['total'].iloc[-1], 0.6)
+
+    def test_refresh_only_touched_days(self):
+        """Re-ingesting a day replaces its rollups and keeps the others"""
+        day = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        earlier = day - timezone.timedelta(days=1)
+        self.add_post('a', day, 'stocks', 0.5, 0.1)
+        self.add_post('b', earlier, 'stocks', 0.5, 0.1)
+        refresh_rollups(self.stock)
+
+        self.add_post('a', day, 'stocks', -0.5, 0.1)
+        refresh_rollups(self.stock, {day.date()})
+
+        frame = daily_frame(self.stock, 'textblob')
+        self.assertEqual(list(frame['total']), [0.5, -0.5])
+
+    def test_trend_from_rollups(self):
+        """analyze_trend_daily gives the same trend as the raw posts"""
+        day = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        rows = [('a', 3, 0.5), ('b', 3, 0.1), ('c', 1, 0.4), ('d', 0, -0.3)]
+        for reddit_id, days_ago, score in rows:
+            self.add_post(reddit_id, day - timezone.timedelta(days=days_ago), 'stocks', score, score)
+        refresh_rollups(self.stock)
+        posts_df = pd.DataFrame({
+            'created_utc': [day - timezone.timedelta(days=days_ago) for _, days_ago, _ in rows],
+            'sentiment': [score for _, _, score in rows],
+        })
+
+        with patch('stock.ml.analyzer_ml.SentimentIntensityAnalyzer', FakeVader), \
+                patch('stock.ml.analyzer_ml.stopwords', Mock(words=Mock(return_value=[]))):
+            analyzer = MlSentimentAnalyzer()
+        from_rollups = analyzer.analyze_trend_daily(daily_frame(self.stock, 'ml'), window_size=2)
+        from_posts = analyzer.analyze_trend(posts_df, window_size=2)
+
+        self.assertEqual(list(from_rollups['daily_sentiment'].round(6).fillna(99)),
+                         list(from_posts['daily_sentiment'].round(6).fillna(99)))
+        self.assertAlmostEqual(from_rollups['current_sentiment'], from_posts['current_sentiment'])
+
+    def test_ingestion_updates_rollups(self):
+        """Ingesting posts refreshes the rollups of their days"""
+        reddit = RedditSentiment()
+        reddit.get_sentiment_batch = lambda texts: [0.5] * len(texts)
+        ml_analyzer = Mock()
+        ml_analyzer.preprocess_batch = lambda texts: texts
+        ml_analyzer.analyze_sentiment_batch = lambda texts: np.full(len(texts), 0.25)
+        ml_analyzer.vader_compound_batch = lambda texts: np.full(len(texts), 0.1)
+        now = timezone.now().timestamp()
+
+        with patch('stock.registry.get_reddit_sentiment', return_value=reddit), \
+                patch('stock.registry.get_ml_analyzer', return_value=ml_analyzer), \
+                patch.object(RedditSentiment, 'search', return_value=[make_submission('a', 'Good', now - 10)]):
+            ingest_stock(self.stock)
+
+        self.assertEqual(DailySentimentRollup.objects.filter(stock=self.stock).count(), 3)
+
+
+def fake_async_reddit(listings):
+    """Mock Async PRAW client searching listings keyed by query"""
+    async def search(query, **kwargs):
+        for post in listings.get(query, [])[:kwargs.get('limit')]:
+            yield post
+
+    client = Mock()
+    client.subreddit = AsyncMock(return_value=Mock(search=search))
+    client.auth.limits = {'remaining': None, 'used': None}
+    client.close = AsyncMock()
+    return client
+
+
+class ApiTests(TestCase):
+    """Tests for the REST API"""
+
+    def setUp(self):
+        registry.reset()
+        self.stock = Stock.objects.create(symbol='AAPL')
+        now = timezone.now()
+        for i in range(5):
+            upsert_posts(self.stock, [{
+                'reddit_id': f'p{i}', 'subreddit': 'stocks', 'title': f'Post {i}', 'selftext': '',
+                'permalink': f'/r/stocks/p{i}', 'score': i, 'created_utc': now - timezone.timedelta(hours=i),
+            }], [{'textblob': 0.1 * i, 'vader': None, 'ml': -0.1 * i}])
+        refresh_rollups(self.stock)
+        self.state = IngestionState.objects.create(
+            stock=self.stock, covered_from=now - timezone.timedelta(days=30), last_run=now,
+        )
+
+    def tearDown(self):
+        registry.reset()
+
+    def test_sentiment_summary(self):
+        """The summary is read from stored posts, top post scores under one key"""
+        response = self.client.get('/api/stocks/aapl/sentiment/', {'scorer': 'ml'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['posts_count'], 5)
+        self.assertEqual(data['scorer'], 'ml')
+        self.assertEqual(data['top_posts'][0], {'title': 'Post 0', 'sentiment': 0.0,
+                                                'url': 'https://www.reddit.com/r/stocks/p0'})
+        self.assertEqual(self.client.get('/api/stocks/TSLA/sentiment/').status_code, 404)
+
+    def test_conditional_requests(self):
+        """Unchanged resources revalidate with a 304 until the next ingestion run"""
+        response = self.client.get('/api/stocks/AAPL/sentiment/')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            revalidated = self.client.get('/api/stocks/AAPL/sentiment/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        since = self.client.get('/api/stocks/AAPL/sentiment/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+        # Other parameters and new runs change the ETag
+        other = self.client.get('/api/stocks/AAPL/sentiment/', {'scorer': 'ml'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+        self.state.last_run += timezone.timedelta(minutes=5)
+        self.state.save()
+        self.assertEqual(self.client.get('/api/stocks/AAPL/sentiment/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_conditional_requests_expire_with_the_hour(self):
+        """Posts leave the time window as time passes, so a new hour changes the validators"""
+        response = self.client.get('/api/stocks/AAPL/sentiment/')
+        later = timezone.now() + timezone.timedelta(hours=1)
+
+        with patch('django.utils.timezone.now', return_value=later):
+            revalidated = self.client.get('/api/stocks/AAPL/sentiment/', HTTP_IF_NONE_MATCH=response['ETag'])
+            since = self.client.get('/api/stocks/AAPL/sentiment/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+        self.assertNotEqual(revalidated.status_code, 304)
+        self.assertNotEqual(since.status_code, 304)
+
+    def test_stale_summary_has_no_validators(self):
+        """Once the stored data is too old, revalidating gets the 404 instead of a 304"""
+        etag = self.client.get('/api/stocks/AAPL/sentiment/')['ETag']
+        self.state.last_run -= timezone.timedelta(hours=1)
+        self.state.save()
+
+        with self.settings(INGESTION_MAX_AGE=900):
+            response = self.client.get('/api/stocks/AAPL/sentiment/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_conditional_requests_are_throttled(self):
+        """A request that would get a 304 still goes through DRF's checks"""
+        etag = self.client.get('/api/stocks/AAPL/sentiment/')['ETag']
+
+        with patch('rest_framework.views.APIView.check_throttles', side_effect=Throttled()):
+            response = self.client.get('/api/stocks/AAPL/sentiment/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 429)
+
+    def test_posts_cursor_pagination(self):
+        """Stored posts are paged newest first with opaque cursors"""
+        with self.settings(API_POSTS_PAGE_SIZE=2):
+            first = self.client.get('/api/stocks/AAPL/posts/').json()
+            second = self.client.get(first['next']).json()
+
+        self.assertEqual([post['reddit_id'] for post in first['results']], ['p0', 'p1'])
+        self.assertEqual([post['reddit_id'] for post in second['results']], ['p2', 'p3'])
+        self.assertEqual(first['results'][1]['textblob'], 0.1)
+        self.assertIsNone(first['results'][1]['vader'])
+
+    def test_trend(self):
+        """The trend holds the daily mean and spread from the rollups"""
+        data = self.client.get('/api/stocks/AAPL/trend/').json()
+
+        self.assertEqual(sum(point['count'] for point in data['results']), 5)
+        self.assertTrue(all(point['std'] >= 0 for point in data['results']))
+        # Every post is within the moving average window, which averages the daily means
+        means = [point['mean'] for point in data['results']]
+        self.assertAlmostEqual(data['current_sentiment'], sum(means) / len(means))
+        self.assertAlmostEqual(data['results'][-1]['moving_average'], data['current_sentiment'])
+        self.assertEqual(data['trend'], 'Bullish' if data['current_sentiment'] > 0.2 else 'Neutral')
+
+    def test_quotes(self):
+        """Quotes are flattened, and cached quotes answer If-Modified-Since"""
+        quote = {'success': True, 'data': {'current_price': 190.5, 'currency': 'USD'}, 'error': None}
+        registry.get_quote_cache().set('AAPL', quote)
+
+        response = self.client.get('/api/quotes/', {'symbols': 'aapl'})
+
+        self.assertEqual(response.json(), {'AAPL': {'success': True, 'current_price': 190.5,
+                                                    'currency': 'USD', 'error': None}})
+        revalidated = self.client.get('/api/quotes/', {'symbols': 'aapl'},
+                                      HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.client.get('/api/quotes/').status_code, 400)
+
+
+class LiveHubTests(TestCase):
+    """Tests for the live sentiment stream"""
+
+    def setUp(self):
+        self.polls = []
+
+        async def poll(symbol, cursor):
+            self.polls.append((symbol, cursor))
+            return [('price', {'current_price': 100 + len(self.polls)})], len(self.polls)
+
+        self.hub = LiveHub(poll=poll, interval=60)
+
+    def test_subscribers_share_one_poll(self):
+        """Every subscriber of a symbol gets the updates of one poll task"""
+        async def run():
+            first = self.hub.subscribe('AAPL')
+            second = self.hub.subscribe('AAPL')
+            updates = [await asyncio.wait_for(first.get(), 1), await asyncio.wait_for(second.get(), 1)]
+            # A late subscriber starts with the latest price
+            late = self.hub.subscribe('AAPL')
+            updates.append(late.get_nowait())
+            task = self.hub.channels()['AAPL'].task
+            for queue in (first, second, late):
+                self.hub.unsubscribe('AAPL', queue)
+            await asyncio.sleep(0)
+            return updates, task, self.hub.channels()
+
+        updates, task, channels = asyncio.run(run())
+
+        self.assertEqual(self.polls, [('AAPL', None)])
+        self.assertEqual(updates, [('price', {'current_price': 101})] * 3)
+        self.assertTrue(task.cancelled())
+        self.assertEqual(channels, {})
+
+    def test_stream(self):
+        """The stream formats events and unsubscribes when the client goes away"""
+        async def run():
+            stream = self.hub.stream('AAPL', keepalive=0.01)
+            event = await stream.__anext__()
+            await stream.aclose()
+            return event, self.hub.channels()
+
+        event, channels = asyncio.run(run())
+
+        self.assertEqual(event, format_event('price', {'current_price': 101}))
+        self.assertEqual(event, 'event: price\ndata: {"current_price": 101}\n\n')
+        self.assertEqual(channels, {})
+
+    def test_poll_symbol(self):
+        """Polls return the posts stored since the previous one, the rolling average and the price"""
+        stock = Stock.objects.create(symbol='AAPL')
+
+        def add_post(reddit_id, textblob):
+            upsert_posts(stock, [{
+                'reddit_id': reddit_id, 'subreddit': 'stocks', 'title': reddit_id, 'selftext': '',
+                'permalink': f'/r/stocks/{reddit_id}', 'score': 1, 'created_utc': timezone.now(),
+            }], [{'textblob': textblob, 'vader': None, 'ml': 0.0}])
+
+        add_post('a', 0.2)
+        events, cursor = _poll_symbol('AAPL', None)
+        add_post('b', 0.4)
+        new_events, _ = _poll_symbol('AAPL', cursor)
+
+        self.assertEqual([event for event, _ in events], ['average'])
+        self.assertEqual(dict(new_events)['posts'][0]['title'], 'b')
+        self.assertAlmostEqual(dict(new_events)['average']['textblob'], 0.3)
+
+    def test_poll_refreshes_price(self):
+        """Every poll refreshes the price through the quote cache, off the event loop's thread"""
+        quote = {'success': True, 'data': {'current_price': 190.5, 'currency': 'USD'}, 'error': None}
+        threads = []
+
+        def get_stock_data(self, symbol):
+            threads.append(threading.get_ident())
+            return quote
+
+        async def run():
+            return threading.get_ident(), await poll_symbol('AAPL', None)
+
+        with patch('stock.live._poll_symbol', return_value=([], 0)), \
+                patch.object(FetchStockData, 'get_stock_data', get_stock_data):
+            loop_thread, (events, _) = asyncio.run(run())
+
+        self.assertEqual(events, [('price', quote['data'])])
+        self.assertNotEqual(threads, [loop_thread])
+
+    def test_view(self):
+        """Only tracked stocks can be watched"""
+        Stock.objects.create(symbol='AAPL')
+
+        self.assertEqual(self.client.get('/live/TSLA/').status_code, 404)
+        response = self.client.get('/live/aapl/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.streaming)
+
+
+# See MentionExtractorTests for the mention filter
+@override_settings(REDDIT_REQUIRE_MENTION=False)
+class AsyncRedditSentimentTests(TestCase):
+    """Tests for the async Reddit client and its token bucket"""
+
+    def setUp(self):
+        self.reddit = AsyncRedditSentiment()
+        self.reddit.get_sentiment_batch = lambda texts: [0.5 if 'good' in text.lower() else -0.5 for text in texts]
+
+    def test_analyze_many_shares_one_client(self):
+        """Symbols are analyzed concurrently over one client per event loop"""
+        now = timezone.now().timestamp()
+        listings = {
+            'AAPL stock': [make_submission('a', 'Good', now), make_submission('b', 'Bad', now)],
+            'TSLA stock': [make_submission('c', 'Good', now)],
+        }
+
+        async def run():
+            try:
+                return await self.reddit.analyze_many(['AAPL', 'TSLA', 'MSFT'])
+            finally:
+                await self.reddit.close()
+
+        with patch('stock.reddit_sentiment_async.asyncpraw.Reddit',
+                   return_value=fake_async_reddit(listings)) as mock_reddit, \
+                patch('stock.reddit_sentiment_async.aiohttp.ClientSession'):
+            results = asyncio.run(run())
+
+        mock_reddit.assert_called_once()
+        mock_reddit.return_value.close.assert_awaited_once()
+        self.assertEqual(results['AAPL']['data']['posts_count'], 2)
+        self.assertEqual(results['TSLA']['data']['average_sentiment'], 0.5)
+        self.assertFalse(results['MSFT']['success'])
+
+    @override_settings(REDDIT_REQUIRE_MENTION=True)
+    def test_posts_must_mention_symbol(self):
+        """Search hits that do not mention the symbol are not scored"""
+        now = timezone.now().timestamp()
+        listings = {'AAPL stock': [make_submission('a', 'Good AAPL news', now), make_submission('b', 'Good', now)]}
+
+        async def run():
+            try:
+                return await self.reddit.get_reddit_posts('AAPL')
+            finally:
+                await self.reddit.close()
+
+        with patch('stock.reddit_sentiment_async.asyncpraw.Reddit', return_value=fake_async_reddit(listings)), \
+                patch('stock.reddit_sentiment_async.aiohttp.ClientSession'):
+            posts_df = asyncio.run(run())
+
+        self.assertEqual(posts_df['title'].tolist(), ['Good AAPL news'])
+
+    def test_search_each_subreddit(self):
+        """Per-subreddit searches are merged newest first without duplicates"""
+        now = timezone.now().timestamp()
+        client = fake_async_reddit({})
+        listings = {
+            'stocks': [make_submission('a', 'A', now - 10), make_submission('x', 'Cross', now - 30)],
+            'investing': [make_submission('b', 'B', now - 20), make_submission('x', 'Cross', now - 30)],
+            'wallstreetbets': [make_submission('c', 'C', now - 5)],
+        }
+
+        async def subreddit(name):
+            async def search(query, **kwargs):
+                for post in listings[name]:
+                    yield post
+            return Mock(search=search)
+        client.subreddit = subreddit
+
+        async def run():
+            return await self.reddit.search_each_subreddit('AAPL', sort='new')
+
+        with patch('stock.reddit_sentiment_async.asyncpraw.Reddit', return_value=client), \
+                patch('stock.reddit_sentiment_async.aiohttp.ClientSession'):
+            posts = asyncio.run(run())
+
+        self.assertEqual([post.id for post in posts], ['c', 'a', 'b', 'x'])
+
+    def test_token_bucket_waits_for_refill(self):
+        """An empty bucket sleeps until a token is refilled"""
+        clock = [0.0]
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+            clock[0] += delay
+
+        with patch('stock.reddit_sentiment_async.time.monotonic', side_effect=lambda: clock[0]), \
+                patch('stock.reddit_sentiment_async.asyncio.sleep', fake_sleep):
+            bucket = AsyncTokenBucket(rate=2, capacity=2)
+
+            async def run():
+                for _ in range(3):
+                    await bucket.acquire()
+            asyncio.run(run())
+
+        self.assertEqual(sleeps, [0.5])
+
+    def test_token_bucket_follows_rate_limit_headers(self):
+        """Reddit's remaining request count caps the tokens"""
+        bucket = AsyncTokenBucket(rate=1, capacity=10)
+        bucket.update_from_limits({'remaining': 0, 'used': 100})
+        self.assertLess(bucket._tokens, 1)
+
+        bucket.update_from_limits({'remaining': None, 'used': None})
+        self.assertLess(bucket._tokens, 1)
+
+
+class SentimentModelTests(TestCase):
+    """Tests for training, saving and using the sentiment model"""
+
+    def setUp(self):
+        registry.reset()
+        self.stock = Stock.objects.create(symbol='AAPL')
+        self.model_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.model_dir.cleanup)
+        with patch('stock.ml.analyzer_ml.SentimentIntensityAnalyzer', FakeVader), \
+                patch('stock.ml.analyzer_ml.stopwords', Mock(words=Mock(return_value=['the', 'is']))):
+            self.analyzer = MlSentimentAnalyzer()
+        patcher = patch('stock.registry.get_ml_analyzer', return_value=self.analyzer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(registry.reset)
+
+    def create_posts(self, count, label=None, vader=None):
+        words = {1: 'great gains moon rally', -1: 'terrible loss crash dump', 0: 'earnings call tomorrow'}
+        for i in range(count):
+            key = label if label is not None else (1 if vader > 0 else -1)
+            post = RedditPost.objects.create(
+                reddit_id=f'{key}{vader}{i}-{RedditPost.objects.count()}', stock=self.stock, subreddit='stocks', title='Post',
+                selftext=f'{words[key]} number {i}', permalink=f'/r/stocks/{key}{i}',
+                created_utc=timezone.now(), label=label,
+            )
+            if vader is not None:
+                PostScore.objects.create(post=post, textblob=0, vader=vader, ml=0)
+
+    def train(self, *args):
+        call_command('train_sentiment_model', '--output-dir', self.model_dir.name, '--min-samples', '10',
+                     *args, stdout=Mock())
+
+    def test_train_and_load(self):
+        """A trained model is saved as the latest version and separates the labels"""
+        self.create_posts(15, label=1)
+        self.create_posts(15, label=-1)
+
+        self.train()
+
+        model = load_model(latest_path(self.model_dir.name))
+        self.assertIsInstance(model.classifier.classes_, np.memmap)
+        scores = model.score_batch(['great gains rally', 'terrible crash dump'])
+        self.assertGreater(scores[0], 0)
+        self.assertLess(scores[1], 0)
+        self.assertEqual(model.metadata['samples'], 24)
+        # Trained on every core, saved to predict in the loading process only
+        self.assertIsNone(model.classifier.n_jobs)
+
+    def test_post_of_several_stocks_trained_once(self):
+        """Copies of a post stored for several stocks are one training sample"""
+        tsla = Stock.objects.create(symbol='TSLA')
+        for stock in (self.stock, tsla):
+            RedditPost.objects.create(reddit_id='shared', stock=stock, subreddit='stocks', title='Post',
+                                      selftext='great gains rally', permalink='/r/stocks/shared',
+                                      created_utc=timezone.now(), label=1)
+
+        texts, labels, last_post_id = training_data()
+        batches = list(training_batches())
+
+        self.assertEqual((texts, labels.tolist()), (['great gains rally'], [1]))
+        self.assertEqual(sum(len(batch_texts) for batch_texts, _, _ in batches), 1)
+
+    def test_analyzer_uses_trained_model(self):
+        """Once a model is trained the analyzer scores with it"""
+        self.create_posts(15, label=1)
+        self.create_posts(15, label=-1)
+        self.train('--test-size', '0')
+
+        with self.settings(SENTIMENT_MODEL_DIR=self.model_dir.name):
+            registry.reset()
+            scores = self.analyzer.analyze_sentiment_batch(['great gains', 'terrible crash'])
+            self.assertIs(registry.get_model_store().current(), registry.get_model_store().current())
+
+        self.assertGreater(scores[0], 0)
+        self.assertLess(scores[1], 0)
+
+    def test_weak_labels(self):
+        """Unlabelled posts are only used with --weak-labels"""
+        self.create_posts(10, vader=0.6)
+        self.create_posts(10, vader=-0.6)
+
+        with self.assertRaises(CommandError):
+            self.train()
+        self.train('--weak-labels')
+
+        self.assertIsNotNone(latest_path(self.model_dir.name))
+
+    def test_linear_backend_selected_by_setting(self):
+        """The analyzer serves the backend named by SENTIMENT_MODEL_BACKEND"""
+        self.create_posts(15, label=1)
+        self.create_posts(15, label=-1)
+        self.train('--backend', 'linear', '--test-size', '0')
+
+        self.assertIsNone(latest_path(self.model_dir.name, 'forest'))
+        with self.settings(SENTIMENT_MODEL_DIR=self.model_dir.name, SENTIMENT_MODEL_BACKEND='linear'):
+            registry.reset()
+            self.assertEqual(registry.get_model_store().current().backend, 'linear')
+            scores = self.analyzer.analyze_sentiment_batch(['great gains', 'terrible crash'])
+
+        self.assertGreater(scores[0], 0)
+        self.assertLess(scores[1], 0)
+
+    def test_benchmark(self):
+        """Every backend is measured on the same held-out posts"""
+        self.create_posts(15, label=1)
+        self.create_posts(15, label=-1)
+        out = Mock()
+
+        call_command('benchmark_sentiment_models', '--repeat', '5', stdout=out)
+
+        lines = [c.args[0] for c in out.write.call_args_list]
+        self.assertTrue(any(line.startswith('forest') for line in lines))
+        self.assertTrue(any(line.startswith('linear') for line in lines))
+
+    def update(self, *args):
+        out = Mock()
+        call_command('update_sentiment_model', '--output-dir', self.model_dir.name, *args, stdout=out)
+        return out.write.call_args.args[0]
+
+    def test_online_update(self):
+        """Updates learn only from posts stored since the previous one and keep a few checkpoints"""
+        self.create_posts(10, label=1)
+        self.create_posts(10, label=-1)
+        self.assertIn('20 new posts', self.update('--batch-size', '7'))
+        self.assertIn('No new posts', self.update())
+
+        for _ in range(2):
+            self.create_posts(5, label=1)
+            self.assertIn('5 new posts', self.update('--keep', '2'))
+
+        model = load_model(latest_path(self.model_dir.name, 'linear'))
+        self.assertEqual(model.metadata['samples'], 30)
+        self.assertEqual(model.metadata['last_post_id'], RedditPost.objects.order_by('-id').first().id)
+        self.assertEqual(len(list(Path(self.model_dir.name).glob('sentiment-linear-*.joblib'))), 2)
+        self.assertGreater(model.score_batch(['great gains rally'])[0], 0)
+
+    def test_update_model_fitted_on_fewer_labels(self):
+        """A trained linear model continues on a label its training data lacked"""
+        self.create_posts(15, label=1)
+        self.create_posts(15, label=-1)
+        self.train('--backend', 'linear', '--test-size', '0')
+        trained = load_model(latest_path(self.model_dir.name, 'linear'))
+        self.assertEqual(trained.classifier.classes_.tolist(), [-1, 0, 1])
+
+        self.create_posts(5, label=0)
+
+        self.assertIn('5 new posts', self.update())
+        model = load_model(latest_path(self.model_dir.name, 'linear'))
+        self.assertEqual(model.metadata['samples'], 35)
+
+    def test_update_moves_cursor_without_learning(self):
+        """Posts with nothing to learn from are not read again by the next update"""
+        self.create_posts(10, label=1)
+        self.create_posts(10, label=-1)
+        self.update()
+        RedditPost.objects.create(reddit_id='empty', stock=self.stock, subreddit='stocks', title='Post',
+                                  selftext='the is', permalink='/r/stocks/empty', created_utc=timezone.now(), label=1)
+
+        self.assertIn('No new posts', self.update())
+
+        model = load_model(latest_path(self.model_dir.name, 'linear'))
+        self.assertEqual(model.metadata['last_post_id'], RedditPost.objects.get(reddit_id='empty').id)
+        self.assertEqual(model.metadata['samples'], 20)
+
+    def test_update_notes_served_backend(self):
+        """The command says when the analyzer does not serve the model it updates"""
+        self.create_posts(10, label=1)
+        out = Mock()
+
+        with self.settings(SENTIMENT_MODEL_BACKEND='forest'):
+            call_command('update_sentiment_model', '--output-dir', self.model_dir.name, stdout=out)
+
+        self.assertIn("SENTIMENT_MODEL_BACKEND is 'forest'", out.write.call_args_list[0].args[0])
+
+    def test_hot_swap(self):
+        """A running store swaps in a newer version once its reload interval passed"""
+        self.create_posts(10, label=1)
+        self.create_posts(10, label=-1)
+        self.update()
+        store = ModelStore(self.model_dir.name, backend='linear', reload_interval=0)
+        cached = ModelStore(self.model_dir.name, backend='linear', reload_interval=3600)
+        first = store.current()
+        self.assertEqual(cached.current().version, first.version)
+
+        self.create_posts(5, label=0)
+        self.update()
+
+        self.assertNotEqual(store.current().version, first.version)
+        self.assertEqual(cached.current().version, first.version)
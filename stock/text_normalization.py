@@ -0,0 +1,100 @@
+"""
+Text normalization shared by RedditSentiment.clean_text and MlSentimentAnalyzer.preprocess.
+
+Patterns are compiled once. Tokenizing does not go through NLTK: after
+preprocessing, a text only holds lowercase ASCII letters and whitespace, and
+on such input NLTK's word_tokenize just splits on whitespace and separates a
+few contractions (cannot -> can not, gonna -> gon na, ...), which is what
+tokenize does directly.
+"""
+
+import re
+
+import pandas as pd
+
+URL_PATTERN = re.compile(r'http\S+|www\S+')
+# Mentions and hashtags as whole words, then any other special character
+NOISE_PATTERN = re.compile(r'@\w+|#\w+|[^A-Za-z0-9\s]')
+NON_LETTER_PATTERN = re.compile(r'[^a-zA-Z\s]')
+
+# The contractions NLTK's Treebank tokenizer splits that can occur in letter-only text
+CONTRACTIONS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na'),
+}
+
+
+def clean_text(text):
+    """
+    Remove links, mentions, hashtags, special characters and extra spaces
+    :param text: Text to be cleaned
+    :return: Cleaned text, empty for anything but a string
+    """
+    if not isinstance(text, str):
+        return ""
+    # Links go first, so the characters they contain are not stripped one by one
+    text = NOISE_PATTERN.sub('', URL_PATTERN.sub('', text))
+    return ' '.join(text.split())
+
+
+def clean_text_batch(texts):
+    """
+    clean_text for a whole batch
+    :param texts: Series or list of texts
+    :return: Series of cleaned texts aligned with texts
+    """
+    texts = pd.Series(texts, dtype=object)
+    is_text = texts.map(lambda text: isinstance(text, str))
+    return (texts.where(is_text, '').astype(str)
+            .str.replace(URL_PATTERN, '', regex=True)
+            .str.replace(NOISE_PATTERN, '', regex=True)
+            .str.split().str.join(' '))
+
+
+def tokenize(text):
+    """
+    Split lowercase letter-only text into the tokens word_tokenize would return
+    :param text: Text holding only ASCII letters and whitespace
+    :return: List of tokens
+    """
+    tokens = []
+    for token in text.split():
+        split = CONTRACTIONS.get(token)
+        if split is None:
+            tokens.append(token)
+        else:
+            tokens.extend(split)
+    return tokens
+
+
+def preprocess(text, stop_words):
+    """
+    Lowercase, keep letters only, tokenize and drop stop words
+    :param text: Text to be preprocessed
+    :param stop_words: frozenset of stop words
+    :return: Tokens joined by single spaces, empty for anything but a string
+    """
+    if not isinstance(text, str):
+        return ""
+    tokens = tokenize(NON_LETTER_PATTERN.sub('', text.lower()))
+    return ' '.join([token for token in tokens if token not in stop_words])
+
+
+def preprocess_batch(texts, stop_words):
+    """
+    preprocess for a whole batch
+    :param texts: Series or list of texts
+    :param stop_words: frozenset of stop words
+    :return: Series of preprocessed texts aligned with texts
+    """
+    texts = pd.Series(texts, dtype=object)
+    is_text = texts.map(lambda text: isinstance(text, str))
+    letters = (texts.where(is_text, '').astype(str)
+               .str.lower().str.replace(NON_LETTER_PATTERN, '', regex=True))
+    return letters.map(
+        lambda text: ' '.join([token for token in tokenize(text) if token not in stop_words])
+    )
@@ -1,9 +1,17 @@
 
 from django.urls import path
-from stock import views
+from stock import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('reddit_sentiment/', views.reddit_sentiment, name='reddit_sentiment'),
     path('reddit_sentiment_ml/', views.reddit_sentiment_ml_view, name='reddit_sentiment_ml'),
+    path('quotes/', views.stock_quotes, name='stock_quotes'),
+    path('compare/', views.compare, name='compare'),
+    path('live/<str:symbol>/', views.live_sentiment, name='live_sentiment'),
+    path('stats/score_cache/', views.score_cache_stats, name='score_cache_stats'),
+    path('api/stocks/<str:symbol>/sentiment/', api.sentiment_summary, name='api_sentiment_summary'),
+    path('api/stocks/<str:symbol>/posts/', api.stock_posts, name='api_stock_posts'),
+    path('api/stocks/<str:symbol>/trend/', api.sentiment_trend, name='api_sentiment_trend'),
+    path('api/quotes/', api.quotes, name='api_quotes'),
 ]
\ No newline at end of file
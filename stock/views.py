@@ -1,11 +1,19 @@
 """
 stock/views.py
 """
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
-from stock.reddit_sentiment import RedditSentiment
-from stock.ml.analyzer_ml import MlSentimentAnalyzer
+from stock import registry, result_cache
+from stock.compare import compare_symbols
+from stock.fanout import SourceBusy, SourceTimeout, fan_out
+from stock.ingestion import stored_analysis
+from user.models import Stock
 from .stock_data import FetchStockData
 from .form import StockSymbolForm
+
+
 def home(request):
     """
     Renders the home page.
@@ -21,6 +29,126 @@ def home(request):
         form = StockSymbolForm()
     return render(request, 'stock/home.html', {'form': form})
 
+
+def _error_result(message):
+    """
+    Builds the result of a source that could not be loaded.
+    :param message:
+    :return:
+    """
+    return {
+        'success': False,
+        'error': message,
+        'data': None
+    }
+
+
+def _source_result(outcome, message):
+    """
+    Unpacks a fan_out outcome, turning a failure into an error result.
+    :param outcome: (result, error) tuple from fan_out
+    :param message: Error message shown when the source failed
+    :return:
+    """
+    value, error = outcome
+    if error is not None:
+        if isinstance(error, SourceTimeout):
+            message = f"{message}: the request timed out"
+        elif isinstance(error, SourceBusy):
+            message = f"{message}: too many requests are in progress"
+        return _error_result(message)
+    return value
+
+
+def _ml_sentiment(symbol, time_filter):
+    """
+    Fetches Reddit posts for a symbol and scores them with the ML analyzer.
+    :param symbol:
+    :param time_filter:
+    :return:
+    """
+    reddit = registry.get_reddit_sentiment()
+    ml_analyzer = registry.get_ml_analyzer()
+    posts_df = reddit.get_reddit_posts(symbol, limit=50, time_filter=time_filter)
+
+    if posts_df.empty:
+        return _error_result(f'No posts found for {symbol}')
+
+    posts_df['preprocessed'] = ml_analyzer.preprocess_batch(posts_df['text'])
+    posts_df['ml_sentiment'] = ml_analyzer.analyze_sentiment_batch(posts_df['preprocessed'])
+
+    avg_ml_sentiment = posts_df['ml_sentiment'].mean()
+    top_posts = posts_df.nlargest(5, 'ml_sentiment')[['title', 'ml_sentiment', 'url']]
+
+    return {
+        'success': True,
+        'data': {
+            'average_sentiment': float(avg_ml_sentiment),
+            'posts_count': len(posts_df),
+            'top_posts': top_posts.to_dict(orient='records'),
+            'time_filter': time_filter
+        },
+        'error': None
+    }
+
+
+def _scorer_version(scorer):
+    """
+    Version of a scorer used in result cache keys, so a retrained model is not served stale results.
+    :param scorer: textblob or ml
+    :return:
+    """
+    if scorer == 'ml':
+        model = registry.get_model_store().current()
+        if model is not None:
+            return f'{model.backend}-{model.version}'
+        return registry.get_ml_analyzer().SCORER_VERSION
+    return registry.get_reddit_sentiment().SCORER_VERSION
+
+
+def _cached_analysis(symbol, time_filter, scorer, compute):
+    """
+    Returns a task for _fetch_page_sources serving a cached result when there is one.
+    The cache, the ingestion state and the stored posts are read here, in the request
+    thread; only a miss without stored posts runs compute in the pool.
+    :param symbol:
+    :param time_filter:
+    :param scorer: textblob or ml
+    :param compute: Callable running the live analysis
+    :return: (task, callable caching the result of the task)
+    """
+    key = result_cache.result_key(symbol, time_filter, scorer, _scorer_version(scorer))
+    cached = result_cache.get_result(key)
+    if cached is not None:
+        return (lambda: cached), (lambda result: None)
+
+    stored = stored_analysis(symbol, time_filter, scorer=scorer)
+    return (lambda: stored or compute()), (
+        lambda result: result_cache.set_result(key, time_filter, result)
+    )
+
+
+def _fetch_page_sources(symbol, reddit_task):
+    """
+    Runs the Reddit analysis and the price lookup for a symbol concurrently.
+    A source that fails or times out is replaced by an error result so the
+    page can still render the other one.
+    :param symbol:
+    :param reddit_task: Callable returning the Reddit analysis result
+    :return: (result, stock_data)
+    """
+    if not symbol:
+        return _error_result('No symbol provided'), None
+
+    outcomes = fan_out({
+        'reddit': reddit_task,
+        'price': lambda: FetchStockData().get_stock_data(symbol),
+    })
+    result = _source_result(outcomes['reddit'], f"Could not load Reddit posts for {symbol}")
+    stock_data = _source_result(outcomes['price'], f"Could not load the price of {symbol}")
+    return result, stock_data
+
+
 def reddit_sentiment(request):
     """
     Renders the sentiment analysis page.
@@ -33,22 +161,17 @@ def reddit_sentiment(request):
     if time_filter not in ["week", "month", "year"]:
         time_filter = "week"
 
+    task = store = None
     if symbol:
-        sentiment = RedditSentiment()
-        result = sentiment.analyze_sentiment(symbol, time_filter=time_filter)
-        if result['success'] and result['data']:
-            result['data']['time_filter'] = time_filter
-
-    else:
-        result = {
-            'success': False,
-            'error': 'No symbol provided',
-            'data': None
-        }
-
-    stock_fetcher = FetchStockData()
-    stock_data = stock_fetcher.get_stock_data(symbol)
-
+        task, store = _cached_analysis(
+            symbol, time_filter, 'textblob',
+            lambda: registry.get_reddit_sentiment().analyze_sentiment(symbol, time_filter=time_filter)
+        )
+    result, stock_data = _fetch_page_sources(symbol, task)
+    if store is not None:
+        store(result)
+    if result['success'] and result['data']:
+        result['data']['time_filter'] = time_filter
 
     return render(request, 'stock/sentiment.html', {'result': result, 'symbol': symbol, 'time_filter': time_filter, 'stock_data': stock_data})
 
@@ -67,43 +190,12 @@ def reddit_sentiment_ml_view(request):
 
     form = StockSymbolForm()
 
+    task = store = None
     if symbol:
-        reddit = RedditSentiment()
-        ml_analyzer = MlSentimentAnalyzer()
-        posts_df = reddit.get_reddit_posts(symbol, limit=50, time_filter=time_filter)
-
-        if posts_df.empty:
-            result = {
-                'success': False,
-                'error': f'No posts found for {symbol}',
-                'data': None
-            }
-        else:
-            posts_df['preprocessed'] = posts_df['text'].apply(ml_analyzer.preprocess)
-            posts_df['ml_sentiment'] = posts_df['preprocessed'].apply(ml_analyzer.analyze_sentiment)
-
-            avg_ml_sentiment = posts_df['ml_sentiment'].mean()
-            top_posts = posts_df.nlargest(5, 'ml_sentiment')[['title', 'ml_sentiment', 'url']]
-
-            result = {
-                'success': True,
-                'data': {
-                    'average_sentiment': float(avg_ml_sentiment),
-                    'posts_count': len(posts_df),
-                    'top_posts': top_posts.to_dict(orient='records'),
-                    'time_filter': time_filter
-                },
-                'error': None
-            }
-    else:
-        result = {
-            'success': False,
-            'error': 'No symbol provided',
-            'data': None
-        }
-
-    stock_fetcher = FetchStockData()
-    stock_data = stock_fetcher.get_stock_data(symbol)
+        task, store = _cached_analysis(symbol, time_filter, 'ml', lambda: _ml_sentiment(symbol, time_filter))
+    result, stock_data = _fetch_page_sources(symbol, task)
+    if store is not None:
+        store(result)
 
     return render(request, 'stock/sentimentml.html', {
         'form': form,
@@ -111,4 +203,93 @@ def reddit_sentiment_ml_view(request):
         'symbol': symbol,
         'time_filter': time_filter,
         'stock_data': stock_data
-    })
\ No newline at end of file
+    })
+
+
+def stock_quotes(request):
+    """
+    Returns quotes for a comma separated list of symbols as JSON.
+    :param request:
+    :return:
+    """
+    symbols = [symbol for symbol in request.GET.get('symbols', '').split(',') if symbol.strip()]
+    max_symbols = getattr(settings, 'QUOTES_MAX_SYMBOLS', 100)
+
+    if not symbols:
+        return JsonResponse({'error': 'No symbols provided'}, status=400)
+    if len(symbols) > max_symbols:
+        return JsonResponse({'error': f'At most {max_symbols} symbols can be requested'}, status=400)
+
+    return JsonResponse({'results': FetchStockData().get_stock_data_many(symbols)})
+
+
+def compare(request):
+    """
+    Compares the Reddit sentiment of a comma separated list of symbols, as JSON
+    with format=json and as a page otherwise.
+    :param request:
+    :return:
+    """
+    time_filter = request.GET.get('time_filter', 'week')
+    if time_filter not in ["week", "month", "year"]:
+        time_filter = "week"
+
+    requested = [symbol.strip() for symbol in request.GET.get('symbols', '').split(',') if symbol.strip()]
+    symbols = list(dict.fromkeys(result_cache.normalize_symbol(symbol) for symbol in requested))
+    max_symbols = getattr(settings, 'COMPARE_MAX_SYMBOLS', 100)
+
+    error = None
+    if not requested:
+        error = 'No symbols provided'
+    elif None in symbols:
+        error = 'Symbols may only contain letters, digits and . ^ = -'
+    elif len(symbols) > max_symbols:
+        error = f'At most {max_symbols} symbols can be compared'
+
+    if error is not None:
+        result = _error_result(error)
+    else:
+        result = compare_symbols(
+            registry.get_reddit_sentiment(), symbols, time_filter=time_filter,
+            limit=getattr(settings, 'COMPARE_POSTS_PER_QUERY', 500),
+        )
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(result, status=400 if error else 200)
+    return render(request, 'stock/compare.html', {
+        'result': result,
+        'symbols': ','.join(requested),
+        'time_filter': time_filter,
+    }, status=400 if error else 200)
+
+
+async def live_sentiment(request, symbol):
+    """
+    Streams new scored posts, the rolling averages and price ticks of a stock as Server-Sent Events.
+    Needs an ASGI server, see stock/live.py.
+    :param request:
+    :param symbol:
+    :return:
+    """
+    symbol = symbol.upper()
+    if not await Stock.objects.filter(symbol=symbol).aexists():
+        raise Http404(f'{symbol} is not tracked')
+
+    response = StreamingHttpResponse(
+        registry.get_live_hub().stream(symbol, keepalive=getattr(settings, 'LIVE_KEEPALIVE', 15)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Keeps nginx from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@staff_member_required
+def score_cache_stats(request):
+    """
+    Returns the hit/miss counters of this worker's sentiment score cache.
+    :param request:
+    :return:
+    """
+    return JsonResponse(registry.get_score_cache().stats())
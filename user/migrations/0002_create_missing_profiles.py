@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    """
+    Profiles of the users created before profiles were created on sign-up
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('user', 'UserProfile')
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id) for user_id in
+         User.objects.filter(userprofile__isnull=True).values_list('id', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
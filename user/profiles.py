@@ -0,0 +1,102 @@
+"""
+Data access of user profiles and their favourite stocks.
+
+Profiles are created with their user (see user/signals.py), so reading a
+profile never writes. A profile page loads in two queries: the user joined
+with the profile, and the favourites with their fan counts.
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+
+from .models import Stock, UserProfile
+
+
+def normalize_symbols(symbols):
+    """
+    Upper-cased symbols without blanks, duplicates or anything too long to store
+    :param symbols: Iterable of symbols as typed by users
+    :return: List of symbols in their original order
+    """
+    max_length = Stock._meta.get_field('symbol').max_length
+    return list(dict.fromkeys(
+        symbol.strip().upper() for symbol in symbols if symbol.strip() and len(symbol.strip()) <= max_length
+    ))
+
+
+def favourites_queryset():
+    """
+    Stocks with the number of users following each
+    :return: QuerySet of Stock annotated with fan_count
+    """
+    # A subquery, as Count('fans') would only count the join a prefetch filters on
+    fans = (UserProfile.favourite_stocks.through.objects.filter(stock=OuterRef('pk'))
+            .values('stock').annotate(count=Count('*')).values('count'))
+    return Stock.objects.annotate(fan_count=Coalesce(Subquery(fans), 0)).order_by('symbol')
+
+
+def load_profile_user(user_id):
+    """
+    User with their profile and favourites, in two queries
+    :param user_id: Id of the user
+    :return: User; user.userprofile.favourite_stocks.all() holds the prefetched favourites
+    """
+    return get_object_or_404(
+        User.objects.select_related('userprofile').prefetch_related(
+            Prefetch('userprofile__favourite_stocks', queryset=favourites_queryset())
+        ),
+        id=user_id,
+    )
+
+
+def get_profile(user):
+    """
+    Profile of a user, created only for users that predate the sign-up signal
+    :param user: User
+    :return: UserProfile
+    """
+    try:
+        return user.userprofile
+    except UserProfile.DoesNotExist:
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        return profile
+
+
+@transaction.atomic
+def add_favourites(user, symbols):
+    """
+    Add many stocks to a user's favourites, creating the stocks nobody tracked yet
+    :param user: User
+    :param symbols: Iterable of symbols
+    :return: List of the symbols added
+    """
+    symbols = normalize_symbols(symbols)
+    if not symbols:
+        return []
+    stocks = {stock.symbol: stock for stock in Stock.objects.filter(symbol__in=symbols)}
+    for symbol in symbols:
+        if symbol not in stocks:
+            # Created one by one so post_save receivers (see stock/signals.py) learn about the stock
+            stocks[symbol], _ = Stock.objects.get_or_create(symbol=symbol)
+    get_profile(user).favourite_stocks.add(*stocks.values())
+    return symbols
+
+
+@transaction.atomic
+def remove_favourites(user, symbols):
+    """
+    Remove many stocks from a user's favourites
+    :param user: User
+    :param symbols: Iterable of symbols
+    :return: Number of favourites removed
+    """
+    symbols = normalize_symbols(symbols)
+    if not symbols:
+        return 0
+    removed, _ = UserProfile.favourite_stocks.through.objects.filter(
+        userprofile__user=user, stock__symbol__in=symbols
+    ).delete()
+    return removed
@@ -0,0 +1,18 @@
+"""
+Signal receivers of the user app, connected in UserConfig.ready.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import UserProfile
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    """
+    Give every new user a profile, so views only ever read it
+    """
+    if created and not raw:
+        UserProfile.objects.create(user=instance)
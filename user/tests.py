@@ -1,3 +1,69 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Stock, UserProfile
+from .profiles import add_favourites, load_profile_user, remove_favourites
+
+
+class ProfileTests(TestCase):
+    """Tests for user profiles and favourite stocks"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.client.force_login(self.user)
+
+    def test_profile_created_with_user(self):
+        """Signing up creates the profile, and the migration backfills older users"""
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+        self.user.userprofile.delete()
+        migration = import_module('user.migrations.0002_create_missing_profiles')
+        migration.create_missing_profiles(apps, None)
+
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_bulk_add_and_remove(self):
+        """Many symbols are added or removed at once, new stocks are created"""
+        Stock.objects.create(symbol='AAPL')
+
+        self.assertEqual(add_favourites(self.user, ['aapl', ' TSLA', '', 'AAPL', 'X' * 11]), ['AAPL', 'TSLA'])
+        self.assertEqual(sorted(self.user.userprofile.favourite_stocks.values_list('symbol', flat=True)),
+                         ['AAPL', 'TSLA'])
+
+        # One DELETE, wrapped in the savepoint of the transaction
+        with self.assertNumQueries(3):
+            self.assertEqual(remove_favourites(self.user, ['tsla', 'MSFT']), 1)
+        self.assertEqual(list(self.user.userprofile.favourite_stocks.values_list('symbol', flat=True)), ['AAPL'])
+
+    def test_profile_loads_in_two_queries(self):
+        """The user, profile and favourites with fan counts take two queries however many favourites"""
+        add_favourites(self.user, ['AAPL', 'TSLA', 'MSFT'])
+        other = User.objects.create_user(username='bob')
+        add_favourites(other, ['TSLA'])
+
+        with self.assertNumQueries(2):
+            user = load_profile_user(self.user.id)
+            favourites = {stock.symbol: stock.fan_count for stock in user.userprofile.favourite_stocks.all()}
+
+        self.assertEqual(favourites, {'AAPL': 1, 'MSFT': 1, 'TSLA': 2})
+
+    def test_profile_view_does_not_grow_with_favourites(self):
+        """Rendering a profile neither writes nor queries per favourite"""
+        add_favourites(self.user, ['AAPL'])
+        with self.assertNumQueries(4):
+            response = self.client.get('/profile/')
+        self.assertContains(response, 'AAPL')
+
+        add_favourites(self.user, ['TSLA', 'MSFT', 'NVDA'])
+        with self.assertNumQueries(4):
+            self.client.get(f'/profile/{self.user.id}/')
+
+    def test_form_adds_many(self):
+        """The form accepts a comma separated list"""
+        response = self.client.post('/add_favourite/', {'symbol': 'aapl, tsla'})
+
+        self.assertRedirects(response, '/profile/')
+        self.assertEqual(self.user.userprofile.favourite_stocks.count(), 2)
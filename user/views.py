@@ -5,8 +5,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required
-from .models import Stock, UserProfile
-from django.contrib.auth.models import User
+from .models import Stock
+from .profiles import add_favourites, get_profile, load_profile_user, remove_favourites
 def register(request):
     """
     Handles user registration.
@@ -53,35 +53,39 @@ def logout_view(request):
 
 @login_required
 def add_favourite_stock(request, symbol):
-    stock, _ = Stock.objects.get_or_create(symbol=symbol.upper())
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
-    profile.favourite_stocks.add(stock)
+    add_favourites(request.user, [symbol])
     return redirect('profile')
 
 @login_required
 def add_favourite_stock_by_form(request):
+    """
+    Adds one or more comma separated symbols to the favourites.
+    :param request:
+    :return:
+    """
     if request.method == 'POST':
-        symbol = request.POST.get('symbol', '').strip()
-        if symbol:
-            return add_favourite_stock(request, symbol)
+        add_favourites(request.user, request.POST.get('symbol', '').split(','))
+    return redirect('profile')
 
 @login_required
 def remove_favourite_stock(request, symbol):
-    stock = get_object_or_404(Stock, symbol=symbol.upper())
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
-    profile.favourite_stocks.remove(stock)
+    get_object_or_404(Stock, symbol=symbol.upper())
+    remove_favourites(request.user, [symbol])
     return redirect('profile')
 
+def _profile_context(user_id):
+    """
+    Template context of a profile page, loaded in two queries.
+    :param user_id:
+    :return:
+    """
+    user = load_profile_user(user_id)
+    return {'favourites': get_profile(user).favourite_stocks.all(), 'profile_user': user}
+
 @login_required
 def user_profile(request):
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
-    favourites = profile.favourite_stocks.all()
-    return render(request, 'user/profile.html', {'favourites': favourites})
+    return render(request, 'user/profile.html', _profile_context(request.user.id))
 
 @login_required
 def user_profile_by_id(request, user_id):
-    user = get_object_or_404(User, id=user_id)
-    profile, _ = UserProfile.objects.get_or_create(user=user)
-    favourites = profile.favourite_stocks.all()
-    return render(request, 'user/profile.html', {'favourites': favourites, 'profile_user': user})
-
+    return render(request, 'user/profile.html', _profile_context(user_id))